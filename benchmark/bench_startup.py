@@ -0,0 +1,59 @@
+"""Construction time of an already-deployed HuggingFace model: warm constructor vs serve-only from_cache.
+
+Runs in a temporary working directory with a pre-filled deployment and metadata cache; no network is used.
+
+usage: python -m benchmark.bench_startup [--rounds 2000]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(construct, rounds: int) -> dict:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        construct()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return {"p50_us": round(statistics.median(samples), 1), "mean_us": round(statistics.fmean(samples), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    model_id = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+    # the caches live under the working directory, which is read at import time
+    os.chdir(tempfile.mkdtemp(prefix="dipperai-bench-"))
+    for name in ("ALIBABA_CLOUD_ACCESS_KEY_ID", "ALIBABA_CLOUD_ACCESS_KEY_SECRET", "FC_ACCOUNT_ID"):
+        os.environ.setdefault(name, "bench")
+
+    start = time.perf_counter()
+    from maas.huggingface import HuggingFace
+    from utils.cache import cache
+    from utils.meta_cache import meta_cache
+    import_ms = (time.perf_counter() - start) * 1000
+
+    meta = {"pipeline_tag": "text-classification", "library_name": "transformers"}
+    meta_cache.get("huggingface", model_id, "master", lambda etag: (meta, None))
+    # a service url skips deployment, it is only used to resolve the config stored in the cache
+    model = HuggingFace(model_id, service_url="https://model.example.com")
+    cache.set_cache(model.resource_name, {"url": model.service_url, "config": model.service_config})
+    cache.save_cache()
+
+    results = {
+        "import_ms": round(import_ms, 1),
+        "HuggingFace()": measure(lambda: HuggingFace(model_id), args.rounds),
+        "HuggingFace.from_cache()": measure(lambda: HuggingFace.from_cache(model_id), args.rounds),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
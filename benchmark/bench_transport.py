@@ -0,0 +1,53 @@
+"""Compare per-call `requests.post` with the pooled keep-alive Transport.
+
+usage: python -m benchmark.bench_transport [--requests 2000]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import requests  # noqa: E402
+
+from benchmark.fake_cloud import FakeCloud  # noqa: E402
+from utils.transport import Transport  # noqa: E402
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def measure(post, url: str, count: int) -> dict:
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        post(url, json={"input": i}).json()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    with FakeCloud() as cloud:
+        transport = Transport()
+        results = {
+            "requests.post": measure(requests.post, cloud.url, args.requests),
+            "Transport.post": measure(transport.post, cloud.url, args.requests),
+        }
+        transport.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,486 @@
+"""Local stand-in for the clouds DipperAI talks to, used by the tests and benchmarks.
+
+One server emulates:
+  - model HTTP triggers: POST echoes the json body, describes the parts of a multipart body or the size and digest
+    of any other body, GET answers with the path; instances that stayed idle longer than `idle_timeout` pay a
+    `cold_start` first, like FC scaling to zero. Chunked request bodies are read, and compressed ones are inflated
+    when their Content-Encoding is in `accept_encodings`, otherwise answered with 415
+  - the FC 2023-03-30 function / trigger / provision-config APIs under /2023-03-30/functions
+  - the DevS 2023-07-14 project API under /2023-07-14/projects
+Signatures are not checked. New functions and releases become ready after `deploy_time` seconds.
+"""
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FC_PREFIX = "/2023-03-30/functions"
+DEVS_PREFIX = "/2023-07-14/projects"
+# functions of the DevS templates whose trigger url DipperAI reads, see vendor.devs.prefix_to_func
+DEVS_TEMPLATE_FUNCS = ("model_app_func", "tgpu_basic_func")
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, code: str, message: str = ""):
+        """Error answered with `status` and the vendor error `code`."""
+        super().__init__(message or code)
+        self.status = status
+        self.code = code
+
+
+def iso_time(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+class FakeFunctionCompute:
+    def __init__(self, base_url, deploy_time: float):
+        """In-memory state of the FC 2023-03-30 API.
+
+        :param base_url: callable returning the server url, trigger urls point back to the server
+        :param deploy_time: seconds a created or updated function stays Pending / InProgress
+        """
+        self.base_url = base_url
+        self.deploy_time = deploy_time
+        self.functions = {}
+        self.triggers = {}
+        self.provision = {}
+        self.lock = threading.Lock()
+
+    def function_view(self, name: str) -> dict:
+        """Get a function as the API shows it, Pending until its deploy time has passed."""
+        function = dict(self.functions[name])
+        ready = time.time() >= function.pop("_ready_at")
+        function["state"] = "Active" if ready or function["state"] == "Active" else "Pending"
+        function["lastUpdateStatus"] = "Successful" if ready else "InProgress"
+        return function
+
+    def handle(self, method: str, parts: list, query: dict, body: dict) -> tuple:
+        """Route one API call.
+
+        :param method: http method
+        :param parts: path segments after /2023-03-30/functions
+        :param query: parsed query string
+        :param body: json body
+        :return: (status code, json response) tuple.
+        """
+        with self.lock:
+            if not parts:
+                if method == "GET":
+                    return 200, self.list_functions(query)
+                if method == "POST":
+                    return 200, self.create_function(body)
+            name = parts[0] if parts else None
+            if name is not None and name not in self.functions:
+                raise ApiError(404, "FunctionNotFound", f"function {name} not found")
+            if len(parts) == 1:
+                if method == "GET":
+                    return 200, self.function_view(name)
+                if method == "PUT":
+                    function = self.functions[name]
+                    function.update(body)
+                    function["lastModifiedTime"] = iso_time(time.time())
+                    function["_ready_at"] = time.time() + self.deploy_time
+                    return 200, self.function_view(name)
+                if method == "DELETE":
+                    del self.functions[name]
+                    self.triggers.pop(name, None)
+                    self.provision.pop(name, None)
+                    return 204, None
+            if len(parts) >= 2 and parts[1] == "triggers":
+                return self.handle_trigger(method, name, parts[2] if len(parts) > 2 else None, body)
+            if len(parts) == 2 and parts[1] == "provision-config" and method == "PUT":
+                config = {"defaultTarget": body.get("defaultTarget", 0), "current": body.get("defaultTarget", 0),
+                          "scheduledActions": body.get("scheduledActions", [])}
+                self.provision[name] = config
+                return 200, config
+        raise ApiError(400, "InvalidArgument", f"unsupported {method} {'/'.join(parts)}")
+
+    def list_functions(self, query: dict) -> dict:
+        """List the functions by prefix, a page of `limit` at a time."""
+        prefix = query.get("prefix", "")
+        limit = int(query.get("limit", 20))
+        names = sorted(name for name in self.functions if name.startswith(prefix))
+        next_token = query.get("nextToken")
+        if next_token:
+            names = [name for name in names if name >= next_token]
+        page, rest = names[:limit], names[limit:]
+        result = {"functions": [self.function_view(name) for name in page]}
+        if rest:
+            result["nextToken"] = rest[0]
+        return result
+
+    def create_function(self, body: dict) -> dict:
+        """Create a function, ready after the deploy time."""
+        name = body.get("functionName")
+        if not name:
+            raise ApiError(400, "InvalidArgument", "functionName is required")
+        if name in self.functions:
+            raise ApiError(409, "FunctionAlreadyExists", f"function {name} already exists")
+        now = time.time()
+        self.functions[name] = {
+            **body,
+            "functionId": f"fake-{len(self.functions) + 1}",
+            "state": "Pending",
+            "createdTime": iso_time(now),
+            "lastModifiedTime": iso_time(now),
+            "_ready_at": now + self.deploy_time,
+        }
+        return self.function_view(name)
+
+    def handle_trigger(self, method: str, function_name: str, trigger_name: str, body: dict) -> tuple:
+        """Create, get, list or delete the triggers of a function."""
+        triggers = self.triggers.setdefault(function_name, {})
+        if trigger_name is None and method == "POST":
+            trigger_name = body.get("triggerName", "default")
+            if trigger_name in triggers:
+                raise ApiError(409, "TriggerAlreadyExists", f"trigger {trigger_name} already exists")
+            url = f"{self.base_url()}/fc/{function_name}"
+            triggers[trigger_name] = {
+                **body,
+                "triggerName": trigger_name,
+                "httpTrigger": {"urlInternet": url, "urlIntranet": url},
+            }
+            return 200, triggers[trigger_name]
+        if trigger_name not in triggers:
+            raise ApiError(404, "TriggerNotFound", f"trigger {trigger_name} not found")
+        if method == "GET":
+            return 200, triggers[trigger_name]
+        if method == "DELETE":
+            del triggers[trigger_name]
+            return 204, None
+        raise ApiError(400, "InvalidArgument", f"unsupported {method} trigger")
+
+
+class FakeDevs:
+    def __init__(self, base_url, deploy_time: float):
+        """In-memory state of the DevS 2023-07-14 project API.
+
+        :param base_url: callable returning the server url, trigger urls point back to the server
+        :param deploy_time: seconds a release stays Running before it is Finished
+        """
+        self.base_url = base_url
+        self.deploy_time = deploy_time
+        self.projects = {}
+        self.lock = threading.Lock()
+
+    def project_view(self, name: str) -> dict:
+        """Get a project as the API shows it, with the release detail."""
+        project = self.projects[name]
+        template = project["spec"].get("templateConfig", {})
+        url = f"{self.base_url()}/devs/{name}"
+        outputs = {func: {"triggers": [{"httpTrigger": {"urlInternet": url}}]} for func in DEVS_TEMPLATE_FUNCS}
+        finished = time.time() >= project["readyAt"]
+        return {
+            "name": name,
+            "createdTime": project["createdTime"],
+            "status": {
+                "latestReleaseDetail": {
+                    "bizStatus": "Finished" if finished else "Running",
+                    "templateConfigSnapshot": {
+                        "templateName": template.get("templateName"),
+                        "parameters": template.get("parameters", {}),
+                    },
+                    "releaseOutputs": {"deploy": outputs} if finished else {},
+                }
+            },
+        }
+
+    def handle(self, method: str, parts: list, query: dict, body: dict) -> tuple:
+        """Route one Serverless Devs API call."""
+        with self.lock:
+            if not parts:
+                if method == "GET":
+                    keyword = query.get("keyword", "")
+                    names = sorted(name for name in self.projects if keyword in name)
+                    page_size = int(query.get("pageSize", 20))
+                    page_number = int(query.get("pageNumber", 1))
+                    page = names[(page_number - 1) * page_size:page_number * page_size]
+                    return 200, {"projects": [self.project_view(name) for name in page],
+                                 "pageNumber": page_number, "pageSize": page_size, "totalCount": len(names)}
+                if method == "POST":
+                    name = body.get("name")
+                    if name in self.projects:
+                        raise ApiError(409, "ProjectAlreadyExists", f"project {name} already exists")
+                    self.projects[name] = {"spec": body.get("spec", {}), "createdTime": iso_time(time.time()),
+                                           "readyAt": time.time() + self.deploy_time}
+                    return 200, self.project_view(name)
+            name = parts[0] if parts else None
+            if name not in self.projects:
+                raise ApiError(404, "ProjectNotFound", f"project {name} not found")
+            if method == "GET":
+                return 200, self.project_view(name)
+            if method == "PUT":
+                self.projects[name].update(spec=body.get("spec", {}), readyAt=time.time() + self.deploy_time)
+                return 200, self.project_view(name)
+            if method == "DELETE":
+                del self.projects[name]
+                return 204, None
+        raise ApiError(400, "InvalidArgument", f"unsupported {method} project call")
+
+
+class TriggerHandler(BaseHTTPRequestHandler):
+    # keep-alive needs HTTP/1.1, otherwise every response closes the socket
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        """Serve a GET request."""
+        self.dispatch("GET")
+
+    def do_POST(self):
+        """Serve a POST request."""
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        """Serve a PUT request."""
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        """Serve a DELETE request."""
+        self.dispatch("DELETE")
+
+    def dispatch(self, method: str):
+        """Answer a request with a scripted error, the vendor API or the trigger."""
+        body = self.read_body()
+        cloud = self.server.cloud
+        if self.send_scripted_error():
+            return
+        encoding = self.headers.get("Content-Encoding")
+        if encoding:
+            if encoding not in cloud.accept_encodings:
+                return self.send_json(415, {"Code": "UnsupportedMediaType"},
+                                      {"Accept-Encoding": ", ".join(cloud.accept_encodings)})
+            body = inflate(body, encoding)
+        split = urlsplit(self.path)
+        for prefix, api in ((FC_PREFIX, cloud.fc), (DEVS_PREFIX, cloud.devs)):
+            if split.path == prefix or split.path.startswith(prefix + "/"):
+                return self.send_api(method, api, split, prefix, body)
+        self.send_trigger(method, body)
+
+    def read_body(self) -> bytes:
+        """Read the request body, sized by Content-Length or sent with chunked transfer encoding."""
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if not size:
+                # trailer section ends with an empty line
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def send_api(self, method: str, api, split, prefix: str, body: bytes):
+        """Answer a vendor API call, throttled at `throttle_rate`."""
+        cloud = self.server.cloud
+        if cloud.api_latency:
+            time.sleep(cloud.api_latency)
+        if cloud.chance(cloud.throttle_rate):
+            return self.send_json(429, {"Code": "Throttling"}, {"Retry-After": "0"})
+        parts = [part for part in split.path[len(prefix):].split("/") if part]
+        query = {key: values[0] for key, values in parse_qs(split.query).items()}
+        try:
+            status, data = api.handle(method, parts, query, json.loads(body or b"{}"))
+        except ApiError as e:
+            return self.send_json(e.status, {"Code": e.code, "Message": str(e)})
+        self.send_json(status, data)
+
+    def send_trigger(self, method: str, body: bytes):
+        """Answer a trigger call on a warm or cold instance."""
+        cloud = self.server.cloud
+        instance = cloud.acquire_instance()
+        try:
+            if cloud.latency:
+                time.sleep(cloud.latency)
+            if cloud.chance(cloud.error_rate):
+                return self.send_json(503, {"Code": "ServiceUnavailable"})
+            if method == "GET":
+                return self.send_json(200, {"path": self.path})
+            content_type = self.headers.get("Content-Type", "application/json")
+            if content_type.startswith("multipart/form-data"):
+                return self.send_json(200, {"parts": multipart_parts(content_type, body)})
+            if not content_type.startswith("application/json"):
+                return self.send_json(200, {"received": describe(body), "content_type": content_type})
+            payload = json.loads(body or b"null")
+            if isinstance(payload, dict) and "stream" in payload:
+                return self.send_stream(int(payload["stream"]))
+            self.send_json(200, {"echo": payload})
+        finally:
+            cloud.release_instance(instance)
+
+    def send_json(self, status: int, body: any, headers: dict = None):
+        """Send a JSON response."""
+        data = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_scripted_error(self) -> bool:
+        """Answer with the next status of the server error script, if any is left."""
+        cloud = self.server.cloud
+        with cloud.lock:
+            cloud.requests += 1
+            status = cloud.errors.pop(0) if cloud.errors else None
+        if status is None:
+            return False
+        self.send_json(status, {"code": status}, {"Retry-After": "0"} if status == 429 else None)
+        return True
+
+    def send_stream(self, count: int):
+        """Answer with `count` server-sent events over chunked transfer encoding, then [DONE]."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [json.dumps({"token": i}) for i in range(count)] + ["[DONE]"]
+        for event in events:
+            chunk = f"data: {event}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+            if self.server.cloud.latency:
+                time.sleep(self.server.cloud.latency)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        """Keep the test output quiet."""
+        pass
+
+
+def inflate(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return zlib.decompress(body, 31)
+    import zstandard
+
+    return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+def describe(data: bytes) -> dict:
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def multipart_parts(content_type: str, body: bytes) -> dict:
+    """Decode a multipart/form-data body: file parts are described by size and digest, text parts echoed."""
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode("latin-1")
+    parts = {}
+    # bytes.split keeps large bodies cheap, the email package parses them line by line
+    for chunk in body.split(b"--" + boundary)[1:-1]:
+        head, data = chunk[2:-2].split(b"\r\n\r\n", 1)
+        part = BytesParser(policy=HTTP).parsebytes(head + b"\r\n\r\n")
+        name = part.get_param("name", header="content-disposition")
+        if part.get_filename() is None:
+            parts[name] = data.decode("utf-8")
+        else:
+            parts[name] = {"filename": part.get_filename(), "content_type": part.get_content_type(), **describe(data)}
+    return parts
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections opened in a burst, clients then wait for a SYN retransmit
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        """Ignore the connections the clients dropped."""
+        # clients giving up at their deadline are expected, not server errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeCloud:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, errors: list = None,
+                 cold_start: float = 0.0, idle_timeout: float = 300.0, error_rate: float = 0.0,
+                 api_latency: float = 0.0, throttle_rate: float = 0.0, deploy_time: float = 0.0, seed: int = None,
+                 accept_encodings: tuple = ("gzip",)):
+        """Run a threaded fake cloud server in the background.
+
+        :param host: listen host
+        :param port: listen port, 0 picks a free one
+        :param latency: artificial server time of a trigger call in seconds
+        :param errors: statuses answered to the first requests, in order, like: [429, 503]
+        :param cold_start: extra seconds paid by a trigger call that finds no warm instance
+        :param idle_timeout: seconds an idle instance stays warm
+        :param error_rate: probability of a trigger call answering 503
+        :param api_latency: artificial server time of a control plane call in seconds
+        :param throttle_rate: probability of a control plane call answering 429
+        :param deploy_time: seconds before a new function or release is ready
+        :param seed: random seed of the error and throttle draws
+        :param accept_encodings: request Content-Encodings the server inflates, others are answered with 415
+        """
+        self.server = FakeServer((host, port), TriggerHandler)
+        self.server.cloud = self
+        self.latency = latency
+        self.errors = list(errors or [])
+        self.cold_start = cold_start
+        self.idle_timeout = idle_timeout
+        self.error_rate = error_rate
+        self.api_latency = api_latency
+        self.throttle_rate = throttle_rate
+        self.accept_encodings = tuple(accept_encodings)
+        self.requests = 0
+        self.cold_starts = 0
+        self.lock = threading.Lock()
+        self.fc = FakeFunctionCompute(lambda: self.url, deploy_time)
+        self.devs = FakeDevs(lambda: self.url, deploy_time)
+        self._random = random.Random(seed)
+        # last-use times of the idle instances, the most recently used one is reused first
+        self._idle = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Trigger url of the fake function."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def endpoint(self) -> str:
+        """host:port, the form the vendors take as their API endpoint."""
+        return self.url.split("://", 1)[1]
+
+    def chance(self, rate: float) -> bool:
+        """Draw whether an event of probability `rate` happens."""
+        if not rate:
+            return False
+        with self.lock:
+            return self._random.random() < rate
+
+    def acquire_instance(self):
+        """Take a warm instance, or start a new one and pay the cold start."""
+        now = time.monotonic()
+        with self.lock:
+            self._idle = [last_used for last_used in self._idle if now - last_used <= self.idle_timeout]
+            if self._idle:
+                return self._idle.pop()
+            self.cold_starts += 1
+        if self.cold_start:
+            time.sleep(self.cold_start)
+        return now
+
+    def release_instance(self, instance):
+        """Put an instance back, it stays warm for `idle_timeout` seconds."""
+        with self.lock:
+            self._idle.append(time.monotonic())
+
+    def __enter__(self):
+        """Start serving in a background thread."""
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,388 @@
+"""Client overhead benchmark suite against the local fake cloud, producing comparable JSON results.
+
+Scenarios:
+  invoke_sequential    one invoke after the other over the pooled transport
+  concurrency_scaling  ainvoke_many throughput at growing concurrency
+  invoke_with_faults   invokes under cold starts and 503s, with retries enabled
+  deploy_path          cold deploy through the FC API (create, poll, trigger), warm and stale cache deploys
+  cache_hit_path       result cache hit vs miss, and serve-only construction from the deployment cache
+  control_plane_scan   checking deployed functions one by one vs check_many, and listing them page by page
+  binary_upload        an image sent as base64 json vs raw bytes vs streamed from its file vs multipart
+  local_batching       concurrent invokes of a model deployed by the Local vendor, one request each vs batched
+  pipeline             three chained Local models, invoked one after the other per item vs streamed by Pipeline
+
+Metric names end with their unit: *_ms and *_us are lower-is-better, *_rps and *_ratio higher-is-better.
+
+usage: python -m benchmark.suite [--quick] [--output results.json] [--compare baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark.bench_transport import percentile  # noqa: E402
+from benchmark.fake_cloud import FakeCloud  # noqa: E402
+from maas.core import MaaS  # noqa: E402
+from maas.pipeline import Pipeline, Stage  # noqa: E402
+from utils.async_transport import AsyncTransport  # noqa: E402
+from utils.cache import Cache  # noqa: E402
+from utils.cache_backends import MemoryBackend  # noqa: E402
+from utils.polling import PollPolicy  # noqa: E402
+from utils.resilience import Resilience, RetryPolicy  # noqa: E402
+from utils.transport import Transport  # noqa: E402
+from vendor.alibaba import Alibaba  # noqa: E402
+from vendor.local import Local  # noqa: E402
+
+LOWER_IS_BETTER = ("_ms", "_us")
+HIGHER_IS_BETTER = ("_rps", "_ratio")
+
+
+class BenchModel(MaaS):
+    """MaaS without hub metadata, deployed as a plain FC function."""
+
+    def get_service_config(self, user_config: dict) -> dict:
+        """Default config."""
+        return user_config or {"cpu": 1, "memorySize": 1024}
+
+
+def summarize(samples: list, unit: str = "ms") -> dict:
+    scale = 1000 if unit == "ms" else 1e6
+    return {
+        f"p50_{unit}": round(statistics.median(samples) * scale, 3),
+        f"p99_{unit}": round(percentile(samples, 0.99) * scale, 3),
+        f"mean_{unit}": round(statistics.fmean(samples) * scale, 3),
+    }
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def serving_model(url: str, **kwargs) -> MaaS:
+    return MaaS.from_url(url, model_id="bench", **kwargs)
+
+
+def fake_vendor(cloud: FakeCloud) -> Alibaba:
+    vendor = Alibaba(ACCESS_KEY_ID="bench", ACCESS_KEY_SECRET="bench", logger=logging.getLogger("bench"),
+                     endpoint=cloud.endpoint, protocol="http",
+                     poll_policy=PollPolicy(initial=0.01, factor=1.5, max_interval=0.1, jitter=0, deadline=10),
+                     resilience=Resilience(retry=RetryPolicy(initial=0.01, jitter=0)))
+    # the deployments of the fake cloud stay out of the shared deployment cache
+    vendor.deploy_cache = Cache(backend=MemoryBackend())
+    return vendor
+
+
+def bench_invoke_sequential(requests: int) -> dict:
+    with FakeCloud() as cloud:
+        transport = Transport()
+        model = serving_model(cloud.url, transport=transport)
+        model.invoke({"input": "warmup"})
+        samples = [timed(lambda: model.invoke({"input": i})) for i in range(requests)]
+        transport.close()
+    return {"requests": requests, "throughput_rps": round(len(samples) / sum(samples), 1), **summarize(samples)}
+
+
+def bench_concurrency_scaling(requests: int, levels: tuple = (1, 8, 32, 128)) -> dict:
+    results = {"requests": requests, "server_ms": 5}
+    with FakeCloud(latency=0.005) as cloud:
+        for concurrency in levels:
+            async def run():
+                transport = AsyncTransport(pool_size=max(levels))
+                model = serving_model(cloud.url, async_transport=transport)
+                try:
+                    start = time.perf_counter()
+                    await model.ainvoke_many(({"input": i} for i in range(requests)), concurrency=concurrency)
+                    return time.perf_counter() - start
+                finally:
+                    await transport.close()
+
+            results[f"c{concurrency}_rps"] = round(requests / asyncio.run(run()), 1)
+    return results
+
+
+def bench_invoke_with_faults(requests: int) -> dict:
+    with FakeCloud(cold_start=0.02, idle_timeout=0.05, error_rate=0.05, seed=7) as cloud:
+        transport = Transport()
+        model = serving_model(cloud.url, transport=transport)
+        model.enable_resilience(retry=RetryPolicy(max_attempts=4, initial=0.005, jitter=0))
+        samples, failures = [], 0
+        for i in range(requests):
+            if i % 20 == 0:
+                # let the instance go idle now and then
+                time.sleep(0.06)
+            start = time.perf_counter()
+            try:
+                model.invoke({"input": i})
+            except Exception:
+                failures += 1
+            samples.append(time.perf_counter() - start)
+        transport.close()
+        snapshot = model.resilience.snapshot()
+    return {"requests": requests, "cold_starts": cloud.cold_starts, "retries": snapshot["retries"],
+            "success_ratio": round(1 - failures / requests, 4), **summarize(samples)}
+
+
+def bench_deploy_path(models: int) -> dict:
+    with FakeCloud(api_latency=0.002, deploy_time=0.03) as cloud:
+        vendor = fake_vendor(cloud)
+        cache = vendor.deploy_cache
+        cold, warm, stale = [], [], []
+        for i in range(models):
+            cold.append(timed(lambda: BenchModel(model_id=f"cold-{i}", cloud=vendor)))
+        for i in range(models):
+            warm.append(timed(lambda: BenchModel(model_id=f"cold-{i}", cloud=vendor)))
+        ttl, cache.ttl = cache.ttl, -1
+        try:
+            for i in range(models):
+                stale.append(timed(lambda: BenchModel(model_id=f"cold-{i}", cloud=vendor)))
+        finally:
+            cache.ttl = ttl
+    return {
+        "models": models,
+        "api_ms": 2,
+        "deploy_ms": 30,
+        "cold": summarize(cold),
+        "warm": summarize(warm, "us"),
+        "stale": summarize(stale),
+    }
+
+
+def bench_cache_hit_path(rounds: int) -> dict:
+    with FakeCloud() as cloud:
+        transport = Transport()
+        model = serving_model(cloud.url, transport=transport)
+        model.enable_result_cache()
+        misses = [timed(lambda: model.invoke({"input": i})) for i in range(rounds)]
+        hits = [timed(lambda: model.invoke({"input": i})) for i in range(rounds)]
+        transport.close()
+        cache = Cache(backend=MemoryBackend())
+        cache.set_cache(model.resource_name, {"url": cloud.url, "config": {}})
+        construct = [timed(lambda: MaaS.from_cache("bench", cache=cache)) for _ in range(rounds)]
+    return {
+        "rounds": rounds,
+        "miss": summarize(misses, "us"),
+        "hit": summarize(hits, "us"),
+        "from_cache": summarize(construct, "us"),
+    }
+
+
+def bench_control_plane_scan(functions: int) -> dict:
+    # closer to the latency of the real API than the other scenarios, parallel checks pay off with it
+    with FakeCloud(api_latency=0.02) as cloud:
+        names = [f"dipperai-bench-{i:04d}" for i in range(functions)]
+        for name in names:
+            cloud.fc.create_function({"functionName": name})
+            cloud.fc.handle_trigger("POST", name, None, {"triggerName": "dipperai_default_trigger"})
+        vendor = fake_vendor(cloud)
+        serial = timed(lambda: [vendor.check(name) for name in names])
+        parallel = timed(lambda: vendor.check_many(names))
+        listed = timed(lambda: vendor.list_functions(prefix="dipperai-"))
+    return {
+        "functions": functions,
+        "api_ms": 20,
+        "serial_ms": round(serial * 1000, 1),
+        "check_many_ms": round(parallel * 1000, 1),
+        "list_functions_ms": round(listed * 1000, 1),
+        "check_many_speedup_ratio": round(serial / parallel, 2),
+    }
+
+
+def bench_binary_upload(rounds: int, size: int = 4 * 1024 * 1024) -> dict:
+    path = os.path.abspath("bench-image.jpg")
+    image = os.urandom(size)
+    with open(path, "wb") as f:
+        f.write(image)
+    with FakeCloud() as cloud:
+        transport = Transport()
+        model = serving_model(cloud.url, transport=transport)
+        # what callers had to do before binary inputs: read, base64 encode and json encode the whole file;
+        # the fake echoes json bodies, so this also pays for a large response a real model would not send
+        base64_json = [timed(lambda: model.invoke({"image": base64.b64encode(open(path, "rb").read()).decode()}))
+                       for _ in range(rounds)]
+        raw = [timed(lambda: model.invoke(image)) for _ in range(rounds)]
+        file = [timed(lambda: model.invoke(Path(path))) for _ in range(rounds)]
+        multipart = [timed(lambda: model.invoke({"image": Path(path), "prompt": "ocr"})) for _ in range(rounds)]
+        transport.close()
+    os.remove(path)
+    return {
+        "rounds": rounds,
+        "image_bytes": size,
+        "base64_json": summarize(base64_json),
+        "raw_bytes": summarize(raw),
+        "file": summarize(file),
+        "multipart": summarize(multipart),
+        "file_speedup_ratio": round(statistics.median(base64_json) / statistics.median(file), 2),
+    }
+
+
+def bench_local_batching(requests: int, concurrency: int = 32) -> dict:
+    # the stub pays its latency per request, like a model paying its fixed cost per forward pass
+    with Local() as vendor:
+        url = vendor.create("dipperai-bench-local", {"mode": "stub", "latency": 0.005, "batch": True})["url"]
+        transport = Transport(pool_size=concurrency)
+        model = serving_model(url, transport=transport)
+
+        def throughput() -> float:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                start = time.perf_counter()
+                list(executor.map(model.invoke, range(requests)))
+                return round(requests / (time.perf_counter() - start), 1)
+
+        single = throughput()
+        before = vendor.stats("dipperai-bench-local")["requests"]
+        model.enable_batching(max_batch_size=16, max_wait=0.002)
+        batched = throughput()
+        model.disable_batching()
+        batch_requests = vendor.stats("dipperai-bench-local")["requests"] - before
+        transport.close()
+    return {
+        "requests": requests,
+        "server_ms": 5,
+        "single_rps": single,
+        "batched_rps": batched,
+        "inputs_per_request_ratio": round(requests / batch_requests, 2),
+    }
+
+
+def bench_pipeline(items: int, latencies: tuple = (0.01, 0.02, 0.005)) -> dict:
+    with Local() as vendor:
+        transport = Transport(pool_size=32)
+        models = [serving_model(vendor.create(f"dipperai-bench-stage-{i}", {"mode": "stub", "latency": latency,
+                                                                           "batch": True})["url"],
+                                transport=transport)
+                  for i, latency in enumerate(latencies)]
+
+        def unwrap(output):
+            return output["echo"]
+
+        def chain(item):
+            for model in models:
+                item = unwrap(model.invoke(item))
+            return item
+
+        serial = timed(lambda: [chain(i) for i in range(items)])
+        # each stage gets the echo of the previous one, like the hand written chain
+        pipeline = Pipeline([Stage(model, concurrency=4, prepare=unwrap if i else None, name=f"stage-{i}")
+                             for i, model in enumerate(models)])
+        streamed = timed(lambda: pipeline.run(range(items)))
+        transport.close()
+    return {
+        "items": items,
+        "stage_ms": [latency * 1000 for latency in latencies],
+        "serial_rps": round(items / serial, 1),
+        "pipeline_rps": round(items / streamed, 1),
+        "speedup_ratio": round(serial / streamed, 2),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick: bool = False) -> dict:
+    scale = 0.1 if quick else 1
+    results = {
+        "invoke_sequential": bench_invoke_sequential(int(2000 * scale)),
+        "concurrency_scaling": bench_concurrency_scaling(int(2000 * scale)),
+        "invoke_with_faults": bench_invoke_with_faults(int(400 * scale)),
+        "deploy_path": bench_deploy_path(max(3, int(20 * scale))),
+        "cache_hit_path": bench_cache_hit_path(int(1000 * scale)),
+        "control_plane_scan": bench_control_plane_scan(max(20, int(100 * scale))),
+        "binary_upload": bench_binary_upload(max(5, int(50 * scale))),
+        "local_batching": bench_local_batching(int(2000 * scale)),
+        "pipeline": bench_pipeline(int(400 * scale)),
+    }
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, int | float):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Find the metrics that got worse than the baseline by more than `tolerance`.
+
+    :param current: results of this run
+    :param baseline: results of the baseline run
+    :param tolerance: allowed relative change, like: 0.2
+    :return: list of (metric, baseline, current, relative change) regressions.
+    """
+    regressions = []
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    for name, value in now.items():
+        old = before.get(name)
+        if not old:
+            continue
+        change = (value - old) / old
+        if name.endswith(LOWER_IS_BETTER) and change > tolerance:
+            regressions.append((name, old, value, change))
+        elif name.endswith(HIGHER_IS_BETTER) and -change > tolerance:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the iterations")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline results to compare with, exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    # the deployment caches stay in memory and the run happens in a scratch directory, nothing is left behind
+    os.chdir(tempfile.mkdtemp(prefix="dipperai-bench-"))
+    logging.disable(logging.INFO)
+
+    report = run(quick=args.quick)
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, old, value, change in regressions:
+            print(f"REGRESSION {name}: {old} -> {value} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
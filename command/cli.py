@@ -0,0 +1,102 @@
+"""DipperAI command line.
+
+usage:
+  python -m command.cli map INPUT OUTPUT (--url URL | --model-id ID [--maas Modelscope]) [options]
+  python -m command.cli reconcile [--vendor Devs] [--region cn-hangzhou] [--prefix dipperai-] [options]
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from maas.bulk import DEFAULT_CHECKPOINT_EVERY, JSONL, PARQUET, RAISE, RECORD  # noqa: E402
+from maas.reconcile import RESOURCE_PREFIX, reconcile  # noqa: E402
+
+
+def load_model(args):
+    """Build a serve-only model: from a trigger url, or from the deployment cache of an earlier deploy."""
+    if args.maas == "MaaS":
+        from maas.core import MaaS as cls
+    else:
+        cls = getattr(importlib.import_module("maas"), args.maas)
+    if args.url:
+        return cls.from_url(args.url, model_id=args.model_id, model_version=args.model_version, debug=args.debug)
+    return cls.from_cache(args.model_id, model_version=args.model_version, debug=args.debug)
+
+
+def add_model_arguments(parser: argparse.ArgumentParser):
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="trigger url of a running model service")
+    target.add_argument("--model-id", help="model id of a model deployed before, looked up in the deployment cache")
+    # TongYi models are served by DashScope, they have no trigger url nor deployment cache entry
+    parser.add_argument("--maas", default="MaaS", choices=["MaaS", "HuggingFace", "Modelscope"],
+                        help="model platform the model was deployed with")
+    parser.add_argument("--model-version", default="master", help="model version")
+    parser.add_argument("--debug", action="store_true", help="debug logs")
+
+
+def command_map(args) -> int:
+    model = load_model(args)
+    stats = model.map_file(args.input, args.output, concurrency=args.concurrency, input_key=args.input_key,
+                           with_index=args.with_index, on_error=args.on_error, resume=not args.restart,
+                           checkpoint_every=args.checkpoint_every, input_format=args.format, timeout=args.timeout)
+    print(json.dumps(stats))
+    return 1 if stats["failed"] else 0
+
+
+def command_reconcile(args) -> int:
+    from utils.logger import setup_logger
+
+    kwargs = {"logger": setup_logger(debug=args.debug)}
+    if args.region:
+        kwargs["region"] = args.region
+    vendor = getattr(importlib.import_module("vendor"), args.vendor)(**kwargs)
+    report = reconcile(vendor, prefix=args.prefix, prune=not args.no_prune, adopt=not args.no_adopt,
+                       dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="dipperai")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    map_parser = commands.add_parser("map", help="bulk inference over a json lines / parquet file")
+    map_parser.add_argument("input", help="input file, .parquet / .pq files are read as parquet")
+    map_parser.add_argument("output", help="json lines output file, one result per input record, in order")
+    add_model_arguments(map_parser)
+    map_parser.add_argument("--concurrency", type=int, default=16, help="max invocations in flight")
+    map_parser.add_argument("--input-key", help="send this field of each record instead of the whole record")
+    map_parser.add_argument("--with-index", action="store_true", help='write {"index", "output"} lines')
+    map_parser.add_argument("--on-error", default=RAISE, choices=[RAISE, RECORD],
+                            help="stop at the first failed record, or write its error and go on")
+    map_parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    map_parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                            help="records written between two checkpoints")
+    map_parser.add_argument("--format", choices=[JSONL, PARQUET], help="input format, default from the extension")
+    map_parser.add_argument("--timeout", type=float, help="deadline of each invocation in seconds")
+    map_parser.set_defaults(func=command_map)
+
+    reconcile_parser = commands.add_parser("reconcile", help="sync the deployment cache with the deployed resources")
+    reconcile_parser.add_argument("--vendor", default="Devs", choices=["Devs", "Alibaba"],
+                                  help="vendor the models were deployed with")
+    reconcile_parser.add_argument("--region", help="vendor region, default is FC_REGION")
+    reconcile_parser.add_argument("--prefix", default=RESOURCE_PREFIX, help="resource name prefix")
+    reconcile_parser.add_argument("--no-prune", action="store_true", help="keep the entries of missing resources")
+    reconcile_parser.add_argument("--no-adopt", action="store_true", help="do not cache resources deployed elsewhere")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    reconcile_parser.add_argument("--debug", action="store_true", help="debug logs")
+    reconcile_parser.set_defaults(func=command_reconcile)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,14 @@
-from maas.modelscope import Modelscope
+import importlib
+
+# model platforms are imported on first use, see vendor/__init__.py
+_lazy_maas = {
+    "HuggingFace": "maas.huggingface",
+    "Modelscope": "maas.modelscope",
+    "TongYi": "maas.tongyi",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_maas:
+        return getattr(importlib.import_module(_lazy_maas[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,209 @@
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+JSONL = "jsonl"
+PARQUET = "parquet"
+# what to do with a record whose invocation failed: stop the run, or write the error in its place
+RAISE = "raise"
+RECORD = "record"
+DEFAULT_CHECKPOINT_EVERY = 100
+PARQUET_BATCH_SIZE = 1024
+
+
+def detect_format(path: str) -> str:
+    """Guess the input format from the file extension: .parquet / .pq are parquet, anything else json lines."""
+    return PARQUET if os.path.splitext(path)[1].lower() in (".parquet", ".pq") else JSONL
+
+
+def read_records(path: str, skip: int = 0, input_format: str = None):
+    """Read the records of a file lazily, one at a time.
+
+    :param path: input file
+    :param skip: number of leading records to skip, like: the records a previous run already wrote
+    :param input_format: jsonl or parquet, default is guessed from the extension
+    :return: generator of records.
+    """
+    input_format = input_format or detect_format(path)
+    if input_format == JSONL:
+        return _read_jsonl(path, skip)
+    if input_format == PARQUET:
+        return _read_parquet(path, skip)
+    raise ValueError(f"Unsupported input format: {input_format}")
+
+
+def _read_jsonl(path: str, skip: int):
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if skip:
+                # skipped records are counted, not decoded
+                skip -= 1
+                continue
+            yield json.loads(line)
+
+
+def _read_parquet(path: str, skip: int):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading parquet files needs the pyarrow package: pip install pyarrow") from None
+    parquet_file = pq.ParquetFile(path)
+    for row_group in range(parquet_file.num_row_groups):
+        rows = parquet_file.metadata.row_group(row_group).num_rows
+        if skip >= rows:
+            # whole row groups of finished records are not even read
+            skip -= rows
+            continue
+        for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, row_groups=[row_group]):
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            records = batch.slice(skip).to_pylist()
+            skip = 0
+            yield from records
+
+
+class Checkpoint:
+    def __init__(self, path: str, input_path: str):
+        """Progress of a bulk run, kept next to its output.
+
+        The output is written in input order, so the progress is the number of records written and the output
+        size at that point; a resumed run truncates whatever was written after the last checkpoint.
+
+        :param path: checkpoint file, like: results.jsonl.checkpoint
+        :param input_path: input file, its size and modification time must not change between runs
+        """
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+
+    def signature(self) -> dict:
+        """Identify the input file, a checkpoint of another input is not resumed."""
+        stat = os.stat(self.input_path)
+        return {"input": self.input_path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def load(self) -> dict:
+        """Read the saved progress.
+
+        :return: {"done", "offset", "complete"} dict, or None when there is no checkpoint.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("signature") != self.signature():
+            raise ValueError(f"{self.input_path} changed since the checkpoint {self.path} was written, "
+                             f"run again without resume to start over.")
+        return state
+
+    def save(self, done: int, offset: int, complete: bool = False):
+        """Write the progress atomically, the output must be flushed to `offset` first."""
+        state = {"signature": self.signature(), "done": done, "offset": offset, "complete": complete}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps(state))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def map_file(model, input_path: str, output_path: str, concurrency: int = 16, input_key: str = None,
+             with_index: bool = False, on_error: str = RAISE, resume: bool = True,
+             checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY, input_format: str = None,
+             timeout: float = None) -> dict:
+    """Invoke a model for every record of a file and write one json line per result, in input order.
+
+    Records are read lazily and at most `2 * concurrency` of them are in flight or waiting for an earlier record,
+    so memory stays flat whatever the file size. Progress is checkpointed to `<output_path>.checkpoint`; a run
+    that stopped (crash, ctrl-c, failed record) continues after the last checkpointed record, or starts over
+    when the output is missing or shorter than the checkpoint.
+
+    :param model: MaaS object; its invoke options (result cache, batching, resilience, ...) apply to every record
+    :param input_path: json lines or parquet file
+    :param output_path: json lines output file
+    :param concurrency: max number of invocations in flight
+    :param input_key: send this field of each record as the model input, default is the whole record
+    :param with_index: write {"index": n, "output": result} lines instead of bare results
+    :param on_error: raise: stop at the first failed record, it is retried by the next run;
+                     record: write {"error": message} (with its index) in place of the result and go on
+    :param resume: continue from the checkpoint, False starts over
+    :param checkpoint_every: records written between two checkpoints
+    :param input_format: jsonl or parquet, default is guessed from the extension
+    :param timeout: deadline of each invocation in seconds, see `MaaS.invoke`
+    :return: {"records", "skipped", "processed", "failed", "seconds"} dict.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if on_error not in (RAISE, RECORD):
+        raise ValueError(f"on_error must be {RAISE!r} or {RECORD!r}")
+    start = time.perf_counter()
+    checkpoint = Checkpoint(output_path + ".checkpoint", input_path)
+    state = checkpoint.load() if resume else None
+    if state and (not os.path.exists(output_path) or os.path.getsize(output_path) < state["offset"]):
+        # the output was deleted or cut after the checkpoint, what the checkpoint counts is gone
+        model.logger.warning(f"{output_path} is missing or shorter than its checkpoint, starting over.")
+        state = None
+    done, offset = (state["done"], state["offset"]) if state else (0, 0)
+    stats = {"records": done, "skipped": done, "processed": 0, "failed": 0, "seconds": 0.0}
+    if state and state["complete"]:
+        model.logger.info(f"{output_path} is already complete, {done} records.")
+        return stats
+
+    output = open(output_path, "r+b" if state else "wb")
+    output.truncate(offset)
+    output.seek(offset)
+    window = deque()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="dipperai-bulk")
+
+    def write_head():
+        index, future = window.popleft()
+        try:
+            line = {"index": index, "output": future.result()} if with_index else future.result()
+        except Exception as e:
+            if on_error == RAISE:
+                raise
+            stats["failed"] += 1
+            line = {"index": index, "error": str(e)} if with_index else {"error": str(e)}
+        output.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+        stats["processed"] += 1
+        stats["records"] += 1
+        if stats["records"] % checkpoint_every == 0:
+            save()
+
+    def save(complete: bool = False):
+        output.flush()
+        os.fsync(output.fileno())
+        checkpoint.save(stats["records"], output.tell(), complete)
+
+    try:
+        index = done
+        for record in read_records(input_path, skip=done, input_format=input_format):
+            payload = record[input_key] if input_key else record
+            window.append((index, executor.submit(model.invoke, payload, timeout=timeout)))
+            index += 1
+            # write every finished record at the head, and wait for the head only when the window is full
+            while window and (len(window) >= 2 * concurrency or window[0][1].done()):
+                write_head()
+        while window:
+            write_head()
+        save(complete=True)
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        save()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        output.close()
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    model.logger.info(f"Wrote {stats['records']} records to {output_path}, {stats['failed']} failed, "
+                      f"in {stats['seconds']}s.")
+    return stats
@@ -1,9 +1,22 @@
+import copy
 import importlib
 import hashlib
-import requests
-from vendor import Devs
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from maas.hedging import DeadlineExceeded, Hedger, remaining
+from maas.reconcile import cache_owner
+from maas.router import EWMA, ReplicaRouter, check_status
 from utils.logger import setup_logger
-from utils.cache import OperateCache, cache
+from utils import config_diff
+from utils.metrics import metrics
+from utils.payload import GZIP, aiter_body, check_replayable, compressor, encode_request, has_binary, prepare
+from utils.cache import Cache, OperateCache, get_cache
+from utils.transport import Transport, default_transport
+from utils.batching import MicroBatcher
+from utils.result_cache import ResultCache, WaitTimeout
+from utils.resilience import Resilience, RetryPolicy, check_response
+from utils.streaming import STREAM_ACCEPT, aiter_stream, iter_stream
+from utils.async_transport import AsyncTransport, bounded_map, default_async_transport
 
 model_default_error = "Model service exception."
 model_check_error = "Model service check failed."
@@ -11,10 +24,22 @@ model_update_error = "Model service update failed."
 model_create_error = "Model service create failed."
 
 
+class ResponseError(Exception):
+    def __init__(self, message: str, status: int):
+        """A model service answer that is not a result, like: a 5xx error body; raised where it must not be cached.
+
+        :param message: error message
+        :param status: http status code
+        """
+        super().__init__(message)
+        self.status = status
+
+
 class MaaS:
 
     def __init__(self, model_url=None, model_id=None, model_version="master", cloud=None, service_config=None,
-                 service_url=None, debug=False):
+                 service_url=None, debug=False, transport: Transport = None,
+                 async_transport: AsyncTransport = None):
         """
         init default vars
         :param model_url: model url, like: https://modelscope.cn/models/iic/cv_convnextTiny_ocr-recognition-general_damo/summary
@@ -24,7 +49,24 @@ class MaaS:
         :param service_config: function/container config
         :param service_url: service url
         :param debug: debug mode
+        :param transport: pooled http transport, default is the process-wide one
+        :param async_transport: asyncio http transport, default is the one shared by the running event loop
         """
+        self._init_client(model_url=model_url, model_id=model_id, model_version=model_version, cloud=cloud,
+                          service_url=service_url, debug=debug, transport=transport, async_transport=async_transport)
+        self.model_meta = self.get_model_meta()
+        self.resource_name = self.get_resource_name()
+        self.user_service_config = service_config
+        self.service_config = self.get_service_config(service_config)
+        # 部署模型
+        with metrics.timer("deploy", self.resource_name):
+            deployed = self.__deploy()
+        if not deployed:
+            raise Exception("Failed to deploy model to cloud.")
+
+    def _init_client(self, model_url=None, model_id=None, model_version="master", cloud=None, service_url=None,
+                     debug=False, transport: Transport = None, async_transport: AsyncTransport = None):
+        """Init the vars needed to invoke the model, shared by `__init__`, `from_cache` and `from_url`."""
         self.default_resource_name = None
         self.service_url = service_url
         self.model_id = model_id
@@ -32,13 +74,90 @@ class MaaS:
         self.model_version = model_version
         self.maas_name = self.__class__.__name__.lower()
         self.logger = setup_logger(debug=debug)
-        self.vendor = cloud or Devs(logger=self.logger)
-        self.model_meta = self.get_model_meta()
-        self.resource_name = self.get_resource_name()
-        self.service_config = self.get_service_config(service_config)
-        # 部署模型
-        if not self.__deploy():
-            raise Exception("Failed to deploy model to cloud.")
+        self.transport = transport or default_transport()
+        self.async_transport = async_transport
+        self.batcher = None
+        self.result_cache = None
+        self.router = None
+        self.hedger = None
+        self.resilience = None
+        self.default_timeout = None
+        self.compression = None
+        self.compression_min_size = 1024
+        # trigger urls that answered 415 to a compressed body, they get plain bodies from then on
+        self.uncompressed_urls = set()
+        self.model_meta = {}
+        self.service_config = {}
+        self.user_service_config = None
+        self._vendor = cloud
+
+    @property
+    def vendor(self):
+        """The cloud/vendor attr, the default Devs client is only built when the control plane is needed."""
+        if self._vendor is None:
+            from vendor.devs import Devs
+            self._vendor = Devs(logger=self.logger)
+        return self._vendor
+
+    @vendor.setter
+    def vendor(self, value):
+        self._vendor = value
+
+    @classmethod
+    def from_cache(cls, model_id: str, model_version: str = "master", debug: bool = False,
+                   transport: Transport = None, async_transport: AsyncTransport = None, cache: Cache = None):
+        """
+        serve-only construction: go straight from the resource name to the cached service url, without cloud
+        credentials, hub metadata or config resolution; the model must have been deployed before
+        :param model_id: model name / model id
+        :param model_version: model version
+        :param debug: debug mode
+        :param transport: pooled http transport, default is the process-wide one
+        :param async_transport: asyncio http transport, default is the one shared by the running event loop
+        :param cache: deployment cache, default is the shared one
+        :return: MaaS object ready to invoke
+        """
+        model = cls.__new__(cls)
+        model._init_client(model_id=model_id, model_version=model_version, debug=debug, transport=transport,
+                           async_transport=async_transport)
+        model.resource_name = model.get_resource_name()
+        with metrics.timer("cache", model.resource_name):
+            cache_model_info = (cache or get_cache()).get_cache(model.resource_name)
+        if not cache_model_info.get("url"):
+            raise Exception(f"{model_check_error} Model {model.resource_name} is not in the deployment cache, "
+                            f"deploy it first.")
+        model.service_url = cache_model_info["url"]
+        model.service_config = cache_model_info.get("config", {})
+        return model
+
+    @classmethod
+    def from_url(cls, service_url: str, model_id: str = None, model_version: str = "master", debug: bool = False,
+                 transport: Transport = None, async_transport: AsyncTransport = None):
+        """
+        serve-only construction for a service that is already running at a known trigger url
+        :param service_url: service url
+        :param model_id: model name / model id, only used to name the resource in logs and metrics
+        :param model_version: model version
+        :param debug: debug mode
+        :param transport: pooled http transport, default is the process-wide one
+        :param async_transport: asyncio http transport, default is the one shared by the running event loop
+        :return: MaaS object ready to invoke
+        """
+        model = cls.__new__(cls)
+        model._init_client(model_id=model_id, model_version=model_version, service_url=service_url, debug=debug,
+                           transport=transport, async_transport=async_transport)
+        model.resource_name = model.get_resource_name()
+        return model
+
+    @classmethod
+    def deploy_async(cls, **kwargs):
+        """
+        deploy the model in a background worker, see `maas.deploy.deploy_async`
+        :param kwargs: arguments of the MaaS class
+        :return: DeploymentHandle, call `result()` or await it to get the ready model
+        """
+        from maas.deploy import deploy_async
+        return deploy_async(cls, **kwargs)
 
     def get_config_func_name(self) -> str:
         """
@@ -74,18 +193,7 @@ class MaaS:
                     True: indicates consistency
                     False: indicates inconsistency (requires update operation)
         """
-        for key, value in new.items():
-            if key not in old:
-                print(key)
-                return False
-            if isinstance(value, dict):
-                if not isinstance(old[key], dict) or not self.check_config(value, old[key]):
-                    print(key)
-                    return False
-            elif old[key] != value:
-                print(key)
-                return False
-        return True
+        return not config_diff.diff(new, old)
 
     def get_resource_name(self) -> str:
         """
@@ -111,6 +219,7 @@ class MaaS:
             return True
 
         # get cache
+        #   0. cache entry older than the cache ttl: re-validate with the vendor, drop it if the resource is gone
         #   1. get cache success:
         #     1.1 config mismatching: update
         #       1.1.1 update success: return
@@ -118,18 +227,32 @@ class MaaS:
         #       1.1.3 update unknown: raise exception
         #     1.2 config matching: return
         #   2. get cache failed: continue
-        with OperateCache(cache) as cache_data:
-            cache_model_info = cache_data.get_cache(self.resource_name)
+        # vendors whose resources do not outlive the process keep their own cache, like: vendor.local.Local
+        with OperateCache(getattr(self.vendor, "deploy_cache", None) or get_cache()) as cache_data:
+            with metrics.timer("cache", self.resource_name):
+                cache_model_info = cache_data.get_cache(self.resource_name)
+            if cache_model_info and cache_model_info.get("url") and cache_data.is_stale(self.resource_name):
+                cache_model_info = self.revalidate(cache_data, cache_model_info)
+            desired = config_diff.fingerprint(self.service_config)
+            # tagged, so `reconcile` of another vendor or region leaves the entry alone
+            owner = cache_owner(self.vendor)
             if cache_model_info and cache_model_info.get("url"):
-                if not self.check_config(self.service_config, cache_model_info.get("config", {})):
-                    update_result = self.vendor.update(self.resource_name, self.service_config)
-                    if update_result and update_result.get("url") and update_result.get("config"):
-                        cache_data.set_cache(self.resource_name, update_result)
-                        self.service_url = update_result["url"]
-                        self.service_config = update_result["config"]
-                        return True
-                    else:
-                        raise BaseException(model_update_error)
+                # same fingerprint: this config was already found deployed, no need to walk it
+                if cache_model_info.get("fingerprint") != desired:
+                    patch = config_diff.diff(self.service_config, cache_model_info.get("config", {}))
+                    if patch:
+                        self.logger.info(f"Model {self.resource_name} config changed: "
+                                         f"{', '.join(config_diff.changed_fields(patch))}.")
+                        update_result = self.vendor.update(self.resource_name, self.service_config, patch=patch)
+                        if update_result and update_result.get("url") and update_result.get("config"):
+                            cache_data.set_cache(self.resource_name, {**update_result, "fingerprint": desired, **owner})
+                            self.service_url = update_result["url"]
+                            self.service_config = update_result["config"]
+                            return True
+                        else:
+                            raise BaseException(model_update_error)
+                    cache_data.set_cache(self.resource_name, {**cache_model_info, "fingerprint": desired, **owner},
+                                         verified=False)
                 self.logger.info(f"Model {self.resource_name} already deployed.")
                 self.service_url = cache_model_info["url"]
                 return True
@@ -140,18 +263,537 @@ class MaaS:
             #    3. create resources unknown: raise exception
             create_result = self.vendor.create(self.resource_name, self.service_config)
             if create_result and create_result.get("url") and create_result.get("config"):
-                cache_data.set_cache(self.resource_name, create_result)
+                cache_data.set_cache(self.resource_name, {**create_result, "fingerprint": desired, **owner})
                 self.service_url = create_result["url"]
                 self.service_config = create_result["config"]
                 return True
             else:
                 raise BaseException(model_create_error)
 
-    def invoke(self, input: any, headers: dict = None) -> dict:
+    def revalidate(self, cache_data, cache_model_info: dict) -> dict:
+        """Check a stale cache entry with the vendor, so deleted resources are not invoked.
+
+        :param cache_data: the deployment cache
+        :param cache_model_info: the cached entry
+        :return: the refreshed entry, or {} if the resource no longer exists
         """
-        invoke MaaS
-        :param input: input data
+        try:
+            check_result, exists = self.vendor.check(self.resource_name)
+        except Exception as e:
+            # the cached entry is still the best guess when the vendor cannot be reached
+            self.logger.warning(f"Failed to re-validate model {self.resource_name}: {e}")
+            return cache_model_info
+        if not exists:
+            self.logger.warning(f"Model {self.resource_name} no longer exists, it will be deployed again.")
+            cache_data.delete_cache(self.resource_name)
+            return {}
+        if check_result and check_result.get("url"):
+            # the fingerprint stays valid as long as the deployed config did not drift
+            if "fingerprint" in cache_model_info and \
+                    not config_diff.diff(cache_model_info.get("config") or {}, check_result.get("config") or {}):
+                check_result = {**check_result, "fingerprint": cache_model_info["fingerprint"]}
+            cache_model_info = {**check_result, **cache_owner(self.vendor)}
+        cache_data.set_cache(self.resource_name, cache_model_info)
+        return cache_model_info
+
+    def invoke(self, input: any, headers: dict = None, timeout: float = None) -> dict:
+        """Invoke MaaS.
+
+        :param input: input data; binary inputs (bytes, memoryview, pathlib.Path, binary file objects or
+                      `utils.payload.Binary`) are sent as the raw request body, a dict holding binary values as
+                      a multipart/form-data body, both streamed without base64
+        :param headers: request headers
+        :param timeout: deadline of the whole call in seconds, including failover and hedged attempts;
+                        default is `self.default_timeout`, None falls back to the transport connect/read timeouts
         :return: MaaS output
         """
+        timeout = self.default_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with metrics.timer("invoke", self.resource_name):
+            # calls with their own headers or binary inputs are neither cached nor batched
+            binary = has_binary(input)
+            if self.result_cache is not None and headers is None and not binary:
+                key = ResultCache.key(self.resource_name, self.model_version, input)
+
+                def compute():
+                    # only successful answers are cached, error bodies raise ResponseError instead
+                    return self._invoke(input, deadline=deadline, require_ok=True)
+
+                try:
+                    return self.result_cache.get_or_compute(key, compute, timeout=remaining(deadline))
+                except WaitTimeout:
+                    raise DeadlineExceeded("Invocation deadline exceeded.") from None
+            if binary:
+                return self._post(input, headers=headers, deadline=deadline)
+            return self._invoke(input, headers=headers, deadline=deadline)
+
+    def _invoke(self, input: any, headers: dict = None, deadline: float = None, require_ok: bool = False) -> dict:
+        """Send one invocation upstream.
+
+        :param require_ok: raise ResponseError for non 2xx answers instead of returning their body
+        """
         self.logger.info(f"Invoke {self.maas_name}: {self.service_url}")
-        return requests.post(self.service_url, json=input, headers=headers).json()
+        if self.batcher and headers is None and not has_binary(input):
+            try:
+                return self.batcher.submit(input).result(timeout=remaining(deadline))
+            except FutureTimeoutError:
+                raise DeadlineExceeded("Invocation deadline exceeded.") from None
+        return self._post(input, headers=headers, deadline=deadline, require_ok=require_ok)
+
+    def _post(self, payload: any, headers: dict = None, deadline: float = None, require_ok: bool = False) -> any:
+        """Post a payload to the service, see `_route`.
+
+        The body is encoded again for every attempt, so files are re-read from the start.
+
+        :param require_ok: raise ResponseError for non 2xx answers instead of returning their body
+        """
+        payload = self._prepare_payload(payload)
+
+        def post(url):
+            kwargs = {}
+            left = remaining(deadline)
+            if left is not None:
+                kwargs["timeout"] = (min(self.transport.timeout[0], left), left)
+            compress = self._compression_for(url)
+            start = time.perf_counter()
+            try:
+                # new pooled connections tag their connect / tls samples with the resource name
+                with metrics.scope(self.resource_name), \
+                        encode_request(payload, headers, compress, self.compression_min_size) as request:
+                    response = self.transport.post(url, **request, **kwargs)
+            except Exception:
+                # a transport timeout at the deadline is reported as the deadline
+                remaining(deadline)
+                raise
+            if response.status_code == 415 and compress and "Content-Encoding" in request["headers"]:
+                self._reject_compression(url)
+                return post(url)
+            if self.resilience is not None:
+                check_response(response.status_code, response.headers, url)
+            if self.router is not None:
+                check_status(response.status_code, url)
+            if require_ok and not 200 <= response.status_code < 300:
+                raise ResponseError(f"{model_default_error} {url} answered {response.status_code}.",
+                                    response.status_code)
+            body = response.json()
+            if metrics.enabled:
+                ttfb = response.elapsed.total_seconds()
+                metrics.observe("ttfb", ttfb, self.resource_name)
+                metrics.observe("decode", time.perf_counter() - start - ttfb, self.resource_name)
+            return body
+
+        return self._route(post, deadline)
+
+    def _route(self, post, deadline: float = None, hedge: bool = True) -> any:
+        """Call `post(url)` through the replica router when the model has replicas.
+
+        Retried when resilience is enabled, and hedged when hedging is enabled and `hedge` is set.
+        """
+        def attempt(url):
+            if self.resilience is None:
+                return post(url)
+            return self.resilience.call(url, lambda: post(url), deadline=deadline)
+
+        def send():
+            if self.router is None:
+                return attempt(self.service_url)
+            return self.router.call(attempt)
+
+        if hedge and self.hedger is not None:
+            return self.hedger.call(send, deadline=deadline)
+        return send()
+
+    async def _apost(self, payload: any, headers: dict = None, deadline: float = None,
+                     require_ok: bool = False) -> any:
+        """Async twin of `_post`."""
+        payload = self._prepare_payload(payload)
+        transport = self.async_transport or default_async_transport()
+
+        async def post(url):
+            compress = self._compression_for(url)
+            try:
+                with metrics.scope(self.resource_name), \
+                        encode_request(payload, headers, compress, self.compression_min_size) as request:
+                    if "data" in request:
+                        request["data"] = aiter_body(request["data"])
+                    status, body = await transport.post(url, **request, timeout=remaining(deadline))
+            except Exception:
+                remaining(deadline)
+                raise
+            if status == 415 and compress and "Content-Encoding" in request["headers"]:
+                self._reject_compression(url)
+                return await post(url)
+            if self.resilience is not None:
+                check_response(status, url=url)
+            if self.router is not None:
+                check_status(status, url)
+            if require_ok and not 200 <= status < 300:
+                raise ResponseError(f"{model_default_error} {url} answered {status}.", status)
+            return body
+
+        return await self._aroute(post, deadline)
+
+    async def _aroute(self, post, deadline: float = None, hedge: bool = True) -> any:
+        """Async twin of `_route`."""
+        async def attempt(url):
+            if self.resilience is None:
+                return await post(url)
+            return await self.resilience.acall(url, lambda: post(url), deadline=deadline)
+
+        async def send():
+            if self.router is None:
+                return await attempt(self.service_url)
+            return await self.router.acall(attempt)
+
+        if hedge and self.hedger is not None:
+            return await self.hedger.acall(send, deadline=deadline)
+        return await send()
+
+    def _prepare_payload(self, payload: any) -> any:
+        """Wrap binary inputs once per call.
+
+        One-shot streams cannot be re-sent by retries, failover or hedges, and a file object cannot be read by
+        two hedged attempts at once.
+        """
+        payload = prepare(payload)
+        if self.resilience is not None or self.router is not None or self.hedger is not None:
+            check_replayable(payload, concurrent=self.hedger is not None)
+        return payload
+
+    def _compression_for(self, url: str) -> str:
+        if self.compression is None or url in self.uncompressed_urls:
+            return None
+        return self.compression
+
+    def _reject_compression(self, url: str):
+        self.logger.info(f"{url} does not accept {self.compression} request bodies, sending them uncompressed.")
+        self.uncompressed_urls.add(url)
+
+    def enable_compression(self, encoding: str = GZIP, min_size: int = 1024):
+        """Compress request bodies of at least `min_size` bytes with Content-Encoding `encoding`.
+
+        A trigger url answering 415 Unsupported Media Type gets the request again uncompressed, and plain bodies
+        afterwards. Worth it for large json or raw audio / text inputs, not for already compressed images or
+        video; response bodies are decompressed by the transports whatever this setting.
+
+        :param encoding: gzip, or zstd which needs the `zstandard` package
+        :param min_size: smaller bodies are sent as they are
+        """
+        # fail here, not at the first invocation, when the encoding is unknown or its package is missing
+        compressor(encoding)
+        self.compression = encoding
+        self.compression_min_size = min_size
+        self.uncompressed_urls = set()
+
+    def disable_compression(self):
+        """Send request bodies uncompressed."""
+        self.compression = None
+
+    def enable_resilience(self, retry: RetryPolicy = None, rate: float = None, failure_threshold: int = 5,
+                          reset_timeout: float = 30.0) -> Resilience:
+        """Retry throttled and failing invocations, see `Resilience`.
+
+        Throttled (429) and failing (5xx) invocations are retried with backoff, a trigger url that keeps failing
+        is not called for a while, and the call rate is optionally capped.
+
+        :param retry: RetryPolicy, default is RetryPolicy()
+        :param rate: max invocations per second, None is unlimited
+        :param failure_threshold: consecutive failures that open the circuit of a trigger url
+        :param reset_timeout: seconds an open circuit refuses calls
+        :return: the resilience layer, its `snapshot()` shows retries and circuit states
+        """
+        self.resilience = Resilience(retry=retry, rate=rate, failure_threshold=failure_threshold,
+                                     reset_timeout=reset_timeout)
+        return self.resilience
+
+    def enable_hedging(self, percentile: float = 0.95, budget: float = 0.05, min_delay: float = 0.01) -> Hedger:
+        """Hedge slow calls, see `Hedger`.
+
+        When an attempt has not answered within the `percentile` of observed latency, a duplicate is sent (to
+        another replica when there is one) and the first answer is kept.
+
+        :param percentile: latency percentile after which a call is hedged
+        :param budget: hedges allowed per call on average
+        :param min_delay: lower bound of the hedge delay in seconds
+        :return: the hedger, its `snapshot()` shows how often calls were hedged and won
+        """
+        self.disable_hedging()
+        self.hedger = Hedger(percentile=percentile, budget=budget, min_delay=min_delay)
+        return self.hedger
+
+    def disable_hedging(self):
+        """Go back to one attempt per call."""
+        if self.hedger:
+            self.hedger.close()
+            self.hedger = None
+
+    def add_replica(self, url: str, name: str = None, strategy: str = EWMA) -> ReplicaRouter:
+        """Route invocations between this deployment and another copy of the model.
+
+        :param url: trigger url of the replica
+        :param name: replica name, like: its resource name
+        :param strategy: routing strategy used when the router is created, see `ReplicaRouter`
+        :return: the router, its `snapshot()` shows per replica latency and load
+        """
+        if self.router is None:
+            self.router = ReplicaRouter(strategy=strategy)
+            self.router.add(self.service_url, self.resource_name)
+        self.router.add(url, name)
+        return self.router
+
+    def deploy_replicas(self, regions: list, cloud_factory=None, strategy: str = EWMA) -> ReplicaRouter:
+        """Deploy the model to more regions, each as its own resource, and route invocations between all of them.
+
+        :param regions: region ids, like: ["cn-hangzhou", "cn-shanghai"]
+        :param cloud_factory: callable building the vendor of a region, default is the vendor class with `region=`
+        :param strategy: routing strategy, see `ReplicaRouter`
+        :return: the router
+        """
+        from maas.deploy import default_deploy_executor
+        futures = [default_deploy_executor().submit(self._deploy_replica, region, cloud_factory) for region in regions]
+        for future in futures:
+            replica = future.result()
+            self.add_replica(replica.service_url, replica.resource_name, strategy=strategy)
+        return self.router
+
+    def _deploy_replica(self, region: str, cloud_factory=None):
+        """Deploy a copy of this model to `region`, named after this resource with the region as suffix."""
+        replica = copy.copy(self)
+        replica.vendor = cloud_factory(region) if cloud_factory else \
+            self.vendor.__class__(region=region, logger=self.logger)
+        if hasattr(replica, "region"):
+            replica.region = region
+        replica.default_resource_name = f"{self.resource_name}-{region}"
+        replica.resource_name = replica.get_resource_name()
+        replica.service_url = None
+        replica.router = replica.batcher = replica.result_cache = replica.hedger = None
+        replica.service_config = replica.get_service_config(self.user_service_config)
+        if not replica.__deploy():
+            raise Exception(f"Failed to deploy model replica to {region}.")
+        return replica
+
+    def enable_result_cache(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = None,
+                            disk_dir: str = None) -> ResultCache:
+        """Serve repeated inputs of `invoke` and `ainvoke` from a result cache, only for deterministic models.
+
+        See `ResultCache`; streams, binary inputs and calls with their own headers are not cached.
+
+        :param max_bytes: max size of the in-process tier
+        :param ttl: seconds a result is served, None keeps it until evicted
+        :param disk_dir: directory of the optional on-disk tier, like: .cache/results
+        :return: the cache, its `snapshot()` shows the hit / miss counters
+        """
+        self.result_cache = ResultCache(max_bytes=max_bytes, ttl=ttl, disk_dir=disk_dir)
+        return self.result_cache
+
+    def invoke_stream(self, input: any, headers: dict = None, timeout: float = None):
+        """Invoke MaaS and yield the output incrementally as the service produces it.
+
+        The request goes through the replica router, retries and request compression like `invoke`, but is never
+        hedged, and once the first chunk is read the stream is not retried.
+
+        :param input: input data, binary inputs as in `invoke`
+        :param headers: request headers
+        :param timeout: deadline of the whole stream in seconds, checked between chunks, and every socket read
+                        waits at most the time left; default is `self.default_timeout`, None falls back to the
+                        transport connect/read timeouts, which still bound a stalled stream
+        :return: generator of server-sent events / ndjson records (decoded json when possible),
+                 or raw bytes chunks for other content types
+        """
+        self.logger.info(f"Invoke {self.maas_name} (stream): {self.service_url}")
+        timeout = self.default_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        payload = self._prepare_payload(input)
+        headers = {"Accept": STREAM_ACCEPT, **(headers or {})}
+
+        def open_stream(url):
+            kwargs = {}
+            left = remaining(deadline)
+            if left is not None:
+                kwargs["timeout"] = (min(self.transport.timeout[0], left), left)
+            compress = self._compression_for(url)
+            try:
+                with metrics.scope(self.resource_name), \
+                        encode_request(payload, headers, compress, self.compression_min_size) as request:
+                    response = self.transport.post(url, stream=True, **request, **kwargs)
+            except Exception:
+                remaining(deadline)
+                raise
+            try:
+                if response.status_code == 415 and compress and "Content-Encoding" in request["headers"]:
+                    self._reject_compression(url)
+                    return open_stream(url)
+                if self.resilience is not None:
+                    check_response(response.status_code, response.headers, url)
+                if self.router is not None:
+                    check_status(response.status_code, url)
+                response.raise_for_status()
+            except BaseException:
+                response.close()
+                raise
+            return response
+
+        # a hedged duplicate would leave the losing stream open
+        response = self._route(open_stream, deadline, hedge=False)
+        try:
+            for chunk in iter_stream(response):
+                remaining(deadline)
+                yield chunk
+        except Exception:
+            remaining(deadline)
+            raise
+        finally:
+            response.close()
+
+    def map_file(self, input_path: str, output_path: str, concurrency: int = 16, **kwargs) -> dict:
+        """Bulk inference, see `maas.bulk.map_file`.
+
+        MaaS is invoked for every record of a json lines / parquet file and the results are written to a json
+        lines file in input order; an interrupted run is resumed.
+
+        :param input_path: input file
+        :param output_path: output file, its progress is checkpointed to `<output_path>.checkpoint`
+        :param concurrency: max number of invocations in flight
+        :param kwargs: input_key, with_index, on_error, resume, checkpoint_every, input_format, timeout
+        :return: run statistics
+        """
+        from maas.bulk import map_file
+        return map_file(self, input_path, output_path, concurrency=concurrency, **kwargs)
+
+    def enable_batching(self, max_batch_size: int = 8, max_wait: float = 0.01,
+                        max_concurrent_batches: int = 4) -> MicroBatcher:
+        """Collect concurrent invoke calls into batched requests, see `MicroBatcher`.
+
+        :param max_batch_size: max number of inputs per request
+        :param max_wait: max seconds an input waits for the batch to fill
+        :param max_concurrent_batches: max number of batched requests in flight
+        :return: the batcher, its `metrics.snapshot()` shows how full the batches are
+        """
+        self.disable_batching()
+        self.batcher = MicroBatcher(self.invoke_batch, max_batch_size=max_batch_size, max_wait=max_wait,
+                                    max_concurrent_batches=max_concurrent_batches)
+        return self.batcher
+
+    def disable_batching(self):
+        """Flush pending batched calls and go back to one request per invoke."""
+        if self.batcher:
+            self.batcher.close()
+            self.batcher = None
+
+    def invoke_batch(self, inputs: list) -> list:
+        """Invoke MaaS once for a list of inputs.
+
+        :param inputs: input data list
+        :return: MaaS outputs, one per input
+        """
+        self.logger.info(f"Invoke {self.maas_name} with a batch of {len(inputs)}: {self.service_url}")
+        response = self._post(self.build_batch_payload(inputs))
+        return self.split_batch_response(response, len(inputs))
+
+    def build_batch_payload(self, inputs: list) -> any:
+        """Build the request body of a batch; the default containers take a json array of inputs.
+
+        :param inputs: input data list
+        :return: request body
+        """
+        return inputs
+
+    def split_batch_response(self, response: any, size: int) -> list:
+        """Split the response of a batch into one output per input.
+
+        :param response: decoded response body
+        :param size: number of inputs in the batch
+        :return: MaaS outputs
+        """
+        if not isinstance(response, list) or len(response) != size:
+            raise Exception(f"{model_default_error} Expected a list of {size} outputs for the batch.")
+        return response
+
+
+    async def ainvoke(self, input: any, headers: dict = None, timeout: float = None) -> dict:
+        """Invoke MaaS without blocking the event loop.
+
+        :param input: input data, binary inputs as in `invoke`
+        :param headers: request headers
+        :param timeout: deadline of the whole call in seconds, see `invoke`
+        :return: MaaS output
+        """
+        self.logger.debug(f"Invoke {self.maas_name}: {self.service_url}")
+        timeout = self.default_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with metrics.timer("invoke", self.resource_name):
+            # shares the result cache and its in-flight calls with `invoke`
+            if self.result_cache is not None and headers is None and not has_binary(input):
+                key = ResultCache.key(self.resource_name, self.model_version, input)
+
+                async def compute():
+                    return await self._apost(input, deadline=deadline, require_ok=True)
+
+                try:
+                    return await self.result_cache.aget_or_compute(key, compute, timeout=remaining(deadline))
+                except WaitTimeout:
+                    raise DeadlineExceeded("Invocation deadline exceeded.") from None
+            return await self._apost(input, headers=headers, deadline=deadline)
+
+    async def ainvoke_many(self, inputs, concurrency: int = 16, headers: dict = None, timeout: float = None) -> list:
+        """Invoke MaaS for every input with bounded concurrency.
+
+        :param inputs: iterable of input data, consumed lazily
+        :param concurrency: max number of in-flight requests of this call
+        :param timeout: deadline of each single invocation in seconds
+        :return: MaaS outputs, in the order of the inputs
+        """
+        return await bounded_map(lambda item: self.ainvoke(item, headers=headers, timeout=timeout), inputs,
+                                 concurrency)
+
+    async def ainvoke_stream(self, input: any, headers: dict = None, timeout: float = None):
+        """Async twin of `invoke_stream`.
+
+        :param input: input data, binary inputs as in `invoke`
+        :param headers: request headers
+        :param timeout: deadline of the whole stream in seconds, see `invoke_stream`
+        :return: async generator of the output chunks
+        """
+        self.logger.debug(f"Invoke {self.maas_name} (stream): {self.service_url}")
+        timeout = self.default_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        payload = self._prepare_payload(input)
+        headers = {"Accept": STREAM_ACCEPT, **(headers or {})}
+        transport = self.async_transport or default_async_transport()
+
+        async def open_stream(url):
+            compress = self._compression_for(url)
+            try:
+                with metrics.scope(self.resource_name), \
+                        encode_request(payload, headers, compress, self.compression_min_size) as request:
+                    if "data" in request:
+                        request["data"] = aiter_body(request["data"])
+                    # the total timeout also bounds reading the stream
+                    response = await transport.open_stream(url, **request, timeout=remaining(deadline))
+            except Exception:
+                remaining(deadline)
+                raise
+            try:
+                if response.status == 415 and compress and "Content-Encoding" in request["headers"]:
+                    self._reject_compression(url)
+                    return await open_stream(url)
+                if self.resilience is not None:
+                    check_response(response.status, url=url)
+                if self.router is not None:
+                    check_status(response.status, url)
+                response.raise_for_status()
+            except BaseException:
+                response.release()
+                raise
+            return response
+
+        response = await self._aroute(open_stream, deadline, hedge=False)
+        try:
+            async for chunk in aiter_stream(response):
+                remaining(deadline)
+                yield chunk
+        except Exception:
+            remaining(deadline)
+            raise
+        finally:
+            response.release()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+DEFAULT_DEPLOY_WORKERS = 4
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def default_deploy_executor() -> ThreadPoolExecutor:
+    """Get the process-wide deployment worker pool, created on first use.
+
+    :return: ThreadPoolExecutor.
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = ThreadPoolExecutor(max_workers=DEFAULT_DEPLOY_WORKERS,
+                                                       thread_name_prefix="dipperai-deploy")
+    return _default_executor
+
+
+class DeploymentHandle:
+    def __init__(self, name: str, future: Future):
+        """Handle of a model deployment running in the background.
+
+        The handle can be polled with `done()`, waited on with `result()`, or awaited from asyncio code.
+
+        :param name: a readable name of the deployment, like: huggingface:distilbert/distilbert-base-uncased
+        :param future: future resolved with the deployed MaaS object
+        """
+        self.name = name
+        self.future = future
+
+    def done(self) -> bool:
+        """Check whether the deployment finished, successfully or not."""
+        return self.future.done()
+
+    def result(self, timeout: float = None):
+        """Wait for the deployment and get the model.
+
+        :param timeout: seconds to wait, None waits until the deployment finishes
+        :return: the deployed MaaS object, ready to invoke.
+        """
+        return self.future.result(timeout=timeout)
+
+    def exception(self, timeout: float = None):
+        """Get the error of a failed deployment, or None."""
+        return self.future.exception(timeout=timeout)
+
+    def __await__(self):
+        """Await the deployed model: `model = await handle`."""
+        return asyncio.wrap_future(self.future).__await__()
+
+    def __repr__(self):
+        """Show the name and the state of the deployment."""
+        state = "ready" if self.done() and not self.future.exception() else "failed" if self.done() else "pending"
+        return f"<DeploymentHandle {self.name} {state}>"
+
+
+def _spec_name(maas_class, kwargs: dict) -> str:
+    model_id = kwargs.get("model_id") or kwargs.get("model_url") or ""
+    return f"{maas_class.__name__.lower()}:{model_id}"
+
+
+def deploy_async(maas_class, executor: ThreadPoolExecutor = None, **kwargs) -> DeploymentHandle:
+    """Construct (and so deploy) a MaaS object in a worker thread.
+
+    :param maas_class: MaaS subclass, like: HuggingFace, Modelscope
+    :param executor: worker pool, default is the process-wide deployment pool
+    :param kwargs: arguments of the MaaS class
+    :return: DeploymentHandle, returned right away.
+    """
+    executor = executor or default_deploy_executor()
+    return DeploymentHandle(_spec_name(maas_class, kwargs), executor.submit(maas_class, **kwargs))
+
+
+def deploy_all(specs: list, max_workers: int = DEFAULT_DEPLOY_WORKERS) -> list:
+    """Deploy many models in parallel with a bounded worker pool.
+
+    :param specs: list of (maas_class, kwargs) tuples, like: [(HuggingFace, {"model_id": "gpt2"})]
+    :param max_workers: max number of deployments running at the same time
+    :return: list of DeploymentHandle, in the order of the specs, returned right away.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dipperai-deploy")
+    handles = [deploy_async(maas_class, executor=executor, **kwargs) for maas_class, kwargs in specs]
+    # queued deployments still run, the pool threads exit once they are done
+    executor.shutdown(wait=False)
+    return handles
+
+
+def as_ready(handles: list, timeout: float = None):
+    """Yield the handles as their deployments finish, fastest first.
+
+    :param handles: list of DeploymentHandle
+    :param timeout: seconds to wait for all of them
+    :return: generator of DeploymentHandle, check `exception()` before `result()` to skip failed ones.
+    """
+    by_future = {handle.future: handle for handle in handles}
+    for future in as_completed(by_future, timeout=timeout):
+        yield by_future[future]
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+DEFAULT_HEDGE_WORKERS = 64
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def default_hedge_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool running the attempts of hedged calls, created on first use.
+
+    :return: ThreadPoolExecutor.
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = ThreadPoolExecutor(max_workers=DEFAULT_HEDGE_WORKERS,
+                                                       thread_name_prefix="dipperai-hedge")
+    return _default_executor
+
+
+class DeadlineExceeded(TimeoutError):
+    """The per-call deadline passed before an answer arrived."""
+
+
+def remaining(deadline: float) -> float:
+    """Get the seconds left before a monotonic deadline.
+
+    :param deadline: time.monotonic() based deadline, None means no deadline
+    :return: seconds, or None without a deadline.
+    :raises DeadlineExceeded: if the deadline already passed.
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Invocation deadline exceeded.")
+    return left
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 1000):
+        """The latest `size` latency samples.
+
+        :param size: max number of samples kept
+        """
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        """Record the latency of a call."""
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        """Get the p-th percentile of the samples.
+
+        :param p: percentile in [0, 1]
+        :return: seconds, or None without samples.
+        """
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class Hedger:
+    def __init__(self, percentile: float = 0.95, budget: float = 0.05, min_delay: float = 0.01,
+                 min_samples: int = 20, burst: float = 10.0, max_workers: int = None):
+        """Send a duplicate of a call that has not answered within the `percentile` of observed latency.
+
+        Whichever answer arrives first is kept.
+
+        :param percentile: latency percentile after which a call is hedged
+        :param budget: hedges allowed per call on average, like: 0.05 allows one hedge per 20 calls
+        :param min_delay: lower bound of the hedge delay in seconds
+        :param min_samples: no hedging until this many latencies were observed
+        :param burst: max number of hedges that can be saved up
+        :param max_workers: max number of attempts in flight in a pool of this hedger, closed by `close`;
+                            default shares the process-wide pool, so short-lived models do not own threads
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.burst = burst
+        self.latency = LatencyWindow()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_won": 0, "over_budget": 0}
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self._own_executor = max_workers is not None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dipperai-hedge") \
+            if self._own_executor else default_hedge_executor()
+
+    def close(self):
+        """Shut down the pool of this hedger, if it has its own; the shared pool stays up."""
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        """Use the hedger in a with block, its pool is closed on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Close the pool of the hedger."""
+        self.close()
+
+    def delay(self) -> float:
+        """Get the current hedge delay.
+
+        :return: seconds, or None while there are too few samples to hedge.
+        """
+        if len(self.latency.samples) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency.percentile(self.percentile))
+
+    def _count_call(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["hedged"] += 1
+                return True
+            self.stats["over_budget"] += 1
+            return False
+
+    def _timed(self, send):
+        start = time.perf_counter()
+        result = send()
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    def call(self, send, deadline: float = None) -> any:
+        """Run `send()`, hedging it with a second `send()` when it is slow.
+
+        :param send: callable sending one attempt
+        :param deadline: time.monotonic() based deadline of the whole call
+        :return: the first successful answer.
+        """
+        self._count_call()
+        delay = self.delay()
+        if delay is None:
+            return self._timed(send)
+        primary = self._executor.submit(self._timed, send)
+        left = remaining(deadline)
+        done, _ = wait([primary], timeout=delay if left is None else min(delay, left))
+        attempts = [primary]
+        if not done and self._take_token():
+            attempts.append(self._executor.submit(self._timed, send))
+        return self._first_success(attempts, deadline)
+
+    def _first_success(self, attempts: list, deadline: float) -> any:
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("Invocation deadline exceeded.")
+            for future in done:
+                if future.exception() is None:
+                    if future is not attempts[0]:
+                        with self._lock:
+                            self.stats["hedge_won"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, send, deadline: float = None) -> any:
+        """Async twin of `call`, `send()` returns an awaitable."""
+        import asyncio
+
+        async def timed():
+            start = time.perf_counter()
+            result = await send()
+            self.latency.add(time.perf_counter() - start)
+            return result
+
+        self._count_call()
+        delay = self.delay()
+        if delay is None:
+            return await timed()
+        attempts = [asyncio.ensure_future(timed())]
+        try:
+            left = remaining(deadline)
+            done, _ = await asyncio.wait(attempts, timeout=delay if left is None else min(delay, left))
+            if not done and self._take_token():
+                attempts.append(asyncio.ensure_future(timed()))
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=remaining(deadline),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded("Invocation deadline exceeded.")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not attempts[0]:
+                            with self._lock:
+                                self.stats["hedge_won"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # unlike threads, the losing attempt can be cancelled
+            for task in attempts:
+                task.cancel()
+
+    def snapshot(self) -> dict:
+        """Get the hedge counters, the current hedge delay and the tokens left."""
+        with self._lock:
+            return {**self.stats, "delay_seconds": self.delay(), "tokens": self._tokens}
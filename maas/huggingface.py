@@ -1,18 +1,21 @@
 import os
 import importlib
-import requests
 from maas.core import MaaS
-from vendor import Alibaba
+from utils.async_transport import AsyncTransport
+from utils.meta_cache import get_meta_cache
+from utils.transport import Transport
 
 
 class HuggingFace(MaaS):
     def __init__(self, model_id: str, model_version: str = "master", service_config: dict = None,
-                 cloud: any = None, service_url: str = None):
+                 cloud: any = None, service_url: str = None, transport: Transport = None,
+                 async_transport: AsyncTransport = None):
         self.region = os.environ.get("HF_REGION", "cn-beijing")
         self.access_token = os.environ.get("HF_ACCESS_TOKEN", None)
         self.hf_endpoint = os.environ.get("HF_ENDPOINT") or "https://huggingface.co"
         super().__init__(model_id=model_id, model_version=model_version, cloud=cloud,
-                         service_config=service_config, service_url=service_url)
+                         service_config=service_config, service_url=service_url, transport=transport,
+                         async_transport=async_transport)
 
     def get_model_meta(self):
         """
@@ -28,13 +31,20 @@ class HuggingFace(MaaS):
         """
         # 构造请求元数据的URL
         meta_url = f"{self.hf_endpoint}/api/models/{self.model_id}"
-        # 发送GET请求获取元数据
-        r = requests.get(meta_url)
-        # 如果请求状态码不是200，抛出异常
-        if r.status_code != 200:
-            raise Exception("Failed to get model meta data from huggingface.co")
-        # 返回解析后的JSON响应
-        return r.json()
+
+        def fetch(etag):
+            # 发送GET请求获取元数据，带上缓存的ETag进行条件请求
+            r = self.transport.get(meta_url, headers={"If-None-Match": etag} if etag else None)
+            if r.status_code == 304:
+                return None, etag
+            # 如果请求状态码不是200，抛出异常
+            if r.status_code != 200:
+                raise Exception("Failed to get model meta data from huggingface.co")
+            # 返回解析后的JSON响应
+            return r.json(), r.headers.get("ETag")
+
+        # 优先使用元数据缓存，过期后才访问huggingface.co
+        return get_meta_cache().get("huggingface", self.model_id, self.model_version, fetch)
 
     def get_service_config(self, user_config: dict) -> dict:
         """
@@ -2,30 +2,38 @@ import importlib
 import json
 import os
 
-import requests
 from maas.core import MaaS
+from utils.async_transport import AsyncTransport
+from utils.meta_cache import get_meta_cache
+from utils.transport import Transport
 from version import __version__
 
 
 class Modelscope(MaaS):
     def __init__(self, model_id: str, model_version: str = "master", service_config: dict = None,
-                 cloud: any = None, service_url: str = None):
+                 cloud: any = None, service_url: str = None, transport: Transport = None,
+                 async_transport: AsyncTransport = None):
         """Initialize the Modelscope instance.
         :param model_id: The ID of the model.
         :param model_version: The version of the model, default is "master".
         :param service_config: The configuration for the model.
         :param cloud: The cloud provider.
         :param service_url: The URL of the model.
+        :param transport: The pooled http transport.
+        :param async_transport: The asyncio http transport.
         """
         self.region = os.environ.get("MS_REGION", "cn-hangzhou")
         self.access_token = os.environ.get("DASHSCOPE_API_KEY", None)
+        # login cookies of this model, sent per request so they never land in the shared transport session
+        self.cookies = None
         self.model_version = model_version
-        super().__init__(model_id=model_id, model_version=model_version, cloud=cloud,
-                         service_config=service_config, service_url=service_url)
         self.headers = {
             "Content-Type": "application/json",
             "User-Agent": "dipperai@%s" % __version__,
         }
+        super().__init__(model_id=model_id, model_version=model_version, cloud=cloud,
+                         service_config=service_config, service_url=service_url, transport=transport,
+                         async_transport=async_transport)
 
     def get_service_config(self, user_config: dict) -> dict:
         """
@@ -40,14 +48,17 @@ class Modelscope(MaaS):
 
     def login(self):
         """
-        login to modelscope, get cookie and add it to self.headers;
+        login to modelscope, get cookie and keep it in self.cookies;
         source code: https://modelscope.cn/docs/api_docs/API文档%2Fbuild%2Fjson%2F_modules%2Fmodelscope%2Fhub%2Fapi%2F%23HubApi.login
         :return:
         """
         login_url = "https://modelscope.cn/api/v1/login"
         payload = json.dumps({"AccessToken": self.access_token})
-        response_attr = requests.request("POST", login_url, headers=self.headers, data=payload)
-        self.headers["Cookie"] = response_attr.cookies
+        import requests
+        # not through the pooled transport: its session would keep the cookies for every model of the process
+        response_attr = requests.post(login_url, headers=self.headers, data=payload,
+                                      timeout=self.transport.timeout)
+        self.cookies = response_attr.cookies
 
     def get_task(self):
         """
@@ -57,6 +68,16 @@ class Modelscope(MaaS):
         """
         file_url = 'https://modelscope.cn/api/v1/models/%s/repo?Revision=%s&FilePath=configuration.json' % (
             self.model_id, self.model_version)
-        if self.token: self.login()
-        response_json = json.loads(requests.request("POST", file_url, headers=self.headers).content.decode("utf-8"))
-        return response_json["task"]
+
+        def fetch(etag):
+            # login only when the hub has to be asked
+            if self.access_token and self.cookies is None:
+                self.login()
+            headers = {**self.headers, "If-None-Match": etag} if etag else self.headers
+            response = self.transport.post(file_url, headers=headers, cookies=self.cookies)
+            if response.status_code == 304:
+                return None, etag
+            response_json = json.loads(response.content.decode("utf-8"))
+            return {"task": response_json["task"]}, response.headers.get("ETag")
+
+        return get_meta_cache().get("modelscope", self.model_id, self.model_version, fetch)["task"]
@@ -0,0 +1,322 @@
+import queue
+import threading
+import time
+
+from maas.bulk import RAISE, RECORD
+from utils.metrics import metrics
+
+# seconds a blocked worker waits between two looks at the stop flag
+POLL_INTERVAL = 0.05
+
+# end of the input, passed from stage to stage behind the last item
+_DONE = object()
+
+
+class StageError(Exception):
+    def __init__(self, stage: str, error: Exception):
+        """Error of an item that failed in `stage`, the original error is kept in `error`."""
+        super().__init__(f"Stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    def __init__(self, model, concurrency: int = 4, batch_size: int = 1, max_wait: float = 0.01, prepare=None,
+                 name: str = None, queue_size: int = None, timeout: float = None):
+        """One step of a `Pipeline`.
+
+        :param model: MaaS object, or any object with `invoke(input)` and, for batches, `invoke_batch(inputs)`
+        :param concurrency: max number of invocations (or batches) of this stage in flight
+        :param batch_size: max number of items sent in one `invoke_batch` call, 1 sends them one by one
+        :param max_wait: max seconds the first item of a batch waits for company
+        :param prepare: turns the output of the previous stage (or the pipeline input) into the input of this
+                        one, like: lambda ocr: {"prompt": "summarize: " + ocr["text"]}; default passes it as is
+        :param name: stage name in logs, errors and stats, default is the model resource name or the position
+        :param queue_size: max number of items waiting for this stage, default is 2 * concurrency * batch_size;
+                           a full queue blocks the previous stage, which is the backpressure
+        :param timeout: deadline of each single invocation in seconds, see `MaaS.invoke`
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if batch_size > 1 and not hasattr(model, "invoke_batch"):
+            raise ValueError("batch_size > 1 needs a model with invoke_batch")
+        self.model = model
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.prepare = prepare
+        self.name = name or getattr(model, "resource_name", None)
+        self.queue_size = queue_size or 2 * concurrency * batch_size
+        self.timeout = timeout
+
+    def call(self, values: list) -> list:
+        """Invoke the model for the outputs of the previous stage.
+
+        :param values: outputs of the previous stage
+        :return: outputs of this stage, one per value.
+        """
+        inputs = [self.prepare(value) for value in values] if self.prepare else values
+        if self.batch_size > 1:
+            return self.model.invoke_batch(inputs)
+        if self.timeout is None:
+            return [self.model.invoke(inputs[0])]
+        return [self.model.invoke(inputs[0], timeout=self.timeout)]
+
+
+class StageStats:
+    def __init__(self):
+        """Counters of one stage in one run; the stage with the highest busy ratio is the bottleneck."""
+        self.items = 0
+        self.calls = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, items: int, seconds: float, failed: bool):
+        """Record a call of the stage over `items` items."""
+        with self.lock:
+            self.items += items
+            self.calls += 1
+            self.failed += items if failed else 0
+            self.busy += seconds
+
+    def snapshot(self, concurrency: int, elapsed: float) -> dict:
+        """Get the counters, the busy ratio is taken over `concurrency` workers for `elapsed` seconds."""
+        with self.lock:
+            return {
+                "items": self.items,
+                "calls": self.calls,
+                "failed": self.failed,
+                "busy_seconds": round(self.busy, 3),
+                # share of the stage capacity used over the run, close to 1 for the stage that limits throughput
+                "busy_ratio": round(self.busy / (concurrency * elapsed), 3) if elapsed else 0.0,
+            }
+
+
+class _Failed:
+    def __init__(self, stage: str, error: Exception):
+        self.stage = stage
+        self.error = error
+
+
+class Pipeline:
+    def __init__(self, stages: list, on_error: str = RAISE, max_in_flight: int = None):
+        """Chain models so items stream through them.
+
+        While stage N works on item k+1, stage N+1 already works on item k, and throughput is bound by the
+        slowest stage instead of the sum of all of them. Every stage runs its own workers between bounded queues,
+        see `Stage`; outputs come out in input order.
+
+        :param stages: Stage objects, or models that get the default Stage options
+        :param on_error: raise: stop at the first failed item and raise StageError;
+                         record: yield {"error": message, "stage": name} in place of its output and go on
+        :param max_in_flight: max number of items read from the input and not yet yielded, default is the
+                              total capacity of the stages and their queues; bounds the memory of outputs
+                              waiting for a slow earlier item
+        """
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        if on_error not in (RAISE, RECORD):
+            raise ValueError(f"on_error must be {RAISE!r} or {RECORD!r}")
+        self.stages = [stage if isinstance(stage, Stage) else Stage(stage) for stage in stages]
+        names = [stage.name or f"stage-{position}" for position, stage in enumerate(self.stages)]
+        if len(set(names)) != len(names):
+            raise ValueError(f"stage names must be unique, got {names}; name the stages sharing a model")
+        for stage, name in zip(self.stages, names):
+            stage.name = name
+        self.on_error = on_error
+        self.max_in_flight = max_in_flight or sum(
+            stage.queue_size + stage.concurrency * stage.batch_size for stage in self.stages
+        )
+        self.stats = {}
+        self.elapsed = 0.0
+
+    def map(self, items):
+        """Run the items through the stages.
+
+        :param items: iterable of inputs of the first stage, read lazily as capacity frees up
+        :return: generator of the outputs of the last stage, in input order; closing it early stops the run.
+        """
+        stop = threading.Event()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        inboxes = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        outbox = queue.Queue()
+        stats = {stage.name: StageStats() for stage in self.stages}
+        self.stats = stats
+        threads = [threading.Thread(target=self._feed, args=(items, inboxes[0], in_flight, outbox, stop),
+                                    name="dipperai-pipeline-feed", daemon=True)]
+        for position, stage in enumerate(self.stages):
+            next_box = inboxes[position + 1] if position + 1 < len(self.stages) else outbox
+            workers = _Workers(stage.concurrency)
+            for i in range(stage.concurrency):
+                threads.append(threading.Thread(
+                    target=self._work, args=(stage, inboxes[position], next_box, workers, stats[stage.name], stop),
+                    name=f"dipperai-pipeline-{stage.name}-{i}", daemon=True,
+                ))
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        try:
+            yield from self._collect(outbox, in_flight)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.monotonic() - started
+
+    def run(self, items) -> list:
+        """Run the items through the stages.
+
+        :param items: iterable of inputs of the first stage
+        :return: outputs of the last stage, in input order.
+        """
+        return list(self.map(items))
+
+    def snapshot(self) -> dict:
+        """Per stage counters of the last run, see `StageStats`.
+
+        :return: stage name -> {"items", "calls", "failed", "busy_seconds", "busy_ratio"}.
+        """
+        return {stage.name: self.stats[stage.name].snapshot(stage.concurrency, self.elapsed)
+                for stage in self.stages if stage.name in self.stats}
+
+    def _feed(self, items, inbox: queue.Queue, in_flight: threading.BoundedSemaphore, outbox: queue.Queue,
+              stop: threading.Event):
+        try:
+            items = iter(items)
+            index = 0
+            while True:
+                # wait for the consumer to take an output before reading more input
+                while not in_flight.acquire(timeout=POLL_INTERVAL):
+                    if stop.is_set():
+                        return
+                try:
+                    item = next(items)
+                except StopIteration:
+                    _put(inbox, _DONE, stop)
+                    return
+                if not _put(inbox, (index, item), stop):
+                    return
+                index += 1
+        except BaseException as e:
+            # a failing input iterator ends the run, the consumer raises its error
+            outbox.put(e)
+
+    def _work(self, stage: Stage, inbox: queue.Queue, next_box: queue.Queue, workers: "_Workers",
+              stats: StageStats, stop: threading.Event):
+        while not stop.is_set():
+            batch, done = self._take(stage, inbox, stop)
+            if batch:
+                values = [value for _, value in batch]
+                # failed items skip the remaining stages
+                ready = [i for i, value in enumerate(values) if not isinstance(value, _Failed)]
+                if ready:
+                    started = time.perf_counter()
+                    try:
+                        with metrics.timer("stage", stage.name):
+                            outputs = stage.call([values[i] for i in ready])
+                        if len(outputs) != len(ready):
+                            raise ValueError(f"Batch of {len(ready)} items returned {len(outputs)} results.")
+                    except Exception as e:
+                        outputs = [_Failed(stage.name, e)] * len(ready)
+                    stats.record(len(ready), time.perf_counter() - started, isinstance(outputs[0], _Failed))
+                    for i, output in zip(ready, outputs):
+                        values[i] = output
+                for (index, _), value in zip(batch, values):
+                    if not _put(next_box, (index, value), stop):
+                        return
+            if done:
+                # the other workers of the stage see the end too, the last one passes it on
+                _put(inbox, _DONE, stop)
+                if workers.finish():
+                    _put(next_box, _DONE, stop)
+                return
+
+    def _take(self, stage: Stage, inbox: queue.Queue, stop: threading.Event) -> tuple:
+        """Wait for the next item, and for company up to `stage.max_wait` if the stage batches.
+
+        :return: ([(index, value)], end of input seen) tuple.
+        """
+        entry = _get(inbox, stop)
+        if entry is None:
+            return [], False
+        if entry is _DONE:
+            return [], True
+        batch = [entry]
+        deadline = time.monotonic() + stage.max_wait
+        while len(batch) < stage.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = inbox.get(timeout=remaining) if remaining > 0 else inbox.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _DONE:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _collect(self, outbox: queue.Queue, in_flight: threading.BoundedSemaphore):
+        # outputs finished ahead of an earlier item wait here, `in_flight` bounds how many
+        pending = {}
+        next_index = 0
+        while True:
+            entry = outbox.get()
+            if isinstance(entry, BaseException):
+                raise entry
+            if entry is _DONE:
+                return
+            index, value = entry
+            pending[index] = value
+            while next_index in pending:
+                value = pending.pop(next_index)
+                next_index += 1
+                in_flight.release()
+                if isinstance(value, _Failed):
+                    if self.on_error == RAISE:
+                        raise StageError(value.stage, value.error) from value.error
+                    value = {"error": str(value.error), "stage": value.stage}
+                yield value
+
+
+class _Workers:
+    def __init__(self, count: int):
+        self.count = count
+        self.lock = threading.Lock()
+
+    def finish(self) -> bool:
+        """Count a worker out.
+
+        :return: True for the last one.
+        """
+        with self.lock:
+            self.count -= 1
+            return self.count == 0
+
+
+def _put(box: queue.Queue, entry: any, stop: threading.Event) -> bool:
+    """Put into a bounded queue, giving up when the run stops.
+
+    :return: False if the run stopped first.
+    """
+    while True:
+        try:
+            box.put(entry, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            if stop.is_set():
+                return False
+
+
+def _get(box: queue.Queue, stop: threading.Event) -> any:
+    """Get from a queue, giving up when the run stops.
+
+    :return: the entry, None if the run stopped first.
+    """
+    while True:
+        try:
+            return box.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if stop.is_set():
+                return None
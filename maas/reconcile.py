@@ -0,0 +1,83 @@
+from utils.cache import Cache, OperateCache, get_cache
+from utils.config_diff import diff
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+RESOURCE_PREFIX = "dipperai-"
+
+
+def cache_owner(vendor) -> dict:
+    """Tag the deployment cache entries written for the resources of `vendor`, see `reconcile`.
+
+    :param vendor: cloud/vendor attr, like: Devs(), Alibaba()
+    :return: {"vendor": vendor class name, "region": region id, None for vendors without regions}.
+    """
+    return {"vendor": vendor.__class__.__name__, "region": getattr(vendor, "region", None)}
+
+
+def reconcile(vendor, cache: Cache = None, prefix: str = RESOURCE_PREFIX, prune: bool = True, adopt: bool = True,
+              dry_run: bool = False) -> dict:
+    """Sync the deployment cache with what the vendor actually runs, in one paginated sweep.
+
+    Cached entries of resources that are ready get their url and config refreshed and are marked verified, so
+    `MaaS.__deploy` trusts them for another cache ttl instead of re-validating them one by one; entries of
+    resources that no longer exist are pruned. Resources still deploying are left as they are. The cache is
+    written once at the end.
+
+    Only entries tagged with the vendor and region of `vendor` (see `cache_owner`) are pruned: the cache also
+    holds the resources of other vendors and regions, like: the replicas of `MaaS.deploy_replicas`, which are
+    missing from this listing but alive. Untagged entries, written by older versions, are never pruned.
+
+    :param vendor: cloud/vendor attr with `list_resources(prefix)`, like: Devs(), Alibaba()
+    :param cache: deployment cache, default is the global one
+    :param prefix: resource name prefix of the entries to reconcile
+    :param prune: delete the entries of this vendor and region whose resources no longer exist
+    :param adopt: add the ready resources that are not cached yet, so new processes start warm
+    :param dry_run: only report what would change
+    :return: resource names grouped by what happened to them:
+             verified (unchanged), refreshed, adopted, pruned, pending (still deploying).
+    """
+    cache = cache or get_cache()
+    owner = cache_owner(vendor)
+    resources = vendor.list_resources(prefix=prefix)
+    report = {"verified": [], "refreshed": [], "adopted": [], "pruned": [], "pending": []}
+    with OperateCache(cache) as cache_data:
+        for name in sorted(set(cache_data.keys()) | set(resources)):
+            if not name.startswith(prefix):
+                continue
+            cached = cache_data.get_cache(name)
+            if name not in resources:
+                if cached and prune and all(cached.get(key) == value for key, value in owner.items()):
+                    report["pruned"].append(name)
+                    if not dry_run:
+                        cache_data.delete_cache(name)
+                continue
+            resource = resources[name]
+            if not resource.get("url"):
+                report["pending"].append(name)
+                continue
+            if not cached:
+                if not adopt:
+                    continue
+                state = "adopted"
+            elif cached.get("url") == resource["url"] and not diff(cached.get("config") or {},
+                                                                   resource.get("config") or {}):
+                # compared on the fields the entry holds: listings carry more, like: the Alibaba triggers
+                state = "verified"
+            else:
+                state = "refreshed"
+            report[state].append(name)
+            if dry_run:
+                continue
+            if state == "verified":
+                entry = {**cached, **owner}
+            else:
+                entry = {**cached, "url": resource["url"], "config": resource.get("config", {}), **owner}
+                # the deployed config moved, the next deploy has to diff it again
+                entry.pop("fingerprint", None)
+            # set_cache also marks the entry verified now
+            cache_data.set_cache(name, entry)
+    logger.info(f"Reconciled {len(resources)} {vendor.__class__.__name__} resources: " +
+                ", ".join(f"{len(names)} {state}" for state, names in report.items()))
+    return report
@@ -0,0 +1,198 @@
+import threading
+import time
+
+from maas.hedging import DeadlineExceeded
+from utils.resilience import TransientError
+
+EWMA = "ewma"
+LEAST_OUTSTANDING = "least_outstanding"
+# requests and aiohttp errors of unreachable or stalled replicas, they do not derive from the builtin ones
+TRANSPORT_ERRORS = ("ConnectionError", "Timeout", "ClientConnectionError")
+
+
+class ReplicaError(Exception):
+    """A replica answered with a status worth failing over for (429 / 5xx)."""
+
+
+def check_status(status_code: int, url: str):
+    """Raise ReplicaError for answers another replica may serve better.
+
+    :param status_code: http status code
+    :param url: replica url
+    """
+    if status_code == 429 or status_code >= 500:
+        raise ReplicaError(f"Replica {url} answered {status_code}.")
+
+
+def is_replica_failure(error: BaseException) -> bool:
+    """Classify an exception as a failure of the replica, worth failing over for.
+
+    :param error: the exception
+    :return: True for ReplicaError, TransientError, connection errors and transport timeouts; False for the
+             deadline of the call and errors of the call itself, like: a 4xx answer or a payload failing to encode.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, ReplicaError | TransientError | ConnectionError | TimeoutError):
+        return True
+    return any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__)
+
+
+class Replica:
+    def __init__(self, url: str, name: str = None):
+        """One deployed copy of a model.
+
+        :param url: trigger url
+        :param name: readable name, like: the resource name or region
+        """
+        self.url = url
+        self.name = name or url
+        self.ewma = None
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.down_until = 0.0
+
+    def snapshot(self) -> dict:
+        """Get the health and latency of the replica."""
+        return {
+            "url": self.url,
+            "ewma_seconds": self.ewma,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "healthy": self.down_until <= time.monotonic(),
+        }
+
+
+class ReplicaRouter:
+    def __init__(self, replicas: list = None, strategy: str = EWMA, alpha: float = 0.3, cooldown: float = 30.0):
+        """Route each call to the best replica and fail over to the next one on errors.
+
+        :param replicas: list of Replica
+        :param strategy: ewma picks the lowest latency EWMA weighted by the requests in flight,
+                         least_outstanding picks the replica with the fewest requests in flight
+        :param alpha: weight of the newest sample in the EWMA
+        :param cooldown: seconds a failed replica is skipped while healthy ones are left
+        """
+        if strategy not in (EWMA, LEAST_OUTSTANDING):
+            raise ValueError(f"Unknown routing strategy: {strategy}")
+        self.replicas = list(replicas or [])
+        self.strategy = strategy
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def add(self, url: str, name: str = None) -> Replica:
+        """Add a replica serving at `url`, `name` defaults to the url."""
+        replica = Replica(url, name)
+        with self._lock:
+            self.replicas.append(replica)
+        return replica
+
+    def _score(self, replica: Replica) -> tuple:
+        if self.strategy == LEAST_OUTSTANDING:
+            return replica.outstanding, replica.ewma or 0.0
+        # replicas without samples score 0 so they get measured first
+        return (replica.ewma or 0.0) * (replica.outstanding + 1), replica.outstanding
+
+    def choose(self, exclude: tuple = ()) -> Replica:
+        """Pick a replica and count the request as in flight; pair with `release`.
+
+        :param exclude: replicas already tried by this call
+        :return: Replica, or None if every replica was tried.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [replica for replica in self.replicas if replica not in exclude]
+            if not candidates:
+                return None
+            # replicas in cooldown are only used when nothing healthy is left
+            healthy = [replica for replica in candidates if replica.down_until <= now] or candidates
+            replica = min(healthy, key=self._score)
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def release(self, replica: Replica, seconds: float = None, ok: bool = True):
+        """Record the outcome of a call.
+
+        :param replica: the chosen replica
+        :param seconds: latency of a successful call, None leaves the health of the replica as it is
+        :param ok: False marks the replica failed for `cooldown` seconds
+        """
+        with self._lock:
+            replica.outstanding -= 1
+            if not ok:
+                replica.failures += 1
+                replica.down_until = time.monotonic() + self.cooldown
+            elif seconds is not None:
+                replica.ewma = seconds if replica.ewma is None else \
+                    self.alpha * seconds + (1 - self.alpha) * replica.ewma
+                replica.down_until = 0.0
+
+    def call(self, send, max_attempts: int = None) -> any:
+        """Call `send(url)` on the best replica, failing over to the next best one on replica failures.
+
+        Failures are classified by `is_replica_failure`, other exceptions are raised from the first replica.
+
+        :param send: callable taking a replica url
+        :param max_attempts: max number of replicas tried, default is all of them
+        :return: the result of the first successful call.
+        """
+        tried = []
+        last_error = None
+        for _ in range(max_attempts or len(self.replicas)):
+            replica = self.choose(exclude=tried)
+            if replica is None:
+                break
+            tried.append(replica)
+            start = time.perf_counter()
+            try:
+                result = send(replica.url)
+            except Exception as e:
+                if not is_replica_failure(e):
+                    # the deadline of the call, or a call any replica would refuse: raised as is
+                    self.release(replica)
+                    raise
+                self.release(replica, ok=False)
+                last_error = e
+                continue
+            except BaseException:
+                self.release(replica)
+                raise
+            self.release(replica, time.perf_counter() - start)
+            return result
+        raise last_error or ReplicaError("No replica available.")
+
+    async def acall(self, send, max_attempts: int = None) -> any:
+        """Async twin of `call`, `send(url)` returns an awaitable."""
+        tried = []
+        last_error = None
+        for _ in range(max_attempts or len(self.replicas)):
+            replica = self.choose(exclude=tried)
+            if replica is None:
+                break
+            tried.append(replica)
+            start = time.perf_counter()
+            try:
+                result = await send(replica.url)
+            except Exception as e:
+                if not is_replica_failure(e):
+                    self.release(replica)
+                    raise
+                self.release(replica, ok=False)
+                last_error = e
+                continue
+            except BaseException:
+                # cancelled, the replica is not to blame
+                self.release(replica)
+                raise
+            self.release(replica, time.perf_counter() - start)
+            return result
+        raise last_error or ReplicaError("No replica available.")
+
+    def snapshot(self) -> dict:
+        """Get the health and latency of every replica, by name."""
+        with self._lock:
+            return {replica.name: replica.snapshot() for replica in self.replicas}
@@ -1,8 +1,8 @@
 import os
-import dashscope
 from typing import Any, Dict, List, Union
 from maas.core import MaaS
 from utils.logger import setup_logger
+from utils.streaming import aiter_in_thread
 
 logger = setup_logger()
 
@@ -20,5 +20,24 @@ class TongYi(MaaS):
         返回:
             dict: 生成的文本或回应的其它形式
         """
+        # dashscope is only needed once TongYi is invoked
+        import dashscope
         response = dashscope.Generation.call(model=self.model_id, api_key=self.api_key, **input)
         return response
+
+    def invoke_stream(self, input: dict, headers: dict = None):
+        """流式调用模型，逐段返回生成的文本.
+
+        参数:
+            input (dict): 同 invoke
+        返回:
+            generator: DashScope 的增量输出，每一项只包含新生成的部分
+        """
+        import dashscope
+        params = {"incremental_output": True, **input, "stream": True}
+        yield from dashscope.Generation.call(model=self.model_id, api_key=self.api_key, **params)
+
+    async def ainvoke_stream(self, input: dict, headers: dict = None):
+        """`invoke_stream` 的异步版本，DashScope SDK 的流在后台线程中读取."""
+        async for response in aiter_in_thread(lambda: self.invoke_stream(input, headers=headers)):
+            yield response
@@ -0,0 +1,211 @@
+import threading
+import time
+from datetime import datetime
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# FC releases idle instances after a few minutes; a ping every 4 minutes keeps one instance around
+DEFAULT_WARM_INTERVAL = 240
+# a ping slower than this is counted as a cold start
+DEFAULT_COLD_THRESHOLD = 2.0
+
+
+class WarmSchedule:
+    def __init__(self, days: tuple = (0, 1, 2, 3, 4, 5, 6), start: str = "00:00", end: str = "24:00"):
+        """Local-time window in which a model is kept warm.
+
+        :param days: weekdays, 0 is Monday
+        :param start: window start, HH:MM
+        :param end: window end, HH:MM, 24:00 is the end of the day; an end before the start wraps past midnight
+        """
+        self.days = tuple(days)
+        self.start = self._minutes(start)
+        self.end = self._minutes(end)
+
+    @staticmethod
+    def _minutes(value: str) -> int:
+        hours, minutes = value.split(":")
+        return int(hours) * 60 + int(minutes)
+
+    def active(self, now: datetime = None) -> bool:
+        """Check whether pings are due at `now`, default is the local time."""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        if self.start <= self.end:
+            return now.weekday() in self.days and self.start <= minute < self.end
+        # the window wraps past midnight, the part after midnight belongs to the previous day
+        if minute >= self.start:
+            return now.weekday() in self.days
+        return minute < self.end and (now.weekday() - 1) % 7 in self.days
+
+
+ALWAYS = WarmSchedule()
+BUSINESS_HOURS = WarmSchedule(days=(0, 1, 2, 3, 4), start="09:00", end="18:00")
+
+
+class WarmTarget:
+    def __init__(self, model, interval: float, schedule: WarmSchedule, payload: any, cold_threshold: float):
+        """Ping state of one model, see `WarmKeeper.add`."""
+        self.model = model
+        self.interval = interval
+        self.schedule = schedule
+        self.payload = payload
+        self.cold_threshold = cold_threshold
+        self.next_ping = 0.0
+        self.pings = 0
+        self.errors = 0
+        self.cold = 0
+        self.cold_seconds = 0.0
+        self.warm = 0
+        self.warm_seconds = 0.0
+        self.last_seconds = None
+
+    def record(self, seconds: float):
+        """Record the latency of a ping."""
+        self.pings += 1
+        self.last_seconds = seconds
+        if seconds >= self.cold_threshold:
+            self.cold += 1
+            self.cold_seconds += seconds
+        else:
+            self.warm += 1
+            self.warm_seconds += seconds
+
+    def snapshot(self) -> dict:
+        """Get the ping counters and the mean cold / warm latency."""
+        cold_mean = self.cold_seconds / self.cold if self.cold else None
+        warm_mean = self.warm_seconds / self.warm if self.warm else None
+        return {
+            "pings": self.pings,
+            "errors": self.errors,
+            "cold": self.cold,
+            "warm": self.warm,
+            "cold_mean_seconds": cold_mean,
+            "warm_mean_seconds": warm_mean,
+            # what a request arriving at a cold instance would have paid on top of a warm one
+            "cold_penalty_seconds": cold_mean - warm_mean if cold_mean is not None and warm_mean is not None else None,
+            # cost side: time the pings kept instances busy
+            "ping_seconds": self.cold_seconds + self.warm_seconds,
+            "last_seconds": self.last_seconds,
+        }
+
+
+class WarmKeeper:
+    def __init__(self, tick: float = 1.0):
+        """Send periodic lightweight pings to deployed models so they do not scale to zero.
+
+        :param tick: seconds between two scheduler checks of the background thread
+        """
+        self.tick = tick
+        self.targets = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, model, interval: float = DEFAULT_WARM_INTERVAL, schedule: WarmSchedule = ALWAYS,
+            payload: any = None, cold_threshold: float = DEFAULT_COLD_THRESHOLD) -> WarmTarget:
+        """Keep a model warm.
+
+        :param model: deployed MaaS object
+        :param interval: seconds between pings
+        :param schedule: window in which pings are sent, like: BUSINESS_HOURS
+        :param payload: input posted to the trigger url past the result cache and batcher, so it reaches an
+                        instance; None sends a bare GET to the trigger url, which is enough to start an instance
+                        without running the model
+        :param cold_threshold: pings slower than this many seconds are counted as cold starts
+        :return: WarmTarget.
+        """
+        target = WarmTarget(model, interval, schedule, payload, cold_threshold)
+        with self._lock:
+            self.targets[model.resource_name] = target
+        return target
+
+    def remove(self, model):
+        """Stop pinging the model."""
+        with self._lock:
+            self.targets.pop(model.resource_name, None)
+
+    def ping(self, target: WarmTarget) -> float:
+        """Ping one model and record the latency.
+
+        :param target: WarmTarget
+        :return: seconds, or None if the ping failed.
+        """
+        model = target.model
+        start = time.perf_counter()
+        try:
+            if target.payload is None:
+                # any answer, even 404/405, means an instance is up
+                model.transport.get(model.service_url).close()
+            else:
+                # straight to an instance: an answer of the result cache or a seat in a batch would count as warm
+                model._post(target.payload)
+        except Exception as e:
+            target.errors += 1
+            logger.warning(f"Warm ping of {model.resource_name} failed: {e}")
+            return None
+        seconds = time.perf_counter() - start
+        target.record(seconds)
+        return seconds
+
+    def run_pending(self, now: float = None) -> int:
+        """Ping the models that are due and inside their schedule.
+
+        :param now: current unix time, default is time.time()
+        :return: number of pings sent.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [target for target in self.targets.values() if target.next_ping <= now]
+        sent = 0
+        for target in due:
+            target.next_ping = now + target.interval
+            if target.schedule.active(datetime.fromtimestamp(now)):
+                self.ping(target)
+                sent += 1
+        return sent
+
+    def start(self):
+        """Run the scheduler in a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dipperai-warm-keeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread started by `start`."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.tick)
+
+    def stats(self) -> dict:
+        """Get the ping statistics of every model.
+
+        :return: dict, resource name -> counters and cold / warm latency.
+        """
+        with self._lock:
+            return {name: target.snapshot() for name, target in self.targets.items()}
+
+    @staticmethod
+    def provision(model, target: int, **kwargs) -> dict:
+        """Configure provisioned (reserved) instances through the vendor, where it supports them.
+
+        :param model: deployed MaaS object
+        :param target: number of always-on instances, 0 releases them
+        :param kwargs: vendor specific options, like: scheduled_actions for Alibaba
+        :return: the vendor response.
+        :raises TypeError: if the vendor has no provisioned instances, like: Devs; keep it warm with `add` instead.
+        """
+        if not hasattr(model.vendor, "set_provisioned_instances"):
+            raise TypeError(f"{model.vendor.__class__.__name__} vendor does not support provisioned instances, "
+                            f"deploy {model.resource_name} with the Alibaba vendor or keep it warm with pings.")
+        return model.vendor.set_provisioned_instances(model.resource_name, target, **kwargs)
@@ -118,3 +118,35 @@ def huggingface_alibaba_default_config(config, **kwargs) -> dict:
     - 一个字典，包含默认配置和用户配置的合并结果。
     """
     return {**alibaba_huggingface_default_config(**kwargs), **(config or {})}
+
+
+def local_default_config(model_id: str, model_version: str, library: str, **kwargs) -> dict:
+    """Get the config of a model run on this machine by `vendor.local.Local`.
+
+    :param model_id: model id, loaded by the pipeline of `library`
+    :param model_version: model version
+    :param library: transformers / modelscope
+    :return: config.
+    """
+    return {
+        # stub: echo server, pipeline: the model on the CPU
+        "mode": "pipeline",
+        "library": library,
+        "model_id": model_id,
+        "model_version": model_version,
+        # None lets the library read the task from the model config
+        "task": None,
+        "handler": None,
+        "workers": 1,
+        "latency": 0.0,
+        # a json array body is a batch of inputs, for `MaaS.enable_batching`; off: it is one input
+        "batch": False,
+    }
+
+
+def huggingface_local_default_config(config, **kwargs) -> dict:
+    return merge_configs(local_default_config(library="transformers", **kwargs), config)
+
+
+def modelscope_local_default_config(config, **kwargs) -> dict:
+    return merge_configs(local_default_config(library="modelscope", **kwargs), config)
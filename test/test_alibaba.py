@@ -0,0 +1,88 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import base64
+import hashlib
+import hmac
+import logging
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from benchmark.fake_cloud import FakeCloud
+from utils.resilience import Resilience, RetryPolicy
+from utils.transport import Transport
+from vendor.alibaba import Alibaba
+
+
+def fake_alibaba(cloud: FakeCloud, **kwargs) -> Alibaba:
+    return Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", logger=logging.getLogger("test"),
+                   endpoint=cloud.endpoint, protocol="http",
+                   resilience=Resilience(retry=RetryPolicy(initial=0.001, jitter=0)), **kwargs)
+
+
+class TestAlibaba(unittest.TestCase):
+
+    def test_signature_matches_fresh_hmac(self):
+        """Signatures match a fresh HMAC, a rotated secret is picked up."""
+        vendor = Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", endpoint="fc.example.com")
+        headers = vendor.get_headers()
+        resource = "/2023-03-30/functions/f"
+        string_to_sign = (f"GET\napplication/json\n\napplication/json\n{headers['date']}\n"
+                          f"x-acs-signature-method:HMAC-SHA1\nx-acs-signature-nonce:{headers['x-acs-signature-nonce']}\n"
+                          f"x-acs-signature-version:1.0\nx-acs-version:2023-03-30\n{resource}")
+        expected = base64.b64encode(hmac.new(b"secret", string_to_sign.encode(), hashlib.sha1).digest()).decode()
+        self.assertEqual(vendor.sign_request("GET", headers, resource), f"acs id:{expected}")
+        # the same key state signs again, and a rotated secret is picked up
+        self.assertEqual(vendor.sign_request("GET", headers, resource), f"acs id:{expected}")
+        vendor.ALIBABA_CLOUD_ACCESS_KEY_SECRET = "rotated"
+        self.assertNotEqual(vendor.sign_request("GET", headers, resource), f"acs id:{expected}")
+
+    def test_nonces_are_unique_across_threads(self):
+        """Nonces never repeat, even across threads."""
+        vendor = Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", endpoint="fc.example.com")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            nonces = list(executor.map(lambda _: vendor.get_headers()["x-acs-signature-nonce"], range(5000)))
+        self.assertEqual(len(set(nonces)), len(nonces))
+
+    def test_list_functions_follows_pages(self):
+        """`list_functions` follows the pages."""
+        with FakeCloud() as cloud:
+            for i in range(250):
+                cloud.fc.create_function({"functionName": f"dipperai-{i:03d}"})
+            cloud.fc.create_function({"functionName": "other"})
+            functions = fake_alibaba(cloud).list_functions(prefix="dipperai-")
+            self.assertEqual(len(functions), 250)
+            self.assertEqual(functions[-1]["functionName"], "dipperai-249")
+            # three pages of 100
+            self.assertEqual(cloud.requests, 3)
+
+    def test_query_is_signed_unencoded(self):
+        """The url query is encoded, the signed one is not."""
+        with FakeCloud() as cloud:
+            vendor = fake_alibaba(cloud)
+            signed = []
+            sign_request = vendor.sign_request
+            vendor.sign_request = lambda method, headers, resource: signed.append(resource) or sign_request(
+                method, headers, resource)
+            self.assertEqual(vendor.list_functions(prefix="a b/c+d", limit=5), [])
+        self.assertEqual(signed, ["/2023-03-30/functions?limit=5&prefix=a b/c+d"])
+
+    def test_check_many(self):
+        """`check_many` checks every name once, in order."""
+        with FakeCloud(api_latency=0.01) as cloud:
+            names = [f"dipperai-{i}" for i in range(40)]
+            for name in names[:30]:
+                cloud.fc.create_function({"functionName": name})
+                cloud.fc.handle_trigger("POST", name, None, {"triggerName": "dipperai_default_trigger"})
+            transport = Transport(pool_size=20)
+            vendor = fake_alibaba(cloud, transport=transport)
+            results = vendor.check_many(names + names[:5])
+            transport.close()
+        self.assertEqual(list(results), names)
+        self.assertEqual(sum(exists for _, exists in results.values()), 30)
+        self.assertTrue(results["dipperai-0"][0]["url"].startswith(cloud.url))
+        self.assertEqual(results["dipperai-39"], ({}, False))
+        self.assertEqual(vendor.check_many([]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from utils.async_transport import AsyncTransport, bounded_map, close_default_async_transport, \
+    default_async_transport
+
+
+class TestAsyncTransport(unittest.TestCase):
+
+    def test_bounded_map_keeps_order_and_limit(self):
+        """Results keep the order of the items, with at most `concurrency` calls in flight."""
+        in_flight = []
+        peak = []
+
+        async def call(item):
+            in_flight.append(item)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.001 * (item % 3))
+            in_flight.remove(item)
+            return item * 2
+
+        results = asyncio.run(bounded_map(call, iter(range(50)), concurrency=4))
+        self.assertEqual(results, [i * 2 for i in range(50)])
+        self.assertLessEqual(max(peak), 4)
+
+    def test_post_json(self):
+        """Json bodies are posted and decoded."""
+        async def run(url):
+            transport = AsyncTransport(pool_size=4)
+            try:
+                return await bounded_map(lambda i: transport.post_json(url, json={"input": i}), range(20), 8)
+            finally:
+                await transport.close()
+
+        with FakeCloud() as cloud:
+            results = asyncio.run(run(cloud.url))
+        self.assertEqual(results, [{"echo": {"input": i}} for i in range(20)])
+
+    def test_default_transport_is_closed_explicitly(self):
+        """The default transport of a loop is shared, and closed by close_default_async_transport."""
+        async def run(url):
+            transport = default_async_transport()
+            self.assertIs(default_async_transport(), transport)
+            try:
+                return transport.session, await transport.post_json(url, json={"input": 1})
+            finally:
+                await close_default_async_transport()
+                # the next call of the loop gets a new transport
+                self.assertIsNot(default_async_transport(), transport)
+                await close_default_async_transport()
+
+        with FakeCloud() as cloud:
+            session, result = asyncio.run(run(cloud.url))
+        self.assertEqual(result, {"echo": {"input": 1}})
+        self.assertTrue(session.closed)
+
+    def test_async_with_closes_the_session(self):
+        """An async with block closes the session."""
+        async def run(url):
+            async with AsyncTransport() as transport:
+                return transport.session, await transport.post_json(url, json={"input": 1})
+
+        with FakeCloud() as cloud:
+            session, result = asyncio.run(run(cloud.url))
+        self.assertEqual(result, {"echo": {"input": 1}})
+        self.assertTrue(session.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
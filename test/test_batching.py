@@ -0,0 +1,81 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from utils.batching import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_calls_are_batched(self):
+        """Concurrent calls share batched requests."""
+        batches = []
+
+        def send_batch(items):
+            batches.append(list(items))
+            return [item * 10 for item in items]
+
+        batcher = MicroBatcher(send_batch, max_batch_size=4, max_wait=0.2)
+        start = threading.Barrier(8)
+
+        def call(i):
+            start.wait()
+            return batcher.submit(i).result(timeout=5)
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(call, range(8)))
+        batcher.close()
+        self.assertEqual(results, [i * 10 for i in range(8)])
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertLess(len(batches), 8)
+        snapshot = batcher.metrics.snapshot()
+        self.assertEqual(snapshot["items"], 8)
+        self.assertEqual(snapshot["batches"], len(batches))
+
+    def test_max_wait_flushes_partial_batch(self):
+        """A partial batch is sent after max_wait."""
+        batcher = MicroBatcher(lambda items: items, max_batch_size=16, max_wait=0.01)
+        self.assertEqual(batcher.submit("a").result(timeout=5), "a")
+        batcher.close()
+        self.assertEqual(batcher.metrics.snapshot()["size_histogram"], {1: 1})
+
+    def test_submit_racing_close(self):
+        """Calls submitted while the batcher closes are run or rejected, never lost."""
+        for _ in range(20):
+            batcher = MicroBatcher(lambda items: items, max_batch_size=4, max_wait=0.001)
+            start = threading.Barrier(5)
+
+            def call(i):
+                start.wait()
+                try:
+                    return batcher.submit(i).result(timeout=5)
+                except RuntimeError:
+                    return "closed"
+
+            with ThreadPoolExecutor(5) as pool:
+                futures = [pool.submit(call, i) for i in range(4)]
+                start.wait()
+                batcher.close()
+                # every caller gets its result or is refused, none is left waiting
+                results = [future.result() for future in futures]
+            self.assertTrue(all(result in (i, "closed") for i, result in enumerate(results)))
+        with self.assertRaises(RuntimeError):
+            batcher.submit("late")
+
+    def test_errors_reach_every_caller(self):
+        """A failing batch raises in every caller of the batch."""
+        def send_batch(items):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(send_batch, max_batch_size=2, max_wait=0.05)
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        batcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from benchmark.fake_cloud import FakeCloud
+from command.cli import main
+from maas.bulk import read_records
+from maas.core import MaaS
+from utils.resilience import RetryPolicy
+
+
+class Crash(Exception):
+    pass
+
+
+def read_lines(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestBulk(unittest.TestCase):
+
+    def setUp(self):
+        """Json lines input of 100 records and a blank line."""
+        self.dir = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.dir.name, "input.jsonl")
+        self.output = os.path.join(self.dir.name, "output.jsonl")
+        with open(self.input, "w", encoding="utf-8") as f:
+            for i in range(100):
+                f.write(json.dumps({"id": i, "text": f"record {i}"}) + "\n")
+                if i == 10:
+                    f.write("\n")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.dir.cleanup()
+
+    def test_read_records(self):
+        """Records are read skipping blank lines, from an offset."""
+        self.assertEqual(len(list(read_records(self.input))), 100)
+        self.assertEqual(next(read_records(self.input, skip=11))["id"], 11)
+        with self.assertRaises(ValueError):
+            list(read_records(self.input, input_format="csv"))
+
+    def test_map_file_in_order(self):
+        """Results are written in input order."""
+        with FakeCloud(latency=0.002) as cloud:
+            model = MaaS.from_url(cloud.url)
+            stats = model.map_file(self.input, self.output, concurrency=8, input_key="text", with_index=True)
+        self.assertEqual((stats["records"], stats["processed"], stats["failed"]), (100, 100, 0))
+        lines = read_lines(self.output)
+        self.assertEqual([line["index"] for line in lines], list(range(100)))
+        self.assertEqual(lines[42]["output"], {"echo": "record 42"})
+
+    def test_resume_after_crash(self):
+        """A run resumes after the records written before a crash."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            invoke = model.invoke
+
+            def crash_at_70(payload, timeout=None):
+                if payload["id"] == 70:
+                    raise Crash()
+                return invoke(payload, timeout=timeout)
+
+            model.invoke = crash_at_70
+            with self.assertRaises(Crash):
+                model.map_file(self.input, self.output, concurrency=4, checkpoint_every=16)
+            first_run = cloud.requests
+            # a process killed after the checkpoint leaves a partial line behind
+            with open(self.output, "ab") as f:
+                f.write(b'{"echo": {"id"')
+            model.invoke = invoke
+            stats = model.map_file(self.input, self.output, concurrency=4, checkpoint_every=16)
+            # records written before the failure are not sent again
+            self.assertEqual(stats["skipped"], 70)
+            self.assertEqual(cloud.requests - first_run, 30)
+            # a complete output is not redone
+            self.assertEqual(model.map_file(self.input, self.output)["processed"], 0)
+        self.assertEqual([line["echo"]["id"] for line in read_lines(self.output)], list(range(100)))
+
+    def test_missing_output_starts_over(self):
+        """A deleted output is produced again from the start."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.map_file(self.input, self.output)
+            os.remove(self.output)
+            stats = model.map_file(self.input, self.output)
+        self.assertEqual((stats["skipped"], stats["processed"]), (0, 100))
+        self.assertEqual(len(read_lines(self.output)), 100)
+
+    def test_record_errors(self):
+        """Failed records are written as errors with on_error="record"."""
+        with FakeCloud(errors=[503]) as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_resilience(retry=RetryPolicy(max_attempts=1))
+            stats = model.map_file(self.input, self.output, concurrency=1, on_error="record", with_index=True)
+        self.assertEqual((stats["records"], stats["failed"]), (100, 1))
+        lines = read_lines(self.output)
+        self.assertEqual(set(lines[0]), {"index", "error"})
+        self.assertEqual(lines[1]["output"]["echo"]["id"], 1)
+
+    def test_changed_input_is_not_resumed(self):
+        """A changed input is refused unless resume is off."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.map_file(self.input, self.output)
+            with open(self.input, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"id": 100}) + "\n")
+            with self.assertRaises(ValueError):
+                model.map_file(self.input, self.output)
+            self.assertEqual(model.map_file(self.input, self.output, resume=False)["records"], 101)
+
+    def test_cli_map(self):
+        """The map command runs over a trigger url."""
+        with FakeCloud() as cloud, redirect_stdout(io.StringIO()) as stdout:
+            code = main(["map", self.input, self.output, "--url", cloud.url, "--input-key", "id"])
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(stdout.getvalue())["records"], 100)
+        self.assertEqual(read_lines(self.output)[99], {"echo": 99})
+        # TongYi models have no trigger url to map over
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            main(["map", self.input, self.output, "--model-id", "qwen-turbo", "--maas", "TongYi"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import multiprocessing
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from utils.cache import Cache, OperateCache
+from utils.cache_backends import MemoryBackend, SQLiteBackend
+
+
+def write_keys(path, worker, count):
+    cache = Cache(path)
+    for i in range(count):
+        with OperateCache(cache) as cache_data:
+            cache_data.set_cache(f"dipperai-{worker}-{i}", {"url": f"https://{worker}-{i}"})
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        """Cache file in a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "dipperai.json")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.tmp.cleanup()
+
+    def test_concurrent_processes_keep_all_keys(self):
+        """Processes writing the same cache file keep the keys of each other."""
+        workers = [multiprocessing.Process(target=write_keys, args=(self.path, w, 20)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        cache = Cache(self.path)
+        self.assertEqual(len(cache.keys()), 80)
+        self.assertEqual(cache.get_cache("dipperai-3-19"), {"url": "https://3-19"})
+
+    def test_sees_other_writers_and_merges(self):
+        """Writes of another cache object are seen before a save, and merged by it."""
+        first, second = Cache(self.path), Cache(self.path)
+        first.set_cache("a", {"url": "a"})
+        second.set_cache("b", {"url": "b"})
+        first.save_cache()
+        # second has not saved yet, but reads the key written by first
+        self.assertEqual(second.get_cache("a"), {"url": "a"})
+        second.save_cache()
+        cache = Cache(self.path)
+        self.assertEqual(sorted(cache.keys()), ["a", "b"])
+        self.assertEqual(cache.get_cache("b"), {"url": "b"})
+
+    def test_delete_and_corrupt_file(self):
+        """Deleted keys stay deleted, a corrupt file is read as empty and rewritten."""
+        cache = Cache(self.path)
+        cache.set_cache("a", {"url": "a"})
+        cache.save_cache()
+        cache.delete_cache("a")
+        cache.save_cache()
+        self.assertEqual(Cache(self.path).keys(), [])
+        with open(self.path, "w") as f:
+            f.write("{broken")
+        cache = Cache(self.path)
+        self.assertEqual(cache.keys(), [])
+        cache.set_cache("b", {"url": "b"})
+        cache.save_cache()
+        self.assertEqual(Cache(self.path).get_cache("b"), {"url": "b"})
+
+    def test_sqlite_backend(self):
+        """Rows written by one connection are seen by the others at once."""
+        path = os.path.join(self.tmp.name, "dipperai.sqlite3")
+        cache = Cache(backend=SQLiteBackend(path))
+        cache.set_cache("a", {"url": "a", "config": {"cpu": 2}})
+        # row level writes are visible to other connections without a save
+        other = Cache(backend=SQLiteBackend(path))
+        self.assertEqual(other.get_cache("a"), {"url": "a", "config": {"cpu": 2}})
+        other.delete_cache("a")
+        self.assertEqual(cache.get_cache("a"), {})
+
+    def test_ttl(self):
+        """Entries older than the ttl are stale."""
+        cache = Cache(backend=MemoryBackend(), ttl=60)
+        self.assertTrue(cache.is_stale("a"))
+        cache.set_cache("a", {"url": "a"})
+        self.assertFalse(cache.is_stale("a"))
+        with patch("utils.cache.time.time", return_value=time.time() + 61):
+            self.assertTrue(cache.is_stale("a"))
+
+    def test_eviction(self):
+        """Old entries and the ones above max_entries are evicted on save."""
+        backends = [lambda: None, lambda: SQLiteBackend(os.path.join(self.tmp.name, "dipperai.sqlite3"))]
+        for backend in backends:
+            cache = Cache(self.path, backend=backend(), ttl=60, max_entries=3, evict_after=2)
+            now = time.time()
+            for i in range(5):
+                with patch("utils.cache.time.time", return_value=now + i):
+                    cache.set_cache(f"k{i}", {"url": str(i)})
+            cache.set_cache("never", {"url": "never"}, verified=False)
+            cache.save_cache()
+            # entries never verified go first, then the least recently verified ones
+            self.assertEqual(sorted(cache.keys()), ["k2", "k3", "k4"])
+            with patch("utils.cache.time.time", return_value=now + 123):
+                cache.set_cache("k5", {"url": "5"})
+                cache.save_cache()
+            # k2 was verified more than 2 ttl periods ago
+            self.assertEqual(sorted(cache.keys()), ["k3", "k4", "k5"])
+            cache.backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import logging
+import unittest
+from unittest.mock import patch
+from benchmark.fake_cloud import FakeCloud
+from utils.config_diff import changed_fields, diff, fingerprint, normalize
+from utils.polling import PollPolicy
+from utils.resilience import Resilience, RetryPolicy
+from vendor.alibaba import Alibaba
+
+
+class TestConfigDiff(unittest.TestCase):
+
+    def test_vendor_snapshot_spellings_are_equal(self):
+        """Vendor spellings of keys, numbers and extra fields do not count as changes."""
+        desired = {"template_name": "t", "parameters": {"memorySize": 16384, "cpu": 8, "gpu": True}}
+        snapshot = {"templateName": "t", "parameters": {"memorySize": "16384", "cpu": "8.0", "gpu": True,
+                                                        "region": "cn-hangzhou"}, "id": "x"}
+        self.assertEqual(diff(desired, snapshot), {})
+        self.assertEqual(normalize({"a": None, "b": "abc", "c": 1.5, "d": 2.0}), {"b": "abc", "c": 1.5, "d": 2})
+        self.assertEqual(fingerprint(desired), fingerprint({"parameters": {"gpu": True, "cpu": 8.0, "memorySize": 16384.0},
+                                                            "templateName": "t"}))
+        self.assertNotEqual(fingerprint(desired), fingerprint({**desired, "template_name": "u"}))
+
+    def test_strings_are_not_numbers(self):
+        """Strings that read as equal numbers are still different."""
+        desired = {"environmentVariables": {"MODEL_REVISION": "1.10"}}
+        self.assertEqual(diff(desired, {"environmentVariables": {"MODEL_REVISION": "1.1"}}), desired)
+        self.assertNotEqual(fingerprint(desired), fingerprint({"environmentVariables": {"MODEL_REVISION": "1.1"}}))
+        self.assertEqual(diff({"a": "007", "b": "1e3"}, {"a": "7", "b": "1000"}), {"a": "007", "b": "1e3"})
+        # a number in the snapshot is not the string asked for
+        self.assertEqual(diff({"a": "7"}, {"a": 7}), {"a": "7"})
+
+    def test_minimal_patch(self):
+        """The patch holds only the changed fields, lists whole."""
+        desired = {"cpu": 2, "gpuConfig": {"gpuMemorySize": 16384, "gpuType": "fc.gpu.tesla.1"},
+                   "environmentVariables": {}, "layers": ["a", "b"]}
+        current = {"cpu": 2, "gpuConfig": {"gpuMemorySize": 8192, "gpuType": "fc.gpu.tesla.1"}, "layers": ["a"]}
+        patch = diff(desired, current)
+        self.assertEqual(patch, {"gpuConfig": {"gpuMemorySize": 16384}, "layers": ["a", "b"]})
+        self.assertEqual(changed_fields(patch), ["gpuConfig.gpuMemorySize", "layers"])
+        self.assertEqual(diff({"timeout": 300}, {}), {"timeout": 300})
+
+    def test_alibaba_update_sends_changed_fields(self):
+        """Alibaba updates send only the changed fields."""
+        with FakeCloud() as cloud:
+            vendor = Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", logger=logging.getLogger("test"),
+                             endpoint=cloud.endpoint, protocol="http", poll_policy=PollPolicy(initial=0.001),
+                             resilience=Resilience(retry=RetryPolicy(initial=0.001, jitter=0)))
+            config = {"functionName": "dipperai-f", "cpu": 1, "memorySize": 2048,
+                      "gpuConfig": {"gpuMemorySize": 8192, "gpuType": "fc.gpu.tesla.1"}}
+            deployed = vendor.create("dipperai-f", config)["config"]
+            config = {**config, "gpuConfig": {"gpuMemorySize": 16384, "gpuType": "fc.gpu.tesla.1"}}
+            changes = diff(config, deployed)
+            with patch.object(vendor, "request", wraps=vendor.request) as request:
+                result = vendor.update("dipperai-f", config, patch=changes)
+        # nested objects are sent whole
+        self.assertEqual(request.call_args_list[0].args, (
+            "PUT", "/2023-03-30/functions/dipperai-f", {"gpuConfig": {"gpuMemorySize": 16384, "gpuType": "fc.gpu.tesla.1"}}
+        ))
+        self.assertTrue(result["url"].startswith(cloud.url))
+        self.assertEqual(diff(config, result["config"]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import unittest
+from unittest.mock import patch
+from maas.core import MaaS
+from utils import config_diff
+from utils.cache import Cache
+from utils.cache_backends import MemoryBackend
+
+
+class FakeVendor:
+    def __init__(self, exists=True):
+        """Vendor whose resource exists or not, recording the calls."""
+        self.exists = exists
+        self.calls = []
+
+    def check(self, name):
+        """Answer whether the resource exists."""
+        self.calls.append("check")
+        if not self.exists:
+            return {}, False
+        return {"url": "https://checked", "config": {"cpu": 1}}, True
+
+    def create(self, name, config):
+        """Create the resource."""
+        self.calls.append("create")
+        return {"url": "https://created", "config": config}
+
+    def update(self, name, config, patch=None):
+        """Update the resource, `patch` holds the changed fields."""
+        self.calls.append(("update", patch))
+        return {"url": "https://updated", "config": config}
+
+
+class FakeMaaS(MaaS):
+    def get_service_config(self, user_config: dict) -> dict:
+        """Default config."""
+        return user_config or {"cpu": 1}
+
+
+class TestDeployCache(unittest.TestCase):
+
+    def setUp(self):
+        """Deployment cache in memory with a 60s ttl."""
+        self.cache = Cache(backend=MemoryBackend(), ttl=60)
+        patcher = patch("maas.core.get_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deploy(self, vendor):
+        """Deploy the test model on `vendor`."""
+        return FakeMaaS(model_id="m", cloud=vendor)
+
+    def test_fresh_entry_is_trusted(self):
+        """Entries verified within the ttl are used without asking the vendor."""
+        vendor = FakeVendor()
+        self.deploy(vendor)
+        model = self.deploy(vendor)
+        self.assertEqual(model.service_url, "https://created")
+        self.assertEqual(vendor.calls, ["create"])
+
+    def test_stale_entry_is_revalidated(self):
+        """Stale entries are checked with the vendor and refreshed."""
+        vendor = FakeVendor()
+        resource_name = self.deploy(vendor).resource_name
+        self.cache.ttl = -1
+        model = self.deploy(vendor)
+        self.assertEqual(model.service_url, "https://checked")
+        self.assertEqual(vendor.calls, ["create", "check"])
+        self.assertEqual(self.cache.get_cache(resource_name)["url"], "https://checked")
+
+    def test_deleted_resource_is_created_again(self):
+        """Resources deleted since they were cached are created again."""
+        self.deploy(FakeVendor())
+        self.cache.ttl = -1
+        vendor = FakeVendor(exists=False)
+        model = self.deploy(vendor)
+        self.assertEqual(vendor.calls, ["check", "create"])
+        self.assertEqual(model.service_url, "https://created")
+
+    def test_changed_config_sends_patch(self):
+        """A changed config is sent to the vendor as a patch."""
+        vendor = FakeVendor()
+        self.deploy(vendor)
+        model = FakeMaaS(model_id="m", cloud=vendor, service_config={"cpu": 1, "memorySize": 4096})
+        self.assertEqual(vendor.calls, ["create", ("update", {"memorySize": 4096})])
+        self.assertEqual(model.service_url, "https://updated")
+
+    def test_equivalent_config_is_not_updated(self):
+        """Configs equal to the deployed one up to vendor spellings are not updated."""
+        vendor = FakeVendor()
+        resource_name = self.deploy(vendor).resource_name
+        # the vendor echoes numbers back as strings
+        self.cache.set_cache(resource_name, {"url": "https://created", "config": {"cpu": "1.0", "state": "Active"}})
+        with patch("maas.core.config_diff.diff", wraps=config_diff.diff) as diff:
+            FakeMaaS(model_id="m", cloud=vendor, service_config={"cpu": 1})
+            FakeMaaS(model_id="m", cloud=vendor, service_config={"cpu": 1})
+        self.assertEqual(vendor.calls, ["create"])
+        # the second deploy matches on the stored fingerprint, without a diff
+        self.assertEqual(diff.call_count, 1)
+        self.assertIn("fingerprint", self.cache.get_cache(resource_name))
+
+    def test_from_cache_serves_without_vendor(self):
+        """Models built from the cache need neither the vendor nor its credentials."""
+        self.deploy(FakeVendor())
+        with patch("vendor.devs.Devs", side_effect=AssertionError("no vendor in serve-only mode")):
+            model = FakeMaaS.from_cache("m")
+        self.assertEqual(model.service_url, "https://created")
+        with self.assertRaises(Exception):
+            FakeMaaS.from_cache("not-deployed")
+
+    def test_deploy_replicas(self):
+        """Replicas are deployed per region and routed to with the primary."""
+        model = self.deploy(FakeVendor())
+        vendors = {}
+        router = model.deploy_replicas(["cn-a", "cn-b"],
+                                       cloud_factory=lambda region: vendors.setdefault(region, FakeVendor()))
+        self.assertEqual(sorted(router.snapshot()), sorted([model.resource_name, f"{model.resource_name}-cn-a",
+                                                            f"{model.resource_name}-cn-b"]))
+        self.assertEqual(vendors["cn-a"].calls, ["create"])
+        self.assertTrue(self.cache.get_cache(f"{model.resource_name}-cn-b"))
+
+
+if __name__ == '__main__':
+    unittest.main()
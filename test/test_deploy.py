@@ -0,0 +1,50 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import time
+import unittest
+from maas.deploy import as_ready, deploy_all
+
+
+class FakeModel:
+    def __init__(self, model_id: str, seconds: float = 0.0):
+        """Model taking `seconds` to deploy, the "broken" one fails."""
+        time.sleep(seconds)
+        if model_id == "broken":
+            raise BaseException("Model service create failed.")
+        self.model_id = model_id
+
+
+class TestDeploy(unittest.TestCase):
+
+    def test_deploy_all_runs_in_parallel(self):
+        """Deployments run at the same time and the handles come back at once."""
+        start = time.monotonic()
+        handles = deploy_all([(FakeModel, {"model_id": f"m{i}", "seconds": 0.2}) for i in range(4)], max_workers=4)
+        # handles come back before any deployment finished
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual([handle.result(timeout=5).model_id for handle in handles], ["m0", "m1", "m2", "m3"])
+        self.assertLess(time.monotonic() - start, 0.6)
+
+    def test_as_ready_yields_fastest_first(self):
+        """as_ready yields the handles in the order the deployments finish."""
+        handles = deploy_all([
+            (FakeModel, {"model_id": "slow", "seconds": 0.3}),
+            (FakeModel, {"model_id": "broken"}),
+            (FakeModel, {"model_id": "fast", "seconds": 0.05}),
+        ])
+        ready = [handle.result().model_id for handle in as_ready(handles, timeout=5) if not handle.exception()]
+        self.assertEqual(ready, ["fast", "slow"])
+
+    def test_handle_is_awaitable(self):
+        """Handles can be awaited."""
+        async def run():
+            handle, = deploy_all([(FakeModel, {"model_id": "m"})])
+            return await handle
+
+        self.assertEqual(asyncio.run(run()).model_id, "m")
+
+
+if __name__ == '__main__':
+    unittest.main()
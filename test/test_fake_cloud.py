@@ -0,0 +1,80 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import logging
+import unittest
+import requests
+from benchmark.fake_cloud import FakeCloud
+from benchmark.suite import compare
+from utils.polling import PollPolicy
+from utils.resilience import Resilience, RetryPolicy
+from vendor.alibaba import Alibaba
+
+
+def fake_alibaba(cloud: FakeCloud) -> Alibaba:
+    return Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", logger=logging.getLogger("test"),
+                   endpoint=cloud.endpoint, protocol="http",
+                   poll_policy=PollPolicy(initial=0.01, jitter=0, deadline=5),
+                   resilience=Resilience(retry=RetryPolicy(max_attempts=10, initial=0.001, jitter=0)))
+
+
+class TestFakeCloud(unittest.TestCase):
+
+    def test_alibaba_deploy_and_invoke(self):
+        """Functions are created, waited for and invoked despite throttling."""
+        with FakeCloud(deploy_time=0.05, throttle_rate=0.3, seed=1) as cloud:
+            vendor = fake_alibaba(cloud)
+            self.assertEqual(vendor.check("dipperai-f"), ({}, False))
+            result = vendor.create("dipperai-f", {"cpu": 1})
+            self.assertEqual(result["config"]["state"], "Active")
+            self.assertEqual(requests.post(result["url"], json={"x": 1}).json(), {"echo": {"x": 1}})
+            info, exists = vendor.check("dipperai-f")
+            self.assertTrue(exists)
+            self.assertEqual(info["url"], result["url"])
+
+    def test_list_functions_pages(self):
+        """Functions are listed in pages."""
+        with FakeCloud() as cloud:
+            for i in range(5):
+                cloud.fc.create_function({"functionName": f"dipperai-{i}"})
+            cloud.fc.create_function({"functionName": "other"})
+            url = f"{cloud.url}/2023-03-30/functions"
+            page = requests.get(url, params={"prefix": "dipperai-", "limit": 3}).json()
+            self.assertEqual(len(page["functions"]), 3)
+            rest = requests.get(url, params={"prefix": "dipperai-", "limit": 3,
+                                             "nextToken": page["nextToken"]}).json()
+            self.assertEqual([f["functionName"] for f in rest["functions"]], ["dipperai-3", "dipperai-4"])
+            self.assertNotIn("nextToken", rest)
+
+    def test_devs_release(self):
+        """Releases finish after the deploy time."""
+        with FakeCloud(deploy_time=60) as cloud:
+            url = f"{cloud.url}/2023-07-14/projects"
+            spec = {"templateConfig": {"templateName": "t", "parameters": {"a": 1}}}
+            self.assertEqual(requests.post(url, json={"name": "dipperai-p", "spec": spec}).status_code, 200)
+            release = requests.get(f"{url}/dipperai-p").json()["status"]["latestReleaseDetail"]
+            self.assertEqual(release["bizStatus"], "Running")
+            cloud.devs.projects["dipperai-p"]["readyAt"] = 0
+            release = requests.get(f"{url}/dipperai-p").json()["status"]["latestReleaseDetail"]
+            self.assertEqual(release["bizStatus"], "Finished")
+            self.assertEqual(release["templateConfigSnapshot"]["parameters"], {"a": 1})
+            self.assertEqual(requests.get(f"{url}/missing").status_code, 404)
+
+    def test_cold_starts(self):
+        """Instances idle past the idle timeout start cold again."""
+        with FakeCloud(idle_timeout=0) as cloud:
+            requests.post(cloud.url, json={})
+            requests.post(cloud.url, json={})
+            self.assertEqual(cloud.cold_starts, 2)
+
+    def test_compare(self):
+        """Metrics worse than the baseline beyond the tolerance are regressions."""
+        baseline = {"results": {"a": {"p50_ms": 10, "throughput_rps": 100, "requests": 5}}}
+        current = {"results": {"a": {"p50_ms": 13, "throughput_rps": 70, "requests": 50}}}
+        regressions = [name for name, *_ in compare(current, baseline, tolerance=0.2)]
+        self.assertEqual(regressions, ["a.p50_ms", "a.throughput_rps"])
+        self.assertEqual(compare(baseline, baseline, tolerance=0.2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import threading
+import time
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS
+from maas.hedging import DEFAULT_HEDGE_WORKERS, DeadlineExceeded, Hedger, LatencyWindow, default_hedge_executor, \
+    remaining
+from utils.async_transport import AsyncTransport
+
+
+def warmed_hedger(**kwargs) -> Hedger:
+    hedger = Hedger(min_samples=5, **kwargs)
+    # enough fast samples that the slow calls of a test do not move the percentile
+    for _ in range(500):
+        hedger.latency.add(0.01)
+    return hedger
+
+
+class TestHedging(unittest.TestCase):
+
+    def test_percentile(self):
+        """Percentiles are taken over the window of samples."""
+        window = LatencyWindow()
+        for i in range(1, 101):
+            window.add(i / 100)
+        self.assertAlmostEqual(window.percentile(0.95), 0.96)
+        self.assertIsNone(LatencyWindow().percentile(0.5))
+
+    def test_remaining(self):
+        """`remaining` is the time left to a deadline, None without one."""
+        self.assertIsNone(remaining(None))
+        self.assertGreater(remaining(time.monotonic() + 10), 9)
+        with self.assertRaises(DeadlineExceeded):
+            remaining(time.monotonic() - 1)
+
+    def test_hedge_wins_over_slow_attempt(self):
+        """The hedge answers when the first attempt is slow."""
+        hedger = warmed_hedger(budget=1.0)
+        delays = iter([1.0, 0.0])
+
+        def send():
+            time.sleep(next(delays))
+            return "ok"
+
+        start = time.perf_counter()
+        self.assertEqual(hedger.call(send), "ok")
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(hedger.stats["hedged"], 1)
+        self.assertEqual(hedger.stats["hedge_won"], 1)
+
+    def test_hedgers_share_one_pool(self):
+        """Hedgers without their own pool share one."""
+        threads = threading.active_count()
+        hedgers = [warmed_hedger(budget=1.0) for _ in range(20)]
+        for hedger in hedgers:
+            self.assertEqual(hedger.call(lambda: time.sleep(0.02) or "ok"), "ok")
+        self.assertLessEqual(threading.active_count() - threads, DEFAULT_HEDGE_WORKERS)
+        self.assertIs(hedgers[0]._executor, default_hedge_executor())
+        with warmed_hedger(max_workers=2) as hedger:
+            self.assertEqual(hedger.call(lambda: "ok"), "ok")
+        with self.assertRaises(RuntimeError):
+            hedger._executor.submit(lambda: None)
+
+    def test_budget_limits_hedges(self):
+        """Hedges stop once the budget is spent."""
+        hedger = warmed_hedger(budget=0.25)
+        for _ in range(8):
+            hedger.call(lambda: time.sleep(0.03))
+        self.assertEqual(hedger.stats["hedged"], 2)
+        self.assertEqual(hedger.stats["over_budget"], 6)
+
+    def test_async_hedge(self):
+        """Async calls are hedged too."""
+        hedger = warmed_hedger(budget=1.0)
+        delays = iter([1.0, 0.0])
+
+        async def send():
+            await asyncio.sleep(next(delays))
+            return "ok"
+
+        self.assertEqual(asyncio.run(hedger.acall(send)), "ok")
+        self.assertEqual(hedger.stats["hedge_won"], 1)
+
+    def test_invoke_deadline(self):
+        """`invoke` raises DeadlineExceeded at its timeout."""
+        with FakeCloud(latency=0.5) as cloud:
+            model = MaaS.from_url(cloud.url)
+            start = time.perf_counter()
+            with self.assertRaises(DeadlineExceeded):
+                model.invoke({"x": 1}, timeout=0.1)
+            self.assertLess(time.perf_counter() - start, 0.4)
+            model.async_transport = AsyncTransport()
+
+            async def ainvoke():
+                try:
+                    await model.ainvoke({"x": 1}, timeout=0.1)
+                finally:
+                    await model.async_transport.close()
+
+            with self.assertRaises(DeadlineExceeded):
+                asyncio.run(ainvoke())
+
+    def test_invoke_hedged(self):
+        """Slow invocations are hedged."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            hedger = model.enable_hedging()
+            for i in range(3):
+                self.assertEqual(model.invoke({"x": i}, timeout=5), {"echo": {"x": i}})
+            self.assertEqual(hedger.snapshot()["calls"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import subprocess
+import tempfile
+import unittest
+
+# generous enough for slow CI machines, far below the ~450ms the vendor SDKs used to cost
+IMPORT_BUDGET_US = 200_000
+HEAVY_MODULES = ("alibabacloud_devs20230714", "Tea", "dashscope", "aiohttp", "requests")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(statement: str, cwd: str) -> dict:
+    """Run `statement` in a fresh interpreter with -X importtime.
+
+    :return: top level imported module name -> cumulative import time in microseconds.
+    """
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # nested imports are indented below the module that triggered them
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def imported_modules(statement: str, cwd: str) -> set:
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    code = f"import sys; {statement}; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True,
+                            check=True)
+    return set(result.stdout.split())
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_import_maas_is_cheap(self):
+        """Importing the MaaS classes loads none of the heavy dependencies."""
+        statement = "from maas import Modelscope, HuggingFace, TongYi"
+        with tempfile.TemporaryDirectory() as cwd:
+            times = import_times(statement, cwd)
+            modules = imported_modules(statement, cwd)
+            # the deployment cache is created on first use, not on import
+            self.assertFalse(os.path.exists(os.path.join(cwd, ".cache")))
+        heavy = sorted(name for name in modules if name.split(".")[0] in HEAVY_MODULES)
+        self.assertEqual(heavy, [])
+        own = sum(us for name, us in times.items() if name.split(".")[0] in ("maas", "utils", "vendor", "version"))
+        self.assertLess(own, IMPORT_BUDGET_US)
+
+if __name__ == '__main__':
+    unittest.main()
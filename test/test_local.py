@@ -0,0 +1,81 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from maas.core import MaaS
+from resources.config import huggingface_local_default_config
+from vendor.local import Local
+
+
+class LocalMaaS(MaaS):
+    def get_service_config(self, user_config: dict) -> dict:
+        """Stub server taking batches."""
+        return {"mode": "stub", "batch": True, **(user_config or {})}
+
+
+class TestLocal(unittest.TestCase):
+
+    def setUp(self):
+        """Start a vendor, its servers stop after each test."""
+        self.vendor = Local()
+        self.addCleanup(self.vendor.close)
+
+    def test_create_check_update_delete(self):
+        """Servers are started once, updated in place for live fields, and stopped."""
+        result = self.vendor.create("dipperai-a", {"mode": "stub"})
+        self.assertTrue(result["url"].startswith("http://127.0.0.1:"))
+        self.assertEqual(self.vendor.create("dipperai-a", {"mode": "stub"}), result)
+        self.assertEqual(self.vendor.check("dipperai-a"), (result, True))
+        # live fields keep the server, the others restart it
+        updated = self.vendor.update("dipperai-a", {"mode": "stub", "latency": 0.01}, patch={"latency": 0.01})
+        self.assertEqual(updated["url"], result["url"])
+        self.assertEqual(updated["config"]["latency"], 0.01)
+        self.assertEqual(list(self.vendor.list_resources()), ["dipperai-a"])
+        self.assertTrue(self.vendor.delete("dipperai-a"))
+        self.assertEqual(self.vendor.check("dipperai-a"), ({}, False))
+
+    def test_deploy_and_batch(self):
+        """A deployed model batches its invoke calls into fewer requests."""
+        with patch("maas.core.get_cache", side_effect=AssertionError("local deployments stay out of the shared cache")):
+            model = LocalMaaS(model_id="m", cloud=self.vendor)
+            self.assertEqual(model.invoke({"text": "hi"}), {"echo": {"text": "hi"}})
+            model.enable_batching(max_batch_size=8, max_wait=0.05)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                outputs = list(executor.map(model.invoke, range(8)))
+            model.disable_batching()
+            # a second deploy in the process finds the running server
+            self.assertEqual(LocalMaaS(model_id="m", cloud=self.vendor).service_url, model.service_url)
+        self.assertEqual(outputs, [{"echo": i} for i in range(8)])
+        stats = self.vendor.stats(model.resource_name)
+        self.assertEqual(stats["inputs"], 9)
+        self.assertLess(stats["requests"], 9)
+
+    def test_pipeline_workers(self):
+        """Pipeline servers run the model in worker processes that survive model errors."""
+        config = huggingface_local_default_config({"handler": "math:sqrt", "workers": 2, "batch": True},
+                                                  model_id="m", model_version="master")
+        result = self.vendor.create("dipperai-p", config)
+        model = MaaS.from_url(result["url"])
+        self.assertEqual(model.invoke(16), 4.0)
+        self.assertEqual(model.invoke_batch([1, 4, 9]), [1.0, 2.0, 3.0])
+        # a failing model answers 500, the worker process survives
+        with self.assertRaises(Exception):
+            model.invoke_batch(["x"])
+        self.assertEqual(model.invoke(4), 2.0)
+
+    def test_lists_and_compressed_bodies(self):
+        """Lists are single inputs unless batching is on, compressed bodies fall back to plain ones."""
+        config = huggingface_local_default_config({}, model_id="m", model_version="master")
+        self.assertFalse(config["batch"])
+        model = MaaS.from_url(self.vendor.create("dipperai-a", {"mode": "stub"})["url"])
+        self.assertEqual(model.invoke([1, 2]), {"echo": [1, 2]})
+        model.enable_compression(min_size=1)
+        self.assertEqual(model.invoke({"text": "x" * 100}), {"echo": {"text": "x" * 100}})
+        self.assertEqual(self.vendor.stats("dipperai-a"), {"requests": 2, "inputs": 2})
+        self.assertIn(model.service_url, model.uncompressed_urls)
+
+
+if __name__ == '__main__':
+    unittest.main()
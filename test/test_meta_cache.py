@@ -0,0 +1,69 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import unittest
+from unittest.mock import MagicMock, patch
+from requests.cookies import cookiejar_from_dict
+from maas.modelscope import Modelscope
+from utils.cache_backends import MemoryBackend
+from utils.meta_cache import MetaCache
+
+
+class FakeHub:
+    def __init__(self):
+        """Hub answering 304 to the etag of its only revision."""
+        self.requests = []
+
+    def fetch(self, etag):
+        """Fetch the metadata, or None if `etag` is current."""
+        self.requests.append(etag)
+        if etag == '"v1"':
+            return None, etag
+        return {"pipeline_tag": "text-classification"}, '"v1"'
+
+
+class TestMetaCache(unittest.TestCase):
+
+    def test_warm_lookup_makes_no_request(self):
+        """Fresh entries are served without asking the hub."""
+        hub = FakeHub()
+        meta_cache = MetaCache(backend=MemoryBackend(), ttl=60)
+        for _ in range(3):
+            meta = meta_cache.get("huggingface", "distilbert", "master", hub.fetch)
+        self.assertEqual(meta, {"pipeline_tag": "text-classification"})
+        self.assertEqual(hub.requests, [None])
+
+    def test_expired_entry_is_revalidated_with_etag(self):
+        """Expired entries are revalidated with their etag."""
+        hub = FakeHub()
+        meta_cache = MetaCache(backend=MemoryBackend(), ttl=-1)
+        meta_cache.get("huggingface", "distilbert", "master", hub.fetch)
+        meta = meta_cache.get("huggingface", "distilbert", "master", hub.fetch)
+        self.assertEqual(meta, {"pipeline_tag": "text-classification"})
+        self.assertEqual(hub.requests, [None, '"v1"'])
+
+    def test_revisions_are_cached_apart(self):
+        """Each revision has its own entry."""
+        hub = FakeHub()
+        meta_cache = MetaCache(backend=MemoryBackend(), ttl=60)
+        meta_cache.get("huggingface", "distilbert", "master", hub.fetch)
+        meta_cache.get("huggingface", "distilbert", "v2", hub.fetch)
+        self.assertEqual(len(hub.requests), 2)
+
+    def test_modelscope_login_cookies_stay_per_model(self):
+        """The Modelscope login cookies go with its requests, not in the shared headers."""
+        model = Modelscope.from_url("http://127.0.0.1:1", model_id="damo/model", transport=MagicMock())
+        model.headers, model.access_token, model.cookies = {"Content-Type": "application/json"}, "token", None
+        model.transport.post.return_value = MagicMock(status_code=200, content=b'{"task": "ocr"}', headers={})
+        login = MagicMock(cookies=cookiejar_from_dict({"m_session_id": "s"}))
+        with patch("requests.post", return_value=login) as post, \
+                patch("maas.modelscope.get_meta_cache", return_value=MetaCache(backend=MemoryBackend())):
+            self.assertEqual(model.get_task(), "ocr")
+        post.assert_called_once()
+        # sent with the request, not set in the headers shared by later requests
+        self.assertNotIn("Cookie", model.headers)
+        self.assertEqual(model.transport.post.call_args.kwargs["cookies"].get("m_session_id"), "s")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS
+from utils.async_transport import AsyncTransport
+from utils.metrics import Histogram, Metrics, OpenTelemetrySink, metrics
+from utils.transport import Transport
+
+
+class FakeSpan:
+    def __init__(self, spans, name, start_time, attributes):
+        """Span recorded in `spans` when it ends."""
+        self.spans = spans
+        self.name = name
+        self.start_time = start_time
+        self.attributes = attributes
+
+    def end(self, end_time):
+        """End the span and record it."""
+        self.end_time = end_time
+        self.spans.append(self)
+
+
+class FakeTracer:
+    def __init__(self):
+        """Tracer keeping the spans it started."""
+        self.spans = []
+
+    def start_span(self, name, start_time, attributes):
+        """Start a span."""
+        return FakeSpan(self.spans, name, start_time, attributes)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        """Turn the global metrics off and empty them."""
+        metrics.disable()
+        metrics.reset()
+
+    def test_disabled_is_noop(self):
+        """A disabled registry records nothing."""
+        registry = Metrics()
+        with registry.timer("invoke", "r"), registry.scope("r"):
+            registry.observe("ttfb", 0.1)
+        self.assertEqual(registry.snapshot(), {})
+
+    def test_histogram(self):
+        """Observations are counted in their buckets, quantiles are read from them."""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.05, 0.5, 2.0):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(1.0), 2.0)
+        self.assertAlmostEqual(histogram.snapshot()["mean"], 0.65)
+
+    def test_prometheus(self):
+        """Histograms are exported in the Prometheus text format, labels escaped."""
+        registry = Metrics(enabled=True, buckets=(0.1, 1.0))
+        registry.observe("ttfb", 0.5, 'dipperai-"x"')
+        text = registry.prometheus()
+        self.assertIn('dipperai_phase_seconds_bucket{resource="dipperai-\\"x\\"",phase="ttfb",le="0.1"} 0', text)
+        self.assertIn('dipperai_phase_seconds_bucket{resource="dipperai-\\"x\\"",phase="ttfb",le="+Inf"} 1', text)
+        self.assertIn('dipperai_phase_seconds_count{resource="dipperai-\\"x\\"",phase="ttfb"} 1', text)
+
+    def test_scope_and_sink(self):
+        """Observations take the resource of their scope and reach the sinks."""
+        registry = Metrics(enabled=True)
+        tracer = FakeTracer()
+        registry.add_sink(OpenTelemetrySink(tracer=tracer))
+        with registry.scope("dipperai-r"):
+            registry.observe("connect", 0.25)
+        self.assertEqual(list(registry.snapshot()), ["dipperai-r"])
+        span = tracer.spans[0]
+        self.assertEqual(span.name, "dipperai.connect")
+        self.assertEqual(span.attributes["dipperai.resource"], "dipperai-r")
+        self.assertEqual(span.end_time - span.start_time, 250000000)
+
+    def test_invoke_phases(self):
+        """Sync and async invocations record every phase."""
+        metrics.enable()
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url, model_id="m", transport=Transport(), async_transport=AsyncTransport())
+            model.invoke({"x": 1})
+
+            async def ainvoke():
+                try:
+                    await model.ainvoke({"x": 1})
+                finally:
+                    await model.async_transport.close()
+
+            asyncio.run(ainvoke())
+        phases = metrics.snapshot()[model.resource_name]
+        self.assertEqual(set(phases), {"connect", "ttfb", "decode", "invoke"})
+        self.assertEqual(phases["invoke"]["count"], 2)
+        self.assertEqual(phases["connect"]["count"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
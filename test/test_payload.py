@@ -0,0 +1,163 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import array
+import asyncio
+import hashlib
+import io
+import pathlib
+import tempfile
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS
+from utils.async_transport import AsyncTransport
+from utils.payload import Binary, MultipartBody, encode_request, has_binary
+
+
+class OneShotStream:
+    """A pipe-like input: readable once, not seekable."""
+
+    def __init__(self, data: bytes):
+        """Wrap `data` in a stream that cannot seek."""
+        self.stream = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to `size` bytes."""
+        return self.stream.read(size)
+
+
+def digest(data: bytes) -> dict:
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+class TestPayload(unittest.TestCase):
+
+    def setUp(self):
+        """200KB of random bytes, also written to a png file."""
+        self.data = os.urandom(200 * 1024 + 7)
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.dir.name) / "page.png"
+        self.path.write_bytes(self.data)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.dir.cleanup()
+
+    def test_binary_sources(self):
+        """Bytes, buffers, paths and streams are all binary sources."""
+        self.assertEqual(Binary(self.data).size, len(self.data))
+        self.assertEqual(Binary(array.array("i", [1, 2, 3])).size, 12)
+        binary = Binary(str(self.path))
+        self.assertEqual((binary.size, binary.filename, binary.content_type), (len(self.data), "page.png", "image/png"))
+        stream = io.BytesIO(b"xx" + self.data)
+        stream.seek(2)
+        self.assertEqual(Binary(stream).size, len(self.data))
+        self.assertFalse(Binary(OneShotStream(self.data)).replayable)
+        with self.assertRaises(TypeError):
+            Binary(42)
+
+    def test_has_binary(self):
+        """Binary inputs are told apart from json inputs."""
+        self.assertTrue(has_binary(self.data))
+        self.assertTrue(has_binary(self.path))
+        self.assertTrue(has_binary({"image": memoryview(self.data), "prompt": "read it"}))
+        # urls and text are json inputs, never paths
+        self.assertFalse(has_binary(str(self.path)))
+        self.assertFalse(has_binary({"image": "https://example.com/page.png"}))
+        self.assertFalse(has_binary(io.StringIO("text")))
+
+    def test_multipart_length_and_no_copy(self):
+        """Multipart bodies know their length and yield buffers without copies."""
+        binary = Binary(self.data)
+        with binary.open() as reader:
+            body = MultipartBody({"image": binary, "prompt": "read it"}, {"image": reader})
+            chunks = list(body)
+        self.assertEqual(body.len, sum(len(chunk) for chunk in chunks))
+        self.assertTrue(any(isinstance(chunk, memoryview) for chunk in chunks))
+
+    def test_encode_closes_files(self):
+        """Files opened for a request are closed when it is sent."""
+        with encode_request(self.path) as request:
+            self.assertEqual(request["headers"]["Content-Type"], "image/png")
+            body = request["data"]
+            self.assertFalse(body.closed)
+        self.assertTrue(body.closed)
+
+    def test_invoke_binary_inputs(self):
+        """Every kind of binary input reaches the service intact."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            expected = digest(self.data)
+            for source in (self.data, memoryview(self.data), self.path, Binary(str(self.path)),
+                           io.BytesIO(self.data), OneShotStream(self.data)):
+                self.assertEqual(model.invoke(source)["received"], expected)
+            self.assertEqual(model.invoke(self.path)["content_type"], "image/png")
+            parts = model.invoke({"image": self.path, "prompt": "read it", "options": {"lang": "en"}})["parts"]
+        self.assertEqual(parts["image"], {"filename": "page.png", "content_type": "image/png", **expected})
+        self.assertEqual((parts["prompt"], parts["options"]), ("read it", '{"lang": "en"}'))
+
+    def test_binary_inputs_skip_result_cache(self):
+        """Binary inputs are never cached."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_result_cache()
+            model.invoke(self.data)
+            model.invoke(self.data)
+            self.assertEqual(cloud.requests, 2)
+
+    def test_retry_resends_file_from_start(self):
+        """Retries re-read streams from the start, one-shot streams are refused."""
+        with FakeCloud(errors=[503]) as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_resilience()
+            model.resilience.retry.initial = 0.001
+            stream = io.BytesIO(self.data)
+            self.assertEqual(model.invoke(stream)["received"], digest(self.data))
+            self.assertEqual(cloud.requests, 2)
+            with self.assertRaises(ValueError):
+                model.invoke(OneShotStream(self.data))
+
+    def test_compression_negotiation(self):
+        """Bodies are compressed, and sent plain to services answering 415."""
+        text = b"lorem ipsum " * 4096
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_compression()
+            self.assertEqual(model.invoke(text)["received"], digest(text))
+            self.assertEqual(model.invoke({"text": "x" * 4096})["echo"], {"text": "x" * 4096})
+            self.assertEqual(cloud.requests, 2)
+        with FakeCloud(accept_encodings=()) as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_compression()
+            self.assertEqual(model.invoke(text)["received"], digest(text))
+            self.assertEqual(model.invoke(text)["received"], digest(text))
+            # one 415, then plain bodies
+            self.assertEqual(cloud.requests, 3)
+            self.assertEqual(model.uncompressed_urls, {cloud.url})
+        with self.assertRaises(ValueError):
+            model.enable_compression("br")
+
+    def test_ainvoke_binary_inputs(self):
+        """Async invocations stream binary inputs too."""
+        async def run():
+            transport = AsyncTransport()
+            model = MaaS.from_url(cloud.url, async_transport=transport)
+            model.enable_compression()
+            try:
+                return [
+                    await model.ainvoke(self.path),
+                    await model.ainvoke(memoryview(self.data)),
+                    await model.ainvoke({"image": self.path, "prompt": "read it"}),
+                ]
+            finally:
+                await transport.close()
+
+        with FakeCloud() as cloud:
+            raw, view, form = asyncio.run(run())
+        expected = digest(self.data)
+        self.assertEqual((raw["received"], view["received"]), (expected, expected))
+        self.assertEqual(form["parts"]["image"]["sha256"], expected["sha256"])
+
+
+if __name__ == '__main__':
+    unittest.main()
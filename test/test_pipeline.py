@@ -0,0 +1,100 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import threading
+import time
+import unittest
+from maas.core import MaaS
+from maas.pipeline import Pipeline, Stage, StageError
+from vendor.local import Local
+
+
+class SleepModel:
+    def __init__(self, seconds: float, fail_on: int = None):
+        """Model taking `seconds` per call, failing for the input `fail_on`."""
+        self.seconds = seconds
+        self.fail_on = fail_on
+        self.batches = []
+
+    def invoke(self, input):
+        """Add one to the input."""
+        time.sleep(self.seconds)
+        if input == self.fail_on:
+            raise ValueError(f"bad input {input}")
+        return input + 1
+
+    def invoke_batch(self, inputs):
+        """Add one to every input in one call."""
+        self.batches.append(len(inputs))
+        time.sleep(self.seconds)
+        return [input + 1 for input in inputs]
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_stages_overlap(self):
+        """Stages work on different items at the same time."""
+        pipeline = Pipeline([Stage(SleepModel(0.02), concurrency=1, name="a"),
+                             Stage(SleepModel(0.02), concurrency=1, name="b"),
+                             Stage(SleepModel(0.02), concurrency=1, name="c")])
+        start = time.monotonic()
+        outputs = pipeline.run(range(30))
+        elapsed = time.monotonic() - start
+        self.assertEqual(outputs, [i + 3 for i in range(30)])
+        # bound by one stage (0.6s), not by the sum of the three (1.8s)
+        self.assertLess(elapsed, 1.2)
+        self.assertEqual(pipeline.snapshot()["b"]["items"], 30)
+
+    def test_batching_and_backpressure(self):
+        """Stages batch, and the input is only read as far as the pipeline has room."""
+        read = []
+
+        def items():
+            for i in range(100):
+                read.append(i)
+                yield i
+
+        batched = SleepModel(0.01)
+        pipeline = Pipeline([Stage(batched, concurrency=1, batch_size=10, max_wait=0.05, name="batched"),
+                             Stage(SleepModel(0.0), concurrency=2, name="fast")], max_in_flight=20)
+        outputs = pipeline.map(items())
+        self.assertEqual(next(outputs), 2)
+        time.sleep(0.2)
+        # the input is only read as far as the pipeline has room
+        self.assertLessEqual(len(read), 21)
+        self.assertEqual(list(outputs), [i + 2 for i in range(1, 100)])
+        self.assertLess(len(batched.batches), 30)
+        self.assertEqual(sum(batched.batches), 100)
+
+    def test_errors(self):
+        """Failed items raise, or are recorded in place of their output."""
+        stages = [Stage(SleepModel(0.0, fail_on=3), name="a"), Stage(SleepModel(0.0), name="b")]
+        with self.assertRaises(StageError) as context:
+            Pipeline(stages).run(range(10))
+        self.assertEqual(context.exception.stage, "a")
+        outputs = Pipeline(stages, on_error="record").run(range(5))
+        self.assertEqual(outputs[3], {"error": "bad input 3", "stage": "a"})
+        self.assertEqual(outputs[4], 6)
+        self.assertEqual(Pipeline([SleepModel(0.0)]).run(iter([])), [])
+
+    def test_early_close_stops_workers(self):
+        """Closing the output generator early stops the workers."""
+        threads = threading.active_count()
+        outputs = Pipeline([Stage(SleepModel(0.001), concurrency=4, name="a")]).map(range(10 ** 6))
+        self.assertEqual(next(outputs), 1)
+        outputs.close()
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_local_models(self):
+        """Local models are chained, the first one batching."""
+        with Local() as vendor:
+            ocr = MaaS.from_url(vendor.create("dipperai-ocr", {"mode": "stub", "batch": True})["url"])
+            summary = MaaS.from_url(vendor.create("dipperai-summary", {"mode": "stub"})["url"])
+            pipeline = Pipeline([Stage(ocr, batch_size=4, name="ocr"),
+                                 Stage(summary, prepare=lambda output: output["echo"]["image"], name="summary")])
+            outputs = pipeline.run({"image": f"card-{i}.jpg"} for i in range(12))
+        self.assertEqual(outputs, [{"echo": f"card-{i}.jpg"} for i in range(12)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import random
+import unittest
+from unittest.mock import MagicMock, patch
+from utils.polling import PollPolicy, poll_until
+from vendor.alibaba import Alibaba
+from vendor.devs import Devs
+
+
+class FakeClock:
+    def __init__(self):
+        """Clock moved by the sleeps only."""
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        """Current fake time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Record the sleep and move the clock."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeProjectResponse:
+    def __init__(self, body):
+        """Response of get_project with `body`."""
+        self.body = body
+
+    def to_map(self):
+        """Get the response as a dict."""
+        return {"statusCode": 200, "body": self.body}
+
+
+class FakeDevsClient:
+    """Answers get_project like DevS, the release finishes `ready_after` seconds in."""
+
+    def __init__(self, clock, ready_after):
+        """Count the calls, the release finishes at `ready_after`."""
+        self.clock = clock
+        self.ready_after = ready_after
+        self.calls = 0
+
+    def get_project(self, name):
+        """Answer the project status at the current fake time."""
+        self.calls += 1
+        status = "Finished" if self.clock.now >= self.ready_after else "Running"
+        trigger = {"triggers": [{"httpTrigger": {"urlInternet": "https://model.example.com"}}]}
+        return FakeProjectResponse({"status": {"latestReleaseDetail": {
+            "bizStatus": status,
+            "releaseOutputs": {"deploy": {"model_app_func": trigger}},
+            "templateConfigSnapshot": {"templateName": "start-huggingface", "parameters": {}},
+        }}})
+
+
+class TestPolling(unittest.TestCase):
+
+    def test_intervals_grow_to_cap_with_jitter(self):
+        """Intervals grow by factor up to the cap, jitter only shortens them."""
+        policy = PollPolicy(initial=1, factor=2, max_interval=8, jitter=0.5)
+        rng = random.Random(7)
+        intervals = [policy.interval(attempt, rng) for attempt in range(1, 8)]
+        for attempt, interval in enumerate(intervals, start=1):
+            base = min(8, 2 ** (attempt - 1))
+            self.assertGreaterEqual(interval, base * 0.5)
+            self.assertLessEqual(interval, base)
+
+    def test_deadline(self):
+        """Polling gives up at the deadline."""
+        clock = FakeClock()
+        with self.assertRaises(TimeoutError):
+            poll_until(lambda: (False, None), PollPolicy(deadline=60), sleep=clock.sleep, clock=clock.time)
+        self.assertAlmostEqual(clock.now, 60)
+
+    def test_devs_time_to_ready(self):
+        """DevS releases are reported soon after they finish."""
+        clock = FakeClock()
+        devs = Devs(access_key_id="id", access_key_secret="secret", account_id="1", logger=MagicMock(),
+                    poll_policy=PollPolicy(initial=1, factor=1.5, max_interval=40))
+        devs._client = FakeDevsClient(clock, ready_after=5)
+        with patch("utils.polling.time.sleep", clock.sleep), patch("utils.polling.time.monotonic", clock.time):
+            result = devs.check_model_status("dipperai-huggingface-abc")
+        self.assertEqual(result["url"], "https://model.example.com")
+        # the fixed 40s interval used to report this release after 40s
+        self.assertLess(clock.now, 10)
+
+    def test_alibaba_waits_for_active_function(self):
+        """Alibaba functions are polled until they are active."""
+        clock = FakeClock()
+        alibaba = Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", ACCOUNT_ID="1", logger=MagicMock(),
+                          poll_policy=PollPolicy(initial=0.5))
+        states = iter(["Pending", "Pending", "Active"])
+        alibaba.get_function = lambda function_name: {"functionName": function_name, "state": next(states)}
+        with patch("utils.polling.time.sleep", clock.sleep), patch("utils.polling.time.monotonic", clock.time):
+            result = alibaba.check_function_status("f")
+        self.assertEqual(result["state"], "Active")
+        self.assertEqual(len(clock.sleeps), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
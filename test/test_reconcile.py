@@ -0,0 +1,122 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import logging
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.reconcile import cache_owner, reconcile
+from utils.cache import Cache
+from utils.cache_backends import MemoryBackend
+from utils.resilience import Resilience, RetryPolicy
+from vendor.alibaba import Alibaba
+
+
+class StubVendor:
+    def __init__(self, resources: dict):
+        """Vendor serving `resources` from memory."""
+        self.resources = resources
+        self.calls = 0
+
+    def list_resources(self, prefix: str = "dipperai-") -> dict:
+        """List the resources whose name starts with `prefix`."""
+        self.calls += 1
+        return {name: value for name, value in self.resources.items() if name.startswith(prefix)}
+
+
+class TestReconcile(unittest.TestCase):
+
+    def setUp(self):
+        """Cache entries of this vendor, and a vendor whose resources moved, went or appeared."""
+        self.cache = Cache(backend=MemoryBackend())
+        self.owner = cache_owner(StubVendor({}))
+        self.cache.set_cache("dipperai-same", {"url": "http://same", "config": {"cpu": 1}, **self.owner})
+        self.cache.set_cache("dipperai-moved", {"url": "http://old", "config": {"cpu": 1}, **self.owner})
+        self.cache.set_cache("dipperai-gone", {"url": "http://gone", "config": {}, **self.owner})
+        self.cache.set_cache("dipperai-deploying", {"url": "http://previous", "config": {}, **self.owner})
+        self.cache.set_cache("other-model", {"url": "http://other", "config": {}, **self.owner})
+        self.vendor = StubVendor({
+            "dipperai-same": {"url": "http://same", "config": {"cpu": 1}},
+            "dipperai-moved": {"url": "http://new", "config": {"cpu": 2}},
+            "dipperai-deploying": {},
+            "dipperai-new": {"url": "http://fresh", "config": {}},
+        })
+
+    def test_reconcile(self):
+        """Entries are verified, refreshed, adopted, pruned or left pending with one listing."""
+        self.cache.ttl = 60
+        self.cache.backend.set("dipperai-same", self.cache.get_cache("dipperai-same"), 0)
+        report = reconcile(self.vendor, cache=self.cache)
+        self.assertEqual(report, {"verified": ["dipperai-same"], "refreshed": ["dipperai-moved"],
+                                  "adopted": ["dipperai-new"], "pruned": ["dipperai-gone"],
+                                  "pending": ["dipperai-deploying"]})
+        self.assertEqual(self.vendor.calls, 1)
+        self.assertEqual(self.cache.get_cache("dipperai-moved"),
+                         {"url": "http://new", "config": {"cpu": 2}, **self.owner})
+        self.assertEqual(self.cache.get_cache("dipperai-gone"), {})
+        self.assertEqual(self.cache.get_cache("dipperai-deploying")["url"], "http://previous")
+        self.assertEqual(self.cache.get_cache("other-model")["url"], "http://other")
+        # verified entries are trusted for another ttl
+        self.assertFalse(self.cache.is_stale("dipperai-same"))
+
+    def test_dry_run_and_options(self):
+        """`dry_run` reports without writing, prune and adopt can be turned off."""
+        report = reconcile(self.vendor, cache=self.cache, dry_run=True)
+        self.assertEqual(report["pruned"], ["dipperai-gone"])
+        self.assertEqual(self.cache.get_cache("dipperai-gone")["url"], "http://gone")
+        report = reconcile(self.vendor, cache=self.cache, prune=False, adopt=False)
+        self.assertEqual((report["pruned"], report["adopted"]), ([], []))
+        self.assertEqual(self.cache.get_cache("dipperai-new"), {})
+
+    def test_prunes_only_its_vendor_and_region(self):
+        """Entries of other vendors, regions or older versions are not pruned."""
+        # a replica deployed by `MaaS.deploy_replicas` to another region, and an entry of an older version
+        self.cache.set_cache("dipperai-gone-cn-shanghai", {"url": "http://replica", "config": {},
+                                                           **self.owner, "region": "cn-shanghai"})
+        self.cache.set_cache("dipperai-untagged", {"url": "http://untagged", "config": {}})
+        report = reconcile(self.vendor, cache=self.cache)
+        self.assertEqual(report["pruned"], ["dipperai-gone"])
+        self.assertEqual(self.cache.get_cache("dipperai-gone-cn-shanghai")["url"], "http://replica")
+        self.assertEqual(self.cache.get_cache("dipperai-untagged")["url"], "http://untagged")
+        # the sweep of that region prunes it
+        shanghai = StubVendor({})
+        shanghai.region = "cn-shanghai"
+        self.assertEqual(reconcile(shanghai, cache=self.cache)["pruned"], ["dipperai-gone-cn-shanghai"])
+
+    def test_alibaba_sweep(self):
+        """Alibaba functions are listed with their trigger urls and adopted."""
+        with FakeCloud() as cloud:
+            for name in ("dipperai-a", "dipperai-b", "dipperai-pending"):
+                cloud.fc.create_function({"functionName": name})
+            for name in ("dipperai-a", "dipperai-b"):
+                cloud.fc.handle_trigger("POST", name, None, {"triggerName": "dipperai_default_trigger"})
+            vendor = Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", logger=logging.getLogger("test"),
+                             endpoint=cloud.endpoint, protocol="http",
+                             resilience=Resilience(retry=RetryPolicy(initial=0.001, jitter=0)))
+            resources = vendor.list_resources()
+            self.assertEqual(resources["dipperai-a"]["url"], f"{cloud.url}/fc/dipperai-a")
+            self.assertIsNone(resources["dipperai-pending"]["url"])
+            report = reconcile(vendor, cache=self.cache)
+        self.assertEqual(report["adopted"], ["dipperai-a", "dipperai-b"])
+        self.assertEqual(report["pending"], ["dipperai-pending"])
+        # the cached entries belong to StubVendor, not to this Alibaba region
+        self.assertEqual(report["pruned"], [])
+        self.assertEqual(self.cache.get_cache("dipperai-b")["vendor"], "Alibaba")
+        self.assertEqual(self.cache.get_cache("dipperai-b")["config"]["functionName"], "dipperai-b")
+
+    def test_alibaba_created_entry_is_verified(self):
+        """Entries written by deploy are verified and kept as they are."""
+        with FakeCloud() as cloud:
+            vendor = Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", logger=logging.getLogger("test"),
+                             endpoint=cloud.endpoint, protocol="http",
+                             resilience=Resilience(retry=RetryPolicy(initial=0.001, jitter=0)))
+            created = vendor.create("dipperai-created", {"cpu": 1, "memorySize": 2048})
+            entry = {**created, "fingerprint": "desired", **cache_owner(vendor)}
+            self.cache.set_cache("dipperai-created", entry)
+            report = reconcile(vendor, cache=self.cache)
+        self.assertEqual(report["verified"], ["dipperai-created"])
+        # the entry is kept as deploy stored it, so its fingerprint still skips the next diff
+        self.assertEqual(self.cache.get_cache("dipperai-created"), entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
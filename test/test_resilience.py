@@ -0,0 +1,148 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import logging
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS
+from utils.resilience import (CircuitBreaker, CircuitOpenError, Resilience, RetryPolicy, TokenBucket,
+                              TransientError, is_transient)
+from vendor.alibaba import Alibaba
+
+
+class FakeClock:
+    def __init__(self):
+        """Clock that only moves when told to."""
+        self.now = 0.0
+
+    def __call__(self):
+        """Get the current time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Move the clock instead of sleeping."""
+        self.now += seconds
+
+
+def fast_resilience(**kwargs) -> Resilience:
+    return Resilience(retry=RetryPolicy(max_attempts=3, initial=0.001, jitter=0), **kwargs)
+
+
+def fake_alibaba(cloud: FakeCloud) -> Alibaba:
+    return Alibaba(ACCESS_KEY_ID="id", ACCESS_KEY_SECRET="secret", logger=logging.getLogger("test"),
+                   resilience=fast_resilience(), endpoint=cloud.endpoint, protocol="http")
+
+
+class TestResilience(unittest.TestCase):
+
+    def test_token_bucket(self):
+        """Tokens refill at the rate, up to the burst."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, clock=clock)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+        clock.now += 1.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_circuit_breaker(self):
+        """The circuit opens after the threshold, and closes after a good trial call."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record(False)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        clock.now += 10
+        # one trial call while half open
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_classification(self):
+        """Throttling, 5xx and connection errors are transient, other errors are not."""
+        self.assertTrue(is_transient(TransientError("throttled", status=429)))
+        self.assertTrue(is_transient(ConnectionResetError()))
+        self.assertFalse(is_transient(ValueError()))
+        sdk_error = Exception("Throttling")
+        sdk_error.statusCode = 503
+        self.assertTrue(is_transient(sdk_error))
+        sdk_error.statusCode = 404
+        self.assertFalse(is_transient(sdk_error))
+
+    def test_retries_transient_only(self):
+        """Transient errors are retried, others are raised at once."""
+        clock = FakeClock()
+        resilience = Resilience(retry=RetryPolicy(max_attempts=3), sleep=clock.sleep, clock=clock)
+        outcomes = [TransientError("busy", status=503), TransientError("busy", status=429), "ok"]
+
+        def send():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(resilience.call("api", send), "ok")
+        self.assertEqual(resilience.stats["retries"], 2)
+        self.assertGreater(clock.now, 0)
+
+        calls = []
+
+        def fatal():
+            calls.append(1)
+            raise ValueError("bad config")
+
+        with self.assertRaises(ValueError):
+            resilience.call("api", fatal)
+        self.assertEqual(len(calls), 1)
+
+    def test_circuit_opens(self):
+        """Repeated failures open the circuit, which then refuses calls."""
+        clock = FakeClock()
+        resilience = Resilience(retry=RetryPolicy(max_attempts=1), failure_threshold=2, sleep=clock.sleep,
+                                clock=clock)
+
+        def send():
+            raise TransientError("down", status=503)
+
+        for _ in range(2):
+            with self.assertRaises(TransientError):
+                resilience.call("api", send)
+        with self.assertRaises(CircuitOpenError):
+            resilience.call("api", send)
+        self.assertEqual(resilience.snapshot()["circuits"], {"api": CircuitBreaker.OPEN})
+
+    def test_alibaba_throttled_then_found(self):
+        """Throttled vendor calls are retried."""
+        with FakeCloud(errors=[429, 503]) as cloud:
+            cloud.fc.create_function({"functionName": "dipperai-f"})
+            info = fake_alibaba(cloud).get_function("dipperai-f")
+            self.assertEqual(info["functionName"], "dipperai-f")
+            self.assertEqual(cloud.requests, 3)
+
+    def test_alibaba_not_found_is_not_retried(self):
+        """404 means the function does not exist and is not retried."""
+        with FakeCloud(errors=[404]) as cloud:
+            self.assertEqual(fake_alibaba(cloud).check("dipperai-f"), ({}, False))
+            self.assertEqual(cloud.requests, 1)
+
+    def test_alibaba_throttled_raises(self):
+        """Throttling past max_attempts raises."""
+        with FakeCloud(errors=[429] * 5) as cloud:
+            with self.assertRaises(TransientError):
+                fake_alibaba(cloud).check("dipperai-f")
+            self.assertEqual(cloud.requests, 3)
+
+    def test_invoke_retried(self):
+        """Failing invocations are retried."""
+        with FakeCloud(errors=[503]) as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_resilience(retry=RetryPolicy(initial=0.001))
+            self.assertEqual(model.invoke({"x": 1}), {"echo": {"x": 1}})
+            self.assertEqual(model.resilience.snapshot()["retries"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
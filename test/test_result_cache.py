@@ -0,0 +1,145 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS, ResponseError
+from utils.async_transport import close_default_async_transport
+from utils.result_cache import ResultCache, WaitTimeout
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_key_is_canonical(self):
+        """Keys do not depend on the order of the dict keys, but on the revision."""
+        self.assertEqual(ResultCache.key("r", "master", {"a": 1, "b": 2}), ResultCache.key("r", "master", {"b": 2, "a": 1}))
+        self.assertNotEqual(ResultCache.key("r", "master", {"a": 1}), ResultCache.key("r", "v2", {"a": 1}))
+
+    def test_hits_and_copies(self):
+        """Hits are served without calling compute, as copies the caller may change."""
+        cache = ResultCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"labels": ["a"]}
+
+        first = cache.get_or_compute("k", compute)
+        first["labels"].append("mutated")
+        self.assertEqual(cache.get_or_compute("k", compute), {"labels": ["a"]})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.snapshot()["hits"], 1)
+
+    def test_lru_is_bounded_by_bytes(self):
+        """The memory tier evicts the least recently used results above max_bytes."""
+        cache = ResultCache(max_bytes=100)
+        for i in range(10):
+            cache.get_or_compute(str(i), lambda: "x" * 30)
+        snapshot = cache.snapshot()
+        self.assertLessEqual(snapshot["bytes"], 100)
+        self.assertEqual(snapshot["evictions"], 7)
+
+    def test_ttl_and_disk_tier(self):
+        """Results expire after the ttl, and are shared through the disk tier."""
+        with tempfile.TemporaryDirectory() as disk_dir:
+            ResultCache(disk_dir=disk_dir).get_or_compute("k", lambda: {"v": 1})
+            # a new process reads the result from disk
+            cache = ResultCache(disk_dir=disk_dir)
+            self.assertEqual(cache.get_or_compute("k", lambda: {"v": 2}), {"v": 1})
+            self.assertEqual(cache.snapshot()["disk_hits"], 1)
+        cache = ResultCache(ttl=0.01)
+        cache.get_or_compute("k", lambda: 1)
+        time.sleep(0.02)
+        self.assertEqual(cache.get_or_compute("k", lambda: 2), 2)
+
+    def test_in_flight_calls_are_coalesced(self):
+        """Concurrent callers of the same key share one compute call."""
+        cache = ResultCache()
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(cache.get_or_compute, "k", compute) for _ in range(8)]
+            time.sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+        self.assertEqual(results, ["result"] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.snapshot()["coalesced"], 7)
+
+    def test_waiters_honor_their_timeout(self):
+        """Waiters give up at their timeout, the shared call goes on."""
+        cache = ResultCache()
+        release = threading.Event()
+        with ThreadPoolExecutor(1) as pool:
+            owner = pool.submit(cache.get_or_compute, "k", lambda: release.wait(5) and "result")
+            time.sleep(0.05)
+            with self.assertRaises(FutureTimeoutError):
+                cache.get_or_compute("k", lambda: "other", timeout=0.05)
+            with self.assertRaises(WaitTimeout):
+                asyncio.run(cache.aget_or_compute("k", lambda: "other", timeout=0.05))
+            release.set()
+            self.assertEqual(owner.result(), "result")
+
+    def test_error_answers_are_not_cached(self):
+        """Error answers are raised, not cached."""
+        with FakeCloud(errors=[500]) as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_result_cache()
+            with self.assertRaises(ResponseError) as context:
+                model.invoke({"input": 1})
+            self.assertEqual(context.exception.status, 500)
+            self.assertEqual(model.invoke({"input": 1}), {"echo": {"input": 1}})
+            self.assertEqual(model.invoke({"input": 1}), {"echo": {"input": 1}})
+            self.assertEqual(cloud.requests, 2)
+
+    def test_async_calls_are_coalesced(self):
+        """Async callers are coalesced, and share the cache with sync callers."""
+        cache = ResultCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            return await asyncio.gather(*[cache.aget_or_compute("k", compute) for _ in range(8)])
+
+        self.assertEqual(asyncio.run(main()), ["result"] * 8)
+        self.assertEqual(cache.get_or_compute("k", lambda: "other"), "result")
+        self.assertEqual((len(calls), cache.snapshot()["coalesced"], cache.snapshot()["hits"]), (1, 7, 1))
+
+    def test_ainvoke_uses_the_cache(self):
+        """`ainvoke` and `ainvoke_many` are served from the cache."""
+        with FakeCloud(errors=[500]) as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_result_cache()
+
+            async def main():
+                try:
+                    with self.assertRaises(ResponseError):
+                        await model.ainvoke({"input": 1})
+                    return await model.ainvoke_many([{"input": 1}] * 3, concurrency=3)
+                finally:
+                    await close_default_async_transport()
+
+            self.assertEqual(asyncio.run(main()), [{"echo": {"input": 1}}] * 3)
+            # sync and async calls share the cache
+            self.assertEqual(model.invoke({"input": 1}), {"echo": {"input": 1}})
+            self.assertEqual(cloud.requests, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS, ResponseError
+from maas.hedging import DeadlineExceeded
+from maas.router import LEAST_OUTSTANDING, ReplicaError, ReplicaRouter
+
+
+class TestReplicaRouter(unittest.TestCase):
+
+    def test_prefers_lowest_ewma(self):
+        """The replica with the lowest latency average is preferred."""
+        router = ReplicaRouter()
+        fast, slow = router.add("http://fast"), router.add("http://slow")
+        router.release(router.choose(exclude=[slow]), 0.01)
+        router.release(router.choose(exclude=[fast]), 0.5)
+        picks = []
+        for _ in range(5):
+            replica = router.choose()
+            picks.append(replica.name)
+            router.release(replica, 0.01 if replica is fast else 0.5)
+        self.assertEqual(picks, ["http://fast"] * 5)
+
+    def test_least_outstanding(self):
+        """With least outstanding, the replica with the fewest calls in flight is chosen."""
+        router = ReplicaRouter(strategy=LEAST_OUTSTANDING)
+        router.add("http://a")
+        router.add("http://b")
+        first, second = router.choose(), router.choose()
+        self.assertNotEqual(first, second)
+
+    def test_failover_and_cooldown(self):
+        """Failed replicas are skipped until their cooldown ends."""
+        router = ReplicaRouter(cooldown=60)
+        broken, healthy = router.add("http://broken"), router.add("http://healthy")
+
+        def send(url):
+            if url == broken.url:
+                raise ReplicaError("503")
+            return url
+
+        self.assertEqual(router.call(send), "http://healthy")
+        self.assertEqual(broken.failures, 1)
+        # the failed replica is skipped while it cools down
+        self.assertIs(router.choose(), healthy)
+
+    def test_all_replicas_failing(self):
+        """The last error is raised when every replica fails."""
+        router = ReplicaRouter()
+        router.add("http://a")
+        with self.assertRaises(ReplicaError):
+            router.call(lambda url: (_ for _ in ()).throw(ReplicaError("down")))
+
+    def test_replica_timeouts_fail_over(self):
+        """Replica timeouts fail over to the next replica."""
+        async def send(url):
+            if url == "http://slow":
+                # like aiohttp.ServerTimeoutError, a TimeoutError of one replica's socket
+                raise TimeoutError("read timeout")
+            return url
+
+        for call in (lambda router: asyncio.run(router.acall(send)),
+                     lambda router: router.call(lambda url: asyncio.run(send(url)))):
+            router = ReplicaRouter()
+            router.add("http://slow")
+            router.add("http://fast")
+            router.replicas[1].ewma = 1.0
+            self.assertEqual(call(router), "http://fast")
+            self.assertEqual(router.snapshot()["http://slow"]["failures"], 1)
+
+    def test_deadline_is_not_a_replica_failure(self):
+        """A deadline is raised as it is, the replica stays healthy."""
+        router = ReplicaRouter()
+        router.add("http://a")
+        router.add("http://b")
+        calls = []
+
+        def send(url):
+            calls.append(url)
+            raise DeadlineExceeded("Invocation deadline exceeded.")
+
+        with self.assertRaises(DeadlineExceeded):
+            router.call(send)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(router.snapshot()[calls[0]]["failures"], 0)
+
+    def test_call_errors_do_not_fail_over(self):
+        """Errors that are not replica failures are raised without failing over."""
+        router = ReplicaRouter()
+        router.add("http://a")
+        router.add("http://b")
+        calls = []
+
+        def send(url):
+            calls.append(url)
+            raise ValueError("Object of type set is not JSON serializable")
+
+        with self.assertRaises(ValueError):
+            router.call(send)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(router.snapshot()[calls[0]]["failures"], 0)
+
+    def test_client_errors_leave_replicas_healthy(self):
+        """Client errors of the model leave every replica healthy."""
+        with FakeCloud(errors=[400]) as primary, FakeCloud(errors=[400]) as replica:
+            model = MaaS.from_url(primary.url)
+            model.add_replica(replica.url, "replica")
+            # the result cache makes a 4xx answer raise ResponseError
+            model.enable_result_cache()
+            with self.assertRaises(ResponseError) as raised:
+                model.invoke({"input": 1})
+            self.assertEqual(raised.exception.status, 400)
+            self.assertEqual(model.invoke({"input": 1}), {"echo": {"input": 1}})
+        snapshot = model.router.snapshot()
+        self.assertEqual([entry["failures"] for entry in snapshot.values()], [0, 0])
+        self.assertTrue(all(entry["healthy"] for entry in snapshot.values()))
+
+    def test_invoke_fails_over_to_replica(self):
+        """`invoke` fails over to a replica when the service is down."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url("http://127.0.0.1:9")  # nothing listens on the discard port
+            model.add_replica(cloud.url, "replica")
+            self.assertEqual(model.invoke({"input": 1}), {"echo": {"input": 1}})
+            self.assertEqual(model.invoke({"input": 2}), {"echo": {"input": 2}})
+        snapshot = model.router.snapshot()
+        self.assertEqual(snapshot["replica"]["requests"], 2)
+        self.assertFalse(snapshot[model.resource_name]["healthy"])
+
+
+if __name__ == '__main__':
+    unittest.main()
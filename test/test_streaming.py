@@ -0,0 +1,110 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import asyncio
+import time
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS
+from maas.hedging import DeadlineExceeded
+from utils.async_transport import AsyncTransport, close_default_async_transport
+from utils.streaming import SSEDecoder, aiter_in_thread
+from utils.transport import Transport
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_sse_decoder(self):
+        """Events are split on blank lines, multi-line data is joined, [DONE] ends the stream."""
+        decoder = SSEDecoder()
+        events = []
+        for line in [": comment", "data: {\"a\": 1}", "", "data: line1", "data: line2", "", "data: [DONE]", ""]:
+            ready, payload = decoder.feed(line)
+            if ready:
+                events.append(payload)
+        self.assertEqual(events, [{"a": 1}, "line1\nline2"])
+        self.assertTrue(decoder.done)
+
+    def test_invoke_stream_yields_before_body_ends(self):
+        """The first chunk arrives before the server finishes the body."""
+        with FakeCloud(latency=0.1) as cloud:
+            model = MaaS.from_url(cloud.url, transport=Transport())
+            start = time.monotonic()
+            stream = model.invoke_stream({"stream": 5})
+            first = next(stream)
+            first_at = time.monotonic() - start
+            rest = list(stream)
+        self.assertEqual(first, {"token": 0})
+        self.assertEqual(rest, [{"token": i} for i in range(1, 5)])
+        # the whole stream takes ~0.5s, the first token arrives long before
+        self.assertLess(first_at, 0.3)
+
+    def test_ainvoke_stream(self):
+        """Streams are read from asyncio too."""
+        async def run(url):
+            transport = AsyncTransport()
+            try:
+                model = MaaS.from_url(url, async_transport=transport)
+                return [chunk async for chunk in model.ainvoke_stream({"stream": 3})]
+            finally:
+                await transport.close()
+
+        with FakeCloud() as cloud:
+            self.assertEqual(asyncio.run(run(cloud.url)), [{"token": i} for i in range(3)])
+
+    def test_stalled_stream_hits_the_deadline(self):
+        """A stream stalled past its timeout raises DeadlineExceeded."""
+        async def run(url):
+            transport = AsyncTransport()
+            try:
+                model = MaaS.from_url(url, async_transport=transport)
+                return [chunk async for chunk in model.ainvoke_stream({"stream": 5}, timeout=0.3)]
+            finally:
+                await transport.close()
+
+        with FakeCloud(latency=0.2) as cloud:
+            model = MaaS.from_url(cloud.url, transport=Transport())
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                list(model.invoke_stream({"stream": 5}, timeout=0.3))
+            with self.assertRaises(DeadlineExceeded):
+                asyncio.run(run(cloud.url))
+        # the whole streams would take 1s each
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_stream_fails_over_to_replica(self):
+        """A stream that cannot connect fails over to a replica."""
+        async def run(model):
+            try:
+                return [chunk async for chunk in model.ainvoke_stream({"stream": 2})]
+            finally:
+                await close_default_async_transport()
+
+        with FakeCloud() as cloud:
+            model = MaaS.from_url("http://127.0.0.1:9")  # nothing listens on the discard port
+            model.add_replica(cloud.url, "replica")
+            self.assertEqual(list(model.invoke_stream({"stream": 2})), [{"token": 0}, {"token": 1}])
+            self.assertEqual(asyncio.run(run(model)), [{"token": 0}, {"token": 1}])
+        self.assertEqual(model.router.snapshot()["replica"]["requests"], 2)
+
+    def test_aiter_in_thread_stops_early(self):
+        """Breaking out of the async iteration stops the producer thread."""
+        produced = []
+
+        def numbers():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        async def run():
+            async for item in aiter_in_thread(numbers, max_buffered=2):
+                if item == 3:
+                    break
+
+        asyncio.run(run())
+        # the producer stopped instead of running through the whole iterator
+        self.assertLess(len(produced), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
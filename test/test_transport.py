@@ -0,0 +1,30 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import unittest
+from benchmark.fake_cloud import FakeCloud
+from utils.transport import Transport, default_transport
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_connection_reuse(self):
+        """Sequential calls reuse one keep-alive connection."""
+        with FakeCloud() as cloud:
+            transport = Transport(pool_size=2, connect_timeout=1, read_timeout=5)
+            sockets = set()
+            for i in range(5):
+                response = transport.post(cloud.url, json={"input": i}, stream=True)
+                sockets.add(response.raw.connection.sock.getsockname())
+                self.assertEqual(response.json(), {"echo": {"input": i}})
+            transport.close()
+        # every call went over the same keep-alive connection
+        self.assertEqual(len(sockets), 1)
+
+    def test_default_transport_is_shared(self):
+        """The default transport is one per process."""
+        self.assertIs(default_transport(), default_transport())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+sys.path.append(os.getcwd())
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from benchmark.fake_cloud import FakeCloud
+from maas.core import MaaS
+from maas.warm import BUSINESS_HOURS, WarmKeeper, WarmSchedule
+
+
+class TestWarmKeeper(unittest.TestCase):
+
+    def test_schedule(self):
+        """Schedules cover their days and hours, also across midnight."""
+        self.assertTrue(BUSINESS_HOURS.active(datetime(2024, 3, 4, 9, 30)))  # Monday
+        self.assertFalse(BUSINESS_HOURS.active(datetime(2024, 3, 4, 18, 0)))
+        self.assertFalse(BUSINESS_HOURS.active(datetime(2024, 3, 9, 10, 0)))  # Saturday
+        night = WarmSchedule(days=(4,), start="22:00", end="02:00")  # Friday night
+        self.assertTrue(night.active(datetime(2024, 3, 8, 23, 0)))
+        self.assertTrue(night.active(datetime(2024, 3, 9, 1, 0)))
+        self.assertFalse(night.active(datetime(2024, 3, 10, 1, 0)))
+
+    def test_pings_follow_interval_and_schedule(self):
+        """Pings are sent once per interval, within the schedule only."""
+        with FakeCloud() as cloud:
+            keeper = WarmKeeper()
+            model = MaaS.from_url(cloud.url)
+            keeper.add(model, interval=60, payload={"input": "ping"}, schedule=BUSINESS_HOURS)
+            monday = datetime(2024, 3, 4, 10, 0).timestamp()
+            self.assertEqual(keeper.run_pending(monday), 1)
+            self.assertEqual(keeper.run_pending(monday + 30), 0)
+            self.assertEqual(keeper.run_pending(monday + 60), 1)
+            saturday = datetime(2024, 3, 9, 10, 0).timestamp()
+            self.assertEqual(keeper.run_pending(saturday), 0)
+        self.assertEqual(keeper.stats()[model.resource_name]["pings"], 2)
+
+    def test_cold_and_warm_latency(self):
+        """Pings slower than cold_threshold are counted as cold starts."""
+        with FakeCloud(cold_start=0.1) as cloud:
+            keeper = WarmKeeper()
+            target = keeper.add(MaaS.from_url(cloud.url), payload={}, cold_threshold=0.08)
+            keeper.ping(target)
+            keeper.ping(target)
+            self.assertEqual(cloud.cold_starts, 1)
+        stats = target.snapshot()
+        self.assertEqual((stats["pings"], stats["cold"], stats["warm"]), (2, 1, 1))
+        self.assertGreater(stats["cold_penalty_seconds"], 0.05)
+
+    def test_pings_reach_an_instance(self):
+        """Pings bypass the result cache and reach an instance."""
+        with FakeCloud() as cloud:
+            model = MaaS.from_url(cloud.url)
+            model.enable_result_cache()
+            keeper = WarmKeeper()
+            target = keeper.add(model, payload={"input": "ping"})
+            model.invoke({"input": "ping"})
+            requests = cloud.requests
+            keeper.ping(target)
+            keeper.ping(target)
+        # not answered from the result cache
+        self.assertEqual(cloud.requests - requests, 2)
+
+    def test_provision_goes_through_vendor(self):
+        """Provisioning goes through the vendor, which must support it."""
+        vendor = MagicMock(spec=["set_provisioned_instances"])
+        model = MaaS.from_url("http://127.0.0.1:1")
+        model.vendor = vendor
+        WarmKeeper.provision(model, 1)
+        vendor.set_provisioned_instances.assert_called_once_with(model.resource_name, 1)
+        model.vendor = object()
+        with self.assertRaises(TypeError):
+            WarmKeeper.provision(model, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
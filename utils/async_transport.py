@@ -0,0 +1,209 @@
+import time
+import weakref
+
+from utils.metrics import metrics
+from utils.streaming import aiter_stream
+
+from utils.transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT
+
+
+# asyncio is imported inside the coroutines: it is loaded anyway once an event loop runs, and a sync-only
+# process does not pay for it
+
+
+class AsyncTransport:
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE * 10, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        """Asyncio HTTP transport backed by one aiohttp session; bound to the event loop it is first used in.
+
+        :param pool_size: max number of concurrent connections over all hosts, extra requests wait for a free one
+        :param connect_timeout: seconds to wait for the TCP/TLS connection
+        :param read_timeout: seconds to wait for the response between bytes
+        """
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = None
+
+    @property
+    def session(self):
+        """The aiohttp session, created on first use in the running event loop."""
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                  trace_configs=[connect_trace_config()])
+        return self._session
+
+    async def post(self, url: str, json: any = None, headers: dict = None, timeout: float = None,
+                   data: any = None) -> tuple:
+        """Post a json or raw body and decode the json response, keeping the status code.
+
+        :param url: request url
+        :param json: request body
+        :param headers: request headers
+        :param timeout: total seconds for this request, None keeps the session timeouts
+        :param data: raw request body instead of `json`, like: bytes, a binary file or an async generator of bytes
+        :return: (status code, decoded response) tuple.
+        """
+        kwargs = {}
+        if timeout is not None:
+            import aiohttp
+
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=self.connect_timeout)
+        start = time.perf_counter()
+        async with self.session.post(url, json=json, data=data, headers=headers, **kwargs) as response:
+            ttfb = time.perf_counter() - start
+            body = await response.json(content_type=None)
+        metrics.observe("ttfb", ttfb)
+        metrics.observe("decode", time.perf_counter() - start - ttfb)
+        return response.status, body
+
+    async def post_json(self, url: str, json: any = None, headers: dict = None, timeout: float = None) -> any:
+        """Post a json body and decode the json response.
+
+        :param url: request url
+        :param json: request body
+        :param headers: request headers
+        :param timeout: total seconds for this request, None keeps the session timeouts
+        :return: decoded response.
+        """
+        _, body = await self.post(url, json=json, headers=headers, timeout=timeout)
+        return body
+
+    async def open_stream(self, url: str, json: any = None, headers: dict = None, timeout: float = None,
+                          data: any = None):
+        """Post a json or raw body and return the response once its headers arrived, the body left unread.
+
+        :param url: request url
+        :param json: request body
+        :param headers: request headers
+        :param timeout: total seconds for this request including reading the body, None keeps the session timeouts
+        :param data: raw request body instead of `json`, see `post`
+        :return: aiohttp response, to be read incrementally and then released.
+        """
+        kwargs = {}
+        if timeout is not None:
+            import aiohttp
+
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=self.connect_timeout)
+        return await self.session.post(url, json=json, data=data, headers=headers, **kwargs)
+
+    async def stream(self, url: str, json: any = None, headers: dict = None, timeout: float = None):
+        """Post a json body and yield the response incrementally, see `utils.streaming.aiter_stream`.
+
+        :param url: request url
+        :param json: request body
+        :param headers: request headers
+        :param timeout: total seconds for the whole stream, None keeps the session timeouts
+        :return: async generator of chunks.
+        """
+        response = await self.open_stream(url, json=json, headers=headers, timeout=timeout)
+        try:
+            response.raise_for_status()
+            async for chunk in aiter_stream(response):
+                yield chunk
+        finally:
+            response.release()
+
+    async def close(self):
+        """Close the underlying session and its connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        """Use the transport in an `async with` block, its connections are closed when the block ends."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Close the transport."""
+        await self.close()
+
+
+def connect_trace_config():
+    """Get an aiohttp trace config recording new connections as the connect phase, see utils.metrics.
+
+    aiohttp reports DNS, TCP connect and the TLS handshake as one span.
+
+    :return: aiohttp.TraceConfig.
+    """
+    import aiohttp
+
+    async def on_start(session, context, params):
+        context.connect_start = time.perf_counter()
+
+    async def on_end(session, context, params):
+        metrics.observe("connect", time.perf_counter() - context.connect_start)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_start)
+    trace_config.on_connection_create_end.append(on_end)
+    return trace_config
+
+
+_default_async_transports = weakref.WeakKeyDictionary()
+
+
+def default_async_transport() -> AsyncTransport:
+    """Get the async transport shared by the running event loop, created on first use.
+
+    Used by the async calls of models built without their own `async_transport`. Its connections stay open
+    until `close_default_async_transport` is awaited in the same loop, like at the end of the coroutine given
+    to `asyncio.run`; or give the models a transport used in an `async with AsyncTransport() as transport:` block.
+
+    :return: AsyncTransport.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    transport = _default_async_transports.get(loop)
+    if transport is None:
+        transport = _default_async_transports[loop] = AsyncTransport()
+    return transport
+
+
+async def close_default_async_transport():
+    """Close the async transport of the running event loop, see `default_async_transport`.
+
+    Await it before the loop ends, otherwise its session is left to the garbage collector with its sockets.
+    """
+    import asyncio
+
+    transport = _default_async_transports.pop(asyncio.get_running_loop(), None)
+    if transport is not None:
+        await transport.close()
+
+
+async def bounded_map(func, items, concurrency: int) -> list:
+    """Await `func(item)` for every item with at most `concurrency` calls in flight.
+
+    Items are pulled from the iterable lazily, so a generator of inputs is never materialized up front.
+
+    :param func: coroutine function applied to each item
+    :param items: iterable of items
+    :param concurrency: max number of pending calls
+    :return: results, in the order of the items.
+    """
+    import asyncio
+
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    results = {}
+    iterator = enumerate(items)
+
+    async def worker():
+        for index, item in iterator:
+            results[index] = await func(item)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        # stop pulling new items once any call failed
+        for task in workers:
+            task.cancel()
+        raise
+    return [results[index] for index in range(len(results))]
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class BatchMetrics:
+    def __init__(self, max_batch_size: int):
+        """Counters describing how full the dispatched batches are.
+
+        :param max_batch_size: the configured batch size limit
+        """
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.items = 0
+        self.wait_seconds = 0.0
+        self.size_histogram = {}
+        self._lock = threading.Lock()
+
+    def record(self, size: int, waited: float):
+        """Record a sent batch."""
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self.wait_seconds += waited
+            self.size_histogram[size] = self.size_histogram.get(size, 0) + 1
+
+    def snapshot(self) -> dict:
+        """Get a copy of the counters.
+
+        :return: dict with batch count, item count, mean batch size, fill ratio, mean window wait and size histogram.
+        """
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / batches,
+                "fill_ratio": self.items / (batches * self.max_batch_size),
+                "mean_wait_seconds": self.wait_seconds / batches,
+                "size_histogram": dict(sorted(self.size_histogram.items())),
+            }
+
+
+class MicroBatcher:
+    def __init__(self, send_batch, max_batch_size: int = 8, max_wait: float = 0.01, max_concurrent_batches: int = 4):
+        """Collect concurrently submitted items into batches and dispatch them with `send_batch`.
+
+        A batch is dispatched as soon as it holds `max_batch_size` items or its first item has waited `max_wait`
+        seconds, whichever comes first; a larger window trades latency for fuller batches.
+
+        :param send_batch: callable taking a list of items and returning a list of results of the same length
+        :param max_batch_size: max number of items per batch
+        :param max_wait: max seconds the first item of a batch waits for company
+        :param max_concurrent_batches: max number of batches in flight
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = BatchMetrics(max_batch_size)
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches,
+                                            thread_name_prefix="dipperai-batch")
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name="dipperai-batcher", daemon=True)
+        self._collector.start()
+
+    def submit(self, item: any) -> Future:
+        """Queue an item for the next batch.
+
+        :param item: the item
+        :return: future resolved with the item's own result.
+        """
+        future = Future()
+        # under the lock of `close`, so no item is queued behind the stop sentinel where nobody would take it
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put((item, future))
+        return future
+
+    def close(self):
+        """Flush the pending items and stop the collector thread."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            started = time.monotonic()
+            deadline = started + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+            self.metrics.record(len(batch), time.monotonic() - started)
+            self._executor.submit(self._dispatch, batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch: list):
+        futures = [future for _, future in batch]
+        try:
+            results = self.send_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch of {len(batch)} items returned {len(results)} results.")
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
@@ -1,5 +1,7 @@
 import os
-import json
+import threading
+import time
+from utils.cache_backends import CacheBackend, JsonFileBackend, create_backend
 from utils.logger import setup_logger
 
 cache_file_dir = os.path.join(os.getcwd(), ".cache")
@@ -7,47 +9,63 @@ cache_file = os.path.join(cache_file_dir, "dipperai.json")
 logger = setup_logger(
     debug=True if os.environ.get("dipperai_debug_model", None) else False
 )
+# json (default), sqlite or memory
+cache_backend = os.environ.get("DIPPERAI_CACHE_BACKEND", "json")
+# seconds a deployment entry is trusted before it is re-validated with the vendor
+cache_ttl = float(os.environ.get("DIPPERAI_CACHE_TTL", 3600))
+# entries not verified for this many ttl periods are evicted, their resources are likely gone
+cache_evict_after = float(os.environ.get("DIPPERAI_CACHE_EVICT_AFTER", 24))
+# max number of entries kept, the least recently verified ones are evicted first
+cache_max_entries = int(os.environ.get("DIPPERAI_CACHE_MAX_ENTRIES", 10000))
+
 
 class Cache:
-    def __init__(self):
-        self.cache_file = self.init_cache()
-        self.cache_data = self.load_cache()
-        self.change = False
+    def __init__(self, path: str = None, backend: CacheBackend = None, ttl: float = None,
+                 max_entries: int = None, evict_after: float = None):
+        """Deployment cache, maps resource names to their url and config.
+
+        :param path: json cache file path, default is {run-path}/.cache/dipperai.json
+        :param backend: storage backend, default is picked by DIPPERAI_CACHE_BACKEND
+        :param ttl: seconds an entry is trusted before `is_stale` reports it, default is DIPPERAI_CACHE_TTL
+        :param max_entries: max number of entries kept, default is DIPPERAI_CACHE_MAX_ENTRIES
+        :param evict_after: entries not verified for `evict_after` * `ttl` seconds are evicted,
+                            default is DIPPERAI_CACHE_EVICT_AFTER
+        """
+        if backend is None:
+            backend = JsonFileBackend(path) if path else create_backend(cache_backend, cache_file_dir)
+        self.backend = backend
+        self.ttl = cache_ttl if ttl is None else ttl
+        self.max_entries = cache_max_entries if max_entries is None else max_entries
+        self.evict_after = cache_evict_after if evict_after is None else evict_after
+        self._written = False
+
+    @property
+    def change(self) -> bool:
+        """Check whether there are changes not saved yet."""
+        return getattr(self.backend, "change", False)
 
     def save_cache(self):
         """
-        persistence cache file.
+        persistence cache file, evicting old entries first if any was written.
         """
-        if self.change:
-            with open(self.cache_file, "w") as f:
-                f.write(json.dumps(self.cache_data))
-            logger.info("update cache file")
+        if self._written:
+            self._written = False
+            self.evict()
+        self.backend.flush()
 
-    def init_cache(self):
-        """Init cache file, if exist return, else create cache file; cache file path: {run-path}/.cache/dipperai.json.
+    def evict(self) -> list:
+        """Evict the entries not verified for `evict_after` ttl periods.
 
-        :return:
-        """
-        if not os.path.exists(cache_file):
-            os.makedirs(cache_file_dir, exist_ok=True)
-            with open(cache_file, "w") as f:
-                f.write("{}")
-        return cache_file
+        Then the least recently verified ones above `max_entries` are evicted too.
 
-    def load_cache(self) -> dict:
-        """
-        Load the cache file.
+        :return: evicted keys.
         """
-        try:
-            with open(cache_file) as f:
-                cache_data = json.loads(f.read())
-            return cache_data
-        except Exception as e:
-            logger.error(e)
-            # If the file format is abnormal, the cache will be cleared
-            os.remove(cache_file)
-            self.init_cache()
-            return {}
+        # a ttl <= 0 only forces revalidation, it does not age the entries
+        verified_before = time.time() - self.evict_after * self.ttl if self.ttl > 0 else None
+        evicted = self.backend.evict(verified_before, self.max_entries)
+        if evicted:
+            logger.info(f"evict {len(evicted)} cache entries: {evicted}")
+        return evicted
 
     def get_cache(self, key:str=None) -> dict:
         """Get the value by the key from the cache file.
@@ -55,35 +73,87 @@ class Cache:
         :param key:
         :return:
         """
-        return self.cache_data.get(key, {})
+        entry = self.backend.get(key)
+        return entry[0] if entry else {}
 
 
-    def set_cache(self, key:str, value:str) -> bool:
-        """Set the key and the value to cache file.
+    def set_cache(self, key:str, value:dict, verified: bool = True) -> bool:
+        """Set the key and the value to cache file, and mark it verified now.
 
         :param key:
         :param value:
+        :param verified: False keeps the previous verification time, for changes that did not ask the vendor
+        :return:
+        """
+        if verified:
+            verified_at = time.time()
+        else:
+            entry = self.backend.get(key)
+            verified_at = entry[1] if entry else None
+        self.backend.set(key, value, verified_at)
+        self._written = True
+        return True
+
+    def delete_cache(self, key: str) -> bool:
+        """Delete the key from the cache file.
+
+        :param key:
         :return:
         """
-        if self.cache_data.get(key, {}) != value:
-            self.cache_data[key] = value
-            self.change = True
+        self.backend.delete(key)
         return True
 
+    def is_stale(self, key: str) -> bool:
+        """Check whether the entry was verified with the vendor longer than `ttl` seconds ago.
+
+        :param key:
+        :return: True if the entry should be re-validated; missing entries and entries without a verification
+                 time are stale.
+        """
+        entry = self.backend.get(key)
+        if not entry or entry[1] is None:
+            return True
+        return time.time() - entry[1] > self.ttl
+
+    def keys(self) -> list:
+        """Get the keys of all the entries."""
+        return self.backend.keys()
+
 class OperateCache:
 
     def __init__(self, cache:Cache):
         self.cache = cache
-    
+
     def __enter__(self):
         return self.cache
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._save_to_file()
-    
+
     def _save_to_file(self):
-        cache.save_cache()
+        self.cache.save_cache()
 
 # 全局cache对象, 相当于单例模式，只有在第一次调用时初始化
-# 避免每次调用都初始化，提高性能
-cache = Cache()
\ No newline at end of file
+# 避免每次调用都初始化，提高性能; 导入模块时不访问文件系统
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Cache:
+    """Get the global deployment cache, created on first use.
+
+    :return: Cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = Cache()
+    return _cache
+
+
+def __getattr__(name):
+    # keeps `from utils.cache import cache` working
+    if name == "cache":
+        return get_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,348 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from utils.logger import setup_logger
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+logger = setup_logger(
+    debug=True if os.environ.get("dipperai_debug_model", None) else False
+)
+
+# marks a key deleted in this process but not yet written to the cache file
+_DELETED = object()
+# field holding the verification time inside the json file entries
+VERIFIED_AT = "verified_at"
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """Hold an advisory lock on `path` across processes.
+
+    :param path: lock file path, created if missing
+    :param shared: take a shared (read) lock instead of an exclusive one
+    """
+    with open(path, "a+") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CacheBackend:
+    """Storage of the deployment cache; every entry is a dict value plus the time it was last verified."""
+
+    def get(self, key: str) -> tuple:
+        """Get an entry.
+
+        :param key: resource name
+        :return: (value, verified_at) tuple, or None if the key is missing.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict, verified_at: float):
+        """Add or replace an entry.
+
+        :param key: resource name
+        :param value: json serializable dict
+        :param verified_at: unix time the entry was last verified with the vendor, or None
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Delete an entry, missing keys are ignored."""
+        raise NotImplementedError
+
+    def keys(self) -> list:
+        """Get the keys of all the entries."""
+        raise NotImplementedError
+
+    def verified_times(self) -> list:
+        """Get the verification time of every entry, for `evict`.
+
+        :return: [(key, verified_at)] list, verified_at is None for entries never verified.
+        """
+        return [(key, entry[1]) for key in self.keys() if (entry := self.get(key)) is not None]
+
+    def evict(self, verified_before: float = None, max_entries: int = None) -> list:
+        """Delete the entries verified before `verified_before` or never.
+
+        Then the least recently verified ones above `max_entries` are deleted too.
+
+        :param verified_before: unix time, None keeps entries whatever their age
+        :param max_entries: max number of entries kept, None keeps them all
+        :return: evicted keys.
+        """
+        entries = sorted(self.verified_times(), key=lambda item: item[1] or 0.0)
+        evicted = [key for key, verified_at in entries
+                   if verified_before is not None and (verified_at or 0.0) < verified_before]
+        if max_entries is not None and len(entries) - len(evicted) > max_entries:
+            left = [key for key, _ in entries[len(evicted):]]
+            evicted += left[:len(left) - max_entries]
+        for key in evicted:
+            self.delete(key)
+        return evicted
+
+    def flush(self):
+        """Persist pending changes, backends writing through can keep the default."""
+
+    def close(self):
+        """Release files and connections."""
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self):
+        """Process-local backend, nothing is persisted; meant for tests."""
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple:
+        """Get an entry, see `CacheBackend.get`."""
+        return self._entries.get(key)
+
+    def set(self, key: str, value: dict, verified_at: float):
+        """Add or replace an entry."""
+        with self._lock:
+            self._entries[key] = (value, verified_at)
+
+    def delete(self, key: str):
+        """Delete an entry."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self) -> list:
+        """Get the keys of all the entries."""
+        return list(self._entries)
+
+    def verified_times(self) -> list:
+        """Get the verification time of every entry."""
+        with self._lock:
+            return [(key, verified_at) for key, (_, verified_at) in self._entries.items()]
+
+
+class JsonFileBackend(CacheBackend):
+    def __init__(self, path: str):
+        """Single json file shared by every process started in the same directory.
+
+        Reads see changes written by other processes, and flushes only replace the keys this process changed.
+
+        :param path: cache file path
+        """
+        self.cache_file = path
+        self.lock_file = path + ".lock"
+        self._lock = threading.RLock()
+        self._dirty = {}
+        self._signature = None
+        self.init_file()
+        self.data = self.load()
+
+    def get(self, key: str) -> tuple:
+        """Get an entry, reloading the file first if another process replaced it."""
+        self.refresh()
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value = dict(entry)
+        return value, value.pop(VERIFIED_AT, None)
+
+    def set(self, key: str, value: dict, verified_at: float):
+        """Add or replace an entry, written to the file by `flush`."""
+        with self._lock:
+            entry = {**value, VERIFIED_AT: verified_at}
+            self.data[key] = entry
+            self._dirty[key] = entry
+
+    def delete(self, key: str):
+        """Delete an entry, removed from the file by `flush`."""
+        with self._lock:
+            self.data.pop(key, None)
+            self._dirty[key] = _DELETED
+
+    def keys(self) -> list:
+        """Get the keys of all the entries, reloading the file first if another process replaced it."""
+        self.refresh()
+        return list(self.data)
+
+    def verified_times(self) -> list:
+        """Get the verification time of every entry."""
+        self.refresh()
+        with self._lock:
+            return [(key, entry.get(VERIFIED_AT)) for key, entry in self.data.items()]
+
+    @property
+    def change(self) -> bool:
+        """Check whether there are changes not flushed yet."""
+        return bool(self._dirty)
+
+    def flush(self):
+        """Write the keys changed in this process to the cache file.
+
+        The file is re-read under an exclusive lock, the changed keys are merged into it, then it is replaced
+        atomically.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            with file_lock(self.lock_file):
+                data = self._merge_dirty(self._read_file())
+                self._write_file(data)
+                self.data = data
+                self._signature = self._file_signature()
+            self._dirty = {}
+            logger.info("update cache file")
+
+    def init_file(self):
+        """Create an empty cache file if there is none."""
+        if not os.path.exists(self.cache_file):
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with file_lock(self.lock_file):
+                if not os.path.exists(self.cache_file):
+                    self._write_file({})
+
+    def load(self) -> dict:
+        """Read the cache file under a shared lock."""
+        with file_lock(self.lock_file, shared=True):
+            data = self._read_file()
+            self._signature = self._file_signature()
+        return data
+
+    def refresh(self):
+        """Reload the cache file if another process replaced it since it was last read."""
+        with self._lock:
+            if self._file_signature() != self._signature:
+                # keep the changes of this process that are not flushed yet
+                self.data = self._merge_dirty(self.load())
+
+    def _merge_dirty(self, data: dict) -> dict:
+        for key, value in self._dirty.items():
+            if value is _DELETED:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        return data
+
+    def _file_signature(self) -> tuple:
+        try:
+            stat = os.stat(self.cache_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.cache_file) as f:
+                return json.loads(f.read() or "{}")
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            # writes are atomic, so this is a file edited by hand; it is rewritten on the next flush
+            logger.error(e)
+            return {}
+
+    def _write_file(self, data: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_file), prefix=".dipperai-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.cache_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class SQLiteBackend(CacheBackend):
+    def __init__(self, path: str):
+        """SQLite database in WAL mode; every change is a single row update, safe across threads and processes.
+
+        :param path: database file path
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, verified_at REAL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> tuple:
+        """Get an entry."""
+        row = self._connection().execute("SELECT value, verified_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: dict, verified_at: float):
+        """Add or replace an entry, written at once."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO entries (key, value, verified_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, verified_at = excluded.verified_at",
+                (key, json.dumps(value), verified_at),
+            )
+
+    def delete(self, key: str):
+        """Delete an entry."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def keys(self) -> list:
+        """Get the keys of all the entries."""
+        return [row[0] for row in self._connection().execute("SELECT key FROM entries")]
+
+    def verified_times(self) -> list:
+        """Get the verification time of every entry in one query."""
+        return self._connection().execute("SELECT key, verified_at FROM entries").fetchall()
+
+    def close(self):
+        """Close the connection of this thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend(name: str, cache_dir: str, file_name: str = "dipperai") -> CacheBackend:
+    """Create a cache backend by name.
+
+    :param name: json, sqlite or memory
+    :param cache_dir: directory of the cache files
+    :param file_name: cache file name without extension
+    :return: CacheBackend.
+    """
+    if name == "json":
+        return JsonFileBackend(os.path.join(cache_dir, f"{file_name}.json"))
+    if name == "sqlite":
+        return SQLiteBackend(os.path.join(cache_dir, f"{file_name}.sqlite3"))
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown cache backend: {name}, expected json, sqlite or memory")
@@ -0,0 +1,110 @@
+import hashlib
+import json
+
+# vendor snapshot keys -> the key DipperAI configs use, like: DevS reports the template as templateName
+KEY_ALIASES = {"templateName": "template_name"}
+
+
+def canonical_keys(config: any) -> any:
+    """Rename the vendor spellings of keys to the ones DipperAI uses, recursively, without changing `config`.
+
+    :param config: config or vendor snapshot
+    :return: copy with canonical keys.
+    """
+    if isinstance(config, dict):
+        return {KEY_ALIASES.get(key, key): canonical_keys(value) for key, value in config.items()}
+    if isinstance(config, list):
+        return [canonical_keys(value) for value in config]
+    return config
+
+
+def normalize(config: any) -> any:
+    """Canonical form of a config for comparison.
+
+    Keys are canonical, None values are dropped, and numbers of equal value are spelled the same, like: 16384 and
+    16384.0. Strings are kept as they are, "1.10" is not "1.1".
+
+    :param config: config or vendor snapshot
+    :return: normalized copy.
+    """
+    if isinstance(config, dict):
+        return {KEY_ALIASES.get(key, key): normalize(value) for key, value in config.items() if value is not None}
+    if isinstance(config, list | tuple):
+        return [normalize(value) for value in config]
+    if _is_number(config):
+        return int(config) if float(config).is_integer() else float(config)
+    return config
+
+
+def _is_number(value: any) -> bool:
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def _same(desired: any, current: any) -> bool:
+    """Compare a normalized desired value with the normalized current one.
+
+    Vendors echo numeric parameters back as strings, like: 16384 and "16384", so a string of the snapshot is read
+    as a number only where the desired value is one.
+    """
+    if _is_number(desired) and isinstance(current, str):
+        try:
+            return float(current) == desired
+        except ValueError:
+            return False
+    if isinstance(desired, list) and isinstance(current, list):
+        return len(desired) == len(current) and all(map(_same, desired, current))
+    return desired == current
+
+
+def diff(desired: dict, current: dict) -> dict:
+    """Minimal patch turning `current` into `desired`.
+
+    Only the keys of `desired` are compared: the fields a vendor adds to its snapshot (ids, times, states) are not
+    changes. Nested dicts are compared key by key, lists as a whole; None values and empty dicts ask for nothing.
+
+    :param desired: config the user asks for
+    :param current: config deployed, like: the cached vendor snapshot
+    :return: the changed part of `desired`, with its original values; {} when nothing changed.
+    """
+    return _diff(desired, normalize(current or {}))
+
+
+def _diff(desired: dict, current: dict) -> dict:
+    patch = {}
+    for key, value in desired.items():
+        if value is None:
+            continue
+        name = KEY_ALIASES.get(key, key)
+        if isinstance(value, dict):
+            # an empty dict asks for nothing
+            nested = _diff(value, current[name] if isinstance(current.get(name), dict) else {})
+            if nested:
+                patch[key] = nested
+        elif name not in current or not _same(normalize(value), current[name]):
+            patch[key] = value
+    return patch
+
+
+def fingerprint(config: dict) -> str:
+    """Hash of the normalized config; configs with the same fingerprint are the same for `diff`.
+
+    :param config: config
+    :return: hex digest.
+    """
+    encoded = json.dumps(normalize(config or {}), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def changed_fields(patch: dict) -> list:
+    """Dotted paths of the changed leaves of a patch, for logs.
+
+    :param patch: patch from `diff`
+    :return: like: ["cpu", "gpuConfig.gpuMemorySize"].
+    """
+    fields = []
+    for key, value in patch.items():
+        if isinstance(value, dict) and value:
+            fields.extend(f"{key}.{field}" for field in changed_fields(value))
+        else:
+            fields.append(key)
+    return fields
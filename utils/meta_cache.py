@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from utils.cache import cache_backend, cache_evict_after, cache_file_dir, cache_max_entries
+from utils.cache_backends import CacheBackend, create_backend
+
+# seconds model metadata is used without asking the hub whether it changed
+meta_cache_ttl = float(os.environ.get("DIPPERAI_META_CACHE_TTL", 86400))
+
+
+class MetaCache:
+    def __init__(self, backend: CacheBackend = None, ttl: float = None):
+        """Cache of model metadata fetched from the model hubs, kept next to the deployment cache.
+
+        :param backend: storage backend, default is the DIPPERAI_CACHE_BACKEND kind in {run-path}/.cache/dipperai-meta.*
+        :param ttl: seconds an entry is used without revalidation, default is DIPPERAI_META_CACHE_TTL
+        """
+        self.backend = backend or create_backend(cache_backend, cache_file_dir, file_name="dipperai-meta")
+        self.ttl = meta_cache_ttl if ttl is None else ttl
+
+    @staticmethod
+    def key(hub: str, model_id: str, revision: str) -> str:
+        """Build the cache key of a model revision."""
+        return f"{hub}:{model_id}@{revision}"
+
+    def get(self, hub: str, model_id: str, revision: str, fetch) -> any:
+        """Get the metadata of a model, fetching or revalidating it when the entry is missing or expired.
+
+        :param hub: model hub name, like: huggingface, modelscope
+        :param model_id: model id
+        :param revision: model revision
+        :param fetch: callable taking the cached etag (or None) and returning a (metadata, etag) tuple,
+                      metadata is None when the hub answered 304 Not Modified
+        :return: the metadata.
+        """
+        key = self.key(hub, model_id, revision)
+        entry = self.backend.get(key)
+        if entry and entry[1] is not None and time.time() - entry[1] <= self.ttl:
+            return entry[0]["data"]
+        cached = entry[0] if entry else {}
+        data, etag = fetch(cached.get("etag"))
+        if data is None:
+            if not cached:
+                raise Exception(f"Empty metadata response for {key}.")
+            data, etag = cached["data"], etag or cached.get("etag")
+        self.backend.set(key, {"etag": etag, "data": data}, time.time())
+        self.backend.evict(time.time() - cache_evict_after * self.ttl if self.ttl > 0 else None, cache_max_entries)
+        self.backend.flush()
+        return data
+
+
+# 全局元数据cache对象, 只有在第一次调用时初始化
+_meta_cache = None
+_meta_cache_lock = threading.Lock()
+
+
+def get_meta_cache() -> MetaCache:
+    """Get the global metadata cache, created on first use.
+
+    :return: MetaCache.
+    """
+    global _meta_cache
+    if _meta_cache is None:
+        with _meta_cache_lock:
+            if _meta_cache is None:
+                _meta_cache = MetaCache()
+    return _meta_cache
+
+
+def __getattr__(name):
+    # keeps `from utils.meta_cache import meta_cache` working
+    if name == "meta_cache":
+        return get_meta_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
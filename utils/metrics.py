@@ -0,0 +1,278 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+# phases recorded by the package:
+#   connect  DNS lookup and TCP connect of a new pooled connection
+#   tls      TLS handshake of a new pooled connection
+#   ttfb     request sent until the response headers arrived, mostly server time
+#   decode   reading and json decoding of the response body
+#   invoke   a whole `MaaS.invoke` call, including retries, hedging and the result cache
+#   cache    deployment cache lookup
+#   deploy   a whole deployment, from the cache lookup to the ready service url
+#   poll     waiting for a cloud resource to become ready
+#   stage    one call of a `maas.pipeline.Stage` over a batch of items, tagged with the stage name
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   120.0, 300.0, 600.0, 1800.0)
+UNKNOWN_RESOURCE = "-"
+
+# resource name of the call in progress, so layers that do not know it (like pooled connections) can tag samples
+_resource = contextvars.ContextVar("dipperai_metrics_resource", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """Cumulative-friendly latency histogram with fixed bucket bounds.
+
+        :param buckets: sorted upper bounds in seconds, +Inf is implicit
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        """Record a sample.
+
+        :param seconds: duration
+        """
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket.
+
+        :param q: quantile in [0, 1]
+        :return: seconds, or None without samples.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def snapshot(self) -> dict:
+        """Get the summary of the samples.
+
+        :return: dict of count, sum, mean, p50, p95, p99 and max seconds.
+        """
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class _NoopContext:
+    """Shared do-nothing timer / scope returned while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP = _NoopContext()
+
+
+class _Timer:
+    def __init__(self, metrics, phase: str, resource: str):
+        self.metrics = metrics
+        self.phase = phase
+        self.resource = resource
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start, self.resource)
+        return False
+
+
+class _Scope:
+    def __init__(self, resource: str):
+        self.resource = resource
+
+    def __enter__(self):
+        self.token = _resource.set(self.resource)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _resource.reset(self.token)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False, buckets: tuple = DEFAULT_BUCKETS):
+        """Per resource, per phase latency histograms, forwarded to pluggable sinks.
+
+        While disabled, `timer` and `scope` return a shared no-op context and `observe` returns at once.
+
+        :param enabled: record samples
+        :param buckets: histogram bucket bounds in seconds
+        """
+        self.enabled = enabled
+        self.buckets = buckets
+        self.sinks = []
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """Start recording samples."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording samples, the recorded ones are kept."""
+        self.enabled = False
+
+    def add_sink(self, sink):
+        """Forward every sample to `sink.record(resource, phase, seconds, end)`, like: OpenTelemetrySink().
+
+        :param sink: object with a record method; `end` is the time.time() at which the phase ended
+        """
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        """Stop sending samples to `sink`."""
+        self.sinks.remove(sink)
+
+    def observe(self, phase: str, seconds: float, resource: str = None):
+        """Record one sample.
+
+        :param phase: phase name, like: ttfb
+        :param seconds: duration
+        :param resource: resource name, default is the one of the enclosing `scope`
+        """
+        if not self.enabled:
+            return
+        resource = resource or _resource.get() or UNKNOWN_RESOURCE
+        with self._lock:
+            histogram = self._histograms.get((resource, phase))
+            if histogram is None:
+                histogram = self._histograms[(resource, phase)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        if self.sinks:
+            end = time.time()
+            for sink in self.sinks:
+                sink.record(resource, phase, seconds, end)
+
+    def timer(self, phase: str, resource: str = None):
+        """Time a block.
+
+        Like: `with metrics.timer("poll", name): ...`.
+
+        :param phase: phase name
+        :param resource: resource name, default is the one of the enclosing `scope`
+        :return: context manager.
+        """
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, phase, resource)
+
+    def scope(self, resource: str):
+        """Tag the samples recorded inside the block, in this thread or task, with `resource`.
+
+        :param resource: resource name
+        :return: context manager.
+        """
+        if not self.enabled:
+            return _NOOP
+        return _Scope(resource)
+
+    def reset(self):
+        """Drop the recorded histograms."""
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """Get the recorded histograms.
+
+        :return: dict, resource name -> phase -> count, sum, mean, p50, p95, p99 and max seconds.
+        """
+        with self._lock:
+            items = [(key, histogram.snapshot()) for key, histogram in self._histograms.items()]
+        result = {}
+        for (resource, phase), data in sorted(items):
+            result.setdefault(resource, {})[phase] = data
+        return result
+
+    def prometheus(self, name: str = "dipperai_phase_seconds") -> str:
+        """Render the histograms in the Prometheus text exposition format.
+
+        :param name: metric name
+        :return: exposition text, serve it on a /metrics endpoint.
+        """
+        lines = [f"# HELP {name} Time spent per phase of DipperAI calls.", f"# TYPE {name} histogram"]
+        with self._lock:
+            items = sorted((key, list(histogram.counts), histogram.sum, histogram.count)
+                           for key, histogram in self._histograms.items())
+        for (resource, phase), counts, total, count in items:
+            labels = f'resource="{_escape(resource)}",phase="{_escape(phase)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {total!r}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class OpenTelemetrySink:
+    def __init__(self, tracer=None):
+        """Emit every sample as an OpenTelemetry span named dipperai.<phase>; needs `opentelemetry-api`.
+
+        :param tracer: opentelemetry tracer, default is the one of the global tracer provider
+        """
+        if tracer is None:
+            from opentelemetry import trace
+
+            tracer = trace.get_tracer("dipperai")
+        self.tracer = tracer
+
+    def record(self, resource: str, phase: str, seconds: float, end: float):
+        """Emit a sample as a span.
+
+        :param resource: resource name
+        :param phase: phase name
+        :param seconds: duration
+        :param end: unix time the phase ended
+        """
+        end_ns = int(end * 1e9)
+        span = self.tracer.start_span(f"dipperai.{phase}", start_time=end_ns - int(seconds * 1e9),
+                                      attributes={"dipperai.resource": resource, "dipperai.phase": phase})
+        span.end(end_time=end_ns)
+
+
+metrics = Metrics(enabled=os.environ.get("DIPPERAI_METRICS", "").lower() in ("1", "true", "yes"))
+
+
+def get_metrics() -> Metrics:
+    """Get the process-wide metrics.
+
+    They are disabled unless DIPPERAI_METRICS=1, or they are enabled with `enable`.
+
+    :return: Metrics.
+    """
+    return metrics
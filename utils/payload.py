@@ -0,0 +1,343 @@
+import io
+import json
+import mimetypes
+import os
+import uuid
+import zlib
+from contextlib import contextmanager
+
+# size of the blocks read from files and compressed, bigger blocks mean fewer syscalls per uploaded megabyte
+CHUNK_SIZE = 64 * 1024
+GZIP = "gzip"
+ZSTD = "zstd"
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+
+class Binary:
+    def __init__(self, source, content_type: str = None, filename: str = None):
+        """Binary model input, sent as the raw request body or as a multipart file part, without base64.
+
+        :param source: bytes, bytearray, memoryview, a file path (str or os.PathLike) or a binary file-like object;
+                       paths are opened for each attempt and streamed from disk
+        :param content_type: mime type, default is guessed from the file name
+        :param filename: file name of a multipart part, default is the base name of the path
+        """
+        if isinstance(source, bytes | bytearray | memoryview):
+            # a byte view of the buffer, whatever its item format, slices of it are not copies
+            self.buffer = memoryview(source).cast("B")
+            self.path = None
+            self.file = None
+        elif isinstance(source, str | os.PathLike):
+            self.buffer = None
+            self.path = os.fspath(source)
+            self.file = None
+        elif hasattr(source, "read"):
+            self.buffer = None
+            self.path = None
+            self.file = source
+        else:
+            try:
+                # any other buffer, like: array.array or numpy arrays
+                self.buffer = memoryview(source).cast("B")
+            except TypeError:
+                raise TypeError(f"Unsupported binary input: {type(source).__name__}") from None
+            self.path = None
+            self.file = None
+        if filename is None and (self.path or isinstance(getattr(self.file, "name", None), str)):
+            filename = os.path.basename(self.path or self.file.name)
+        self.filename = filename
+        self.content_type = content_type or (filename and mimetypes.guess_type(filename)[0]) or DEFAULT_CONTENT_TYPE
+        # file-like sources are rewound to where they started for a retry, when they can seek
+        self._start = self.file.tell() if self.file is not None and _seekable(self.file) else None
+
+    @property
+    def size(self) -> int:
+        """Number of bytes to send, or None if the source cannot tell."""
+        if self.buffer is not None:
+            return self.buffer.nbytes
+        if self.path is not None:
+            return os.path.getsize(self.path)
+        if self._start is not None:
+            try:
+                return os.fstat(self.file.fileno()).st_size - self._start
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                end = self.file.seek(0, os.SEEK_END)
+                self.file.seek(self._start)
+                return end - self._start
+        return None
+
+    @property
+    def replayable(self) -> bool:
+        """Whether the input can be sent again, like: for a retry."""
+        return self.file is None or self._start is not None
+
+    @contextmanager
+    def open(self):
+        """Open the input for one request.
+
+        :return: context manager yielding a memoryview or a binary file object positioned at the start.
+        """
+        if self.buffer is not None:
+            yield self.buffer
+        elif self.path is not None:
+            with open(self.path, "rb") as f:
+                yield f
+        else:
+            if self._start is not None:
+                self.file.seek(self._start)
+            yield self.file
+
+    def iter_chunks(self, reader, chunk_size: int = CHUNK_SIZE):
+        """Yield the content of an opened input in blocks; buffers are sliced, not copied.
+
+        :param reader: what `open` yielded
+        :param chunk_size: block size
+        :return: generator of bytes-like blocks.
+        """
+        if isinstance(reader, memoryview):
+            for offset in range(0, reader.nbytes, chunk_size):
+                yield reader[offset:offset + chunk_size]
+            return
+        while True:
+            block = reader.read(chunk_size)
+            if not block:
+                return
+            yield block
+
+
+def _seekable(file) -> bool:
+    try:
+        return file.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def is_binary(value: any) -> bool:
+    """Whether `value` is sent as binary; plain str values are never paths, use Binary(path) or a Path.
+
+    :param value: input value
+    :return: bool.
+    """
+    return isinstance(value, Binary | bytes | bytearray | memoryview | os.PathLike) or (
+        hasattr(value, "read") and not isinstance(value, io.TextIOBase)
+    )
+
+
+def as_binary(value: any) -> Binary:
+    return value if isinstance(value, Binary) else Binary(value)
+
+
+def prepare(payload: any) -> any:
+    """Wrap the binary values of a payload in Binary once per call.
+
+    Every attempt of the call then re-reads a file object from the position it had when the call started.
+
+    :param payload: model input
+    :return: payload with Binary values, other inputs as they are.
+    """
+    if isinstance(payload, dict):
+        if not has_binary(payload):
+            return payload
+        return {name: as_binary(value) if is_binary(value) else value for name, value in payload.items()}
+    return as_binary(payload) if is_binary(payload) else payload
+
+
+def has_binary(payload: any) -> bool:
+    """Whether the payload needs a binary body: a binary input, or a dict with binary values.
+
+    :param payload: model input
+    :return: bool.
+    """
+    if isinstance(payload, dict):
+        return any(is_binary(value) for value in payload.values())
+    return is_binary(payload)
+
+
+class MultipartBody:
+    def __init__(self, fields: dict, readers: dict, boundary: str = None):
+        """Iterable multipart/form-data body streamed part by part; file parts are never loaded whole.
+
+        :param fields: name -> value, Binary values become file parts, other values json encoded text parts
+        :param readers: name -> what Binary.open yielded, for the file parts
+        :param boundary: part boundary, default is random
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.parts = []
+        for name, value in fields.items():
+            if name in readers:
+                filename = value.filename or name
+                head = (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                        f'filename="{filename}"\r\nContent-Type: {value.content_type}\r\n\r\n')
+                self.parts.append((head.encode("utf-8"), value, readers[name]))
+            else:
+                text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+                head = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                self.parts.append((head.encode("utf-8"), text.encode("utf-8"), None))
+        self.tail = f"--{self.boundary}--\r\n".encode()
+        # requests reads `len` to send a Content-Length, 0 makes it fall back to chunked transfer encoding
+        self.len = self._length() or 0
+
+    def _length(self) -> int:
+        total = len(self.tail)
+        for head, value, reader in self.parts:
+            size = value.size if reader is not None else len(value)
+            if size is None:
+                return None
+            total += len(head) + size + 2
+        return total
+
+    def __iter__(self):
+        """Yield the parts, binary values in blocks without copying them."""
+        for head, value, reader in self.parts:
+            yield head
+            if reader is None:
+                yield value
+            else:
+                yield from value.iter_chunks(reader)
+            yield b"\r\n"
+        yield self.tail
+
+
+def compressor(encoding: str):
+    """Get a streaming compressor with compress / flush methods.
+
+    :param encoding: gzip or zstd; zstd needs the `zstandard` package
+    :return: compressor object.
+    """
+    if encoding == GZIP:
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if encoding == ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression needs the zstandard package: pip install zstandard") from None
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def compress_chunks(chunks, encoding: str):
+    """Compress an iterable of blocks on the fly.
+
+    :param chunks: iterable of bytes-like blocks
+    :param encoding: gzip or zstd
+    :return: generator of compressed blocks.
+    """
+    engine = compressor(encoding)
+    for chunk in chunks:
+        block = engine.compress(chunk)
+        if block:
+            yield block
+    yield engine.flush()
+
+
+@contextmanager
+def encode_request(payload: any, headers: dict = None, compress: str = None, min_size: int = 1024):
+    """Build the body of one request.
+
+    The body is json for plain inputs, a raw body for a binary input, and a streamed multipart body for a dict
+    with binary values.
+
+    :param payload: model input
+    :param headers: request headers, Content-Type and Content-Encoding are added
+    :param compress: gzip or zstd to compress the body, None sends it as is
+    :param min_size: bodies smaller than this many bytes are never compressed
+    :return: context manager yielding the keyword arguments of `requests.request`; opened files are closed on exit.
+    """
+    headers = dict(headers or {})
+    if not has_binary(payload):
+        if not compress:
+            yield {"json": payload, "headers": headers or None}
+            return
+        body = json.dumps(payload).encode("utf-8")
+        headers.setdefault("Content-Type", "application/json")
+        if len(body) >= min_size:
+            engine = compressor(compress)
+            body = engine.compress(body) + engine.flush()
+            headers["Content-Encoding"] = compress
+        yield {"data": body, "headers": headers}
+        return
+
+    with _open_all(payload) as (binaries, readers):
+        if isinstance(payload, dict):
+            body = MultipartBody({name: binaries.get(name, value) for name, value in payload.items()}, readers)
+            headers.setdefault("Content-Type", body.content_type)
+            size = body.len or None
+            if size and not (compress and size >= min_size):
+                headers["Content-Length"] = str(size)
+        else:
+            binary = binaries[None]
+            reader = readers[None]
+            headers.setdefault("Content-Type", binary.content_type)
+            # buffers and files are handed to the socket as they are
+            body = reader
+            size = binary.size
+        if compress and (size is None or size >= min_size):
+            chunks = body if isinstance(body, MultipartBody) else binary.iter_chunks(reader)
+            body = compress_chunks(chunks, compress)
+            headers["Content-Encoding"] = compress
+        yield {"data": body, "headers": headers}
+
+
+@contextmanager
+def _open_all(payload: any):
+    """Open every binary value of the payload; the key of a bare binary input is None."""
+    items = payload.items() if isinstance(payload, dict) else [(None, payload)]
+    binaries = {name: as_binary(value) for name, value in items if is_binary(value)}
+    readers = {}
+    opened = []
+    try:
+        for name, binary in binaries.items():
+            manager = binary.open()
+            readers[name] = manager.__enter__()
+            opened.append(manager)
+        yield binaries, readers
+    finally:
+        for manager in reversed(opened):
+            manager.__exit__(None, None, None)
+
+
+def check_replayable(payload: any, concurrent: bool = False):
+    """Raise if the payload cannot be sent again, so a retry does not silently send an empty body.
+
+    :param payload: model input
+    :param concurrent: whether two attempts may read it at the same time, which a file object does not allow
+    """
+    items = payload.values() if isinstance(payload, dict) else [payload]
+    for value in items:
+        if not is_binary(value):
+            continue
+        binary = as_binary(value)
+        if not binary.replayable:
+            raise ValueError("A non-seekable file-like input cannot be sent twice, pass a path or bytes instead.")
+        if concurrent and binary.file is not None:
+            raise ValueError("Hedged attempts cannot share a file object, pass a path or bytes instead.")
+
+
+_DIRECT_BODIES = (bytes, bytearray, memoryview, io.IOBase)
+
+
+def aiter_body(body: any) -> any:
+    """Adapt a request body built by `encode_request` to aiohttp.
+
+    Buffers and files are sent as they are (aiohttp reads files in its executor), streamed bodies are pulled in
+    a worker thread so disk reads and compression do not block the event loop.
+
+    :param body: request body
+    :return: body, or async generator of its blocks.
+    """
+    if isinstance(body, _DIRECT_BODIES):
+        return body
+
+    async def chunks():
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        iterator = iter(lambda: body.read(CHUNK_SIZE), b"") if hasattr(body, "read") else iter(body)
+        while True:
+            block = await loop.run_in_executor(None, next, iterator, None)
+            if block is None:
+                return
+            yield block
+
+    return chunks()
@@ -0,0 +1,60 @@
+import random
+import time
+
+
+class PollPolicy:
+    def __init__(self, initial: float = 2.0, factor: float = 1.5, max_interval: float = 40.0, jitter: float = 0.5,
+                 deadline: float = 1800.0):
+        """Exponential backoff with jitter and an overall deadline, used to wait for cloud resources.
+
+        :param initial: seconds before the second attempt
+        :param factor: growth of the interval after each attempt
+        :param max_interval: cap of the interval
+        :param jitter: fraction of each interval that is randomized away, 0 disables jitter;
+                       spreads concurrent pollers so they do not hit the API in lockstep
+        :param deadline: overall seconds before giving up
+        """
+        if initial <= 0 or factor < 1 or not 0 <= jitter <= 1:
+            raise ValueError("PollPolicy needs initial > 0, factor >= 1 and 0 <= jitter <= 1")
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def interval(self, attempt: int, rng: random.Random = random) -> float:
+        """Get the sleep before the next attempt.
+
+        :param attempt: number of attempts made so far, starting at 1
+        :param rng: random source
+        :return: seconds.
+        """
+        base = min(self.max_interval, self.initial * self.factor ** (attempt - 1))
+        return base * (1 - self.jitter * rng.random())
+
+
+def poll_until(check, policy: PollPolicy = None, sleep=None, clock=None, rng: random.Random = random):
+    """Call `check` until it reports done or the policy deadline passes.
+
+    :param check: callable returning a (done, value) tuple
+    :param policy: PollPolicy, default is PollPolicy()
+    :param sleep: sleep function, default is time.sleep
+    :param clock: monotonic clock, default is time.monotonic
+    :param rng: random source of the jitter
+    :return: the value of the first done check.
+    :raises TimeoutError: if the deadline passes first.
+    """
+    policy = policy or PollPolicy()
+    sleep = sleep or time.sleep
+    clock = clock or time.monotonic
+    deadline = clock() + policy.deadline
+    attempt = 0
+    while True:
+        attempt += 1
+        done, value = check()
+        if done:
+            return value
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise TimeoutError(f"Not ready after {attempt} attempts in {policy.deadline}s.")
+        sleep(min(policy.interval(attempt, rng), remaining))
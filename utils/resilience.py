@@ -0,0 +1,351 @@
+import os
+import random
+import threading
+import time
+
+from utils.polling import PollPolicy
+
+# statuses worth another attempt: timeouts, throttling and server side errors
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+# FC / DevS control plane quota, requests per second shared by all vendor objects of the process
+CONTROL_PLANE_RATE = float(os.environ.get("DIPPERAI_CONTROL_PLANE_RATE", 10))
+CONTROL_PLANE_BURST = float(os.environ.get("DIPPERAI_CONTROL_PLANE_BURST", 20))
+
+
+class TransientError(Exception):
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        """A failure that may succeed when tried again, like: throttling or a 5xx answer.
+
+        :param message: error message
+        :param status: http status code, if any
+        :param retry_after: seconds the server asked to wait, if any
+        """
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(TransientError):
+    """The endpoint failed too often recently, calls are refused until it cools down."""
+
+
+def parse_retry_after(value: str) -> float:
+    """Parse a Retry-After header given in seconds.
+
+    :param value: header value
+    :return: seconds, or None if absent or given as a date.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def check_response(status_code: int, headers: dict = None, url: str = ""):
+    """Raise TransientError for answers that are worth retrying.
+
+    :param status_code: http status code
+    :param headers: response headers, Retry-After is honored
+    :param url: request url, for the error message
+    """
+    if status_code in RETRYABLE_STATUSES:
+        retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        raise TransientError(f"{url} answered {status_code}.", status=status_code, retry_after=retry_after)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Classify an exception as worth retrying.
+
+    :param error: the exception
+    :return: True for TransientError, connection errors, timeouts, and SDK errors carrying a retryable status.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, TransientError | ConnectionError | TimeoutError):
+        return True
+    # requests exceptions are IOErrors; Tea SDK exceptions carry a statusCode
+    if type(error).__name__ in ("ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout"):
+        return True
+    status = getattr(error, "statusCode", None) or getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUSES
+
+
+class RetryPolicy(PollPolicy):
+    def __init__(self, max_attempts: int = 4, initial: float = 0.5, factor: float = 2.0, max_interval: float = 10.0,
+                 jitter: float = 0.5, deadline: float = 60.0):
+        """Exponential backoff with jitter between attempts of a failed call.
+
+        :param max_attempts: max number of attempts, including the first one
+        :param initial: seconds before the second attempt
+        :param factor: growth of the interval after each attempt
+        :param max_interval: cap of the interval
+        :param jitter: fraction of each interval that is randomized away, see PollPolicy
+        :param deadline: overall seconds spent retrying
+        """
+        super().__init__(initial=initial, factor=factor, max_interval=max_interval, jitter=jitter, deadline=deadline)
+        self.max_attempts = max_attempts
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=None):
+        """Stop calling an endpoint after `failure_threshold` consecutive failures.
+
+        After `reset_timeout` seconds one trial call is let through: success closes the circuit,
+        failure opens it again.
+
+        :param failure_threshold: consecutive failures that open the circuit
+        :param reset_timeout: seconds the circuit stays open
+        :param clock: monotonic clock, default is time.monotonic
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or time.monotonic
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Get the state of the circuit, closed, open or half open."""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Ask to send a call; pair with `record`.
+
+        :return: False while the circuit is open, or while the half-open trial call is in flight.
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, ok: bool):
+        """Record the outcome of a call, failures past the threshold open the circuit."""
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = None, clock=None):
+        """Token-bucket rate limiter.
+
+        :param rate: tokens added per second
+        :param burst: bucket size, default is one second of tokens
+        :param clock: monotonic clock, default is time.monotonic
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.clock = clock or time.monotonic
+        self._tokens = self.burst
+        self._updated = self.clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take tokens, going into debt if the bucket is empty.
+
+        :param tokens: number of tokens
+        :return: seconds the caller has to wait before it may proceed.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0, sleep=None):
+        """Block until tokens are available.
+
+        :param tokens: number of tokens
+        :param sleep: sleep function, default is time.sleep
+        """
+        wait = self.reserve(tokens)
+        if wait:
+            (sleep or time.sleep)(wait)
+
+    async def aacquire(self, tokens: float = 1.0):
+        """Async twin of `acquire`."""
+        import asyncio
+
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class Resilience:
+    def __init__(self, retry: RetryPolicy = None, rate: float = None, burst: float = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, retryable=is_transient,
+                 sleep=None, clock=None, rng: random.Random = random):
+        """Retries with backoff, a circuit breaker per endpoint and an optional shared rate limit.
+
+        :param retry: RetryPolicy, default is RetryPolicy()
+        :param rate: max calls per second over all endpoints, None disables rate limiting
+        :param burst: calls allowed at once above the rate, default is one second of calls
+        :param failure_threshold: consecutive failures that open the circuit of an endpoint
+        :param reset_timeout: seconds an open circuit refuses calls
+        :param retryable: callable classifying an exception as worth retrying, see `is_transient`
+        :param sleep: sleep function, default is time.sleep
+        :param clock: monotonic clock, default is time.monotonic
+        :param rng: random source of the jitter
+        """
+        self.retry = retry or RetryPolicy()
+        self.limiter = TokenBucket(rate, burst, clock=clock) if rate else None
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retryable = retryable
+        self.sleep = sleep or time.sleep
+        self.clock = clock or time.monotonic
+        self.rng = rng
+        self.breakers = {}
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Get the circuit breaker of an endpoint, created on first use."""
+        with self._lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = self.breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout,
+                                                                   clock=self.clock)
+            return breaker
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _before(self, breaker: CircuitBreaker, endpoint: str):
+        if not breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"Circuit of {endpoint} is open, retry in {breaker.reset_timeout}s.")
+
+    def _backoff(self, error: BaseException, attempt: int, deadline: float) -> float:
+        """Get the sleep before the next attempt, or None when `error` is final."""
+        if not self.retryable(error) or attempt >= self.retry.max_attempts:
+            return None
+        wait = max(self.retry.interval(attempt, self.rng), getattr(error, "retry_after", None) or 0.0)
+        if self.clock() + wait > deadline:
+            return None
+        self._count("retries")
+        return wait
+
+    def _deadline(self, deadline: float) -> float:
+        own = self.clock() + self.retry.deadline
+        return own if deadline is None else min(own, deadline)
+
+    def call(self, endpoint: str, send, deadline: float = None) -> any:
+        """Call `send()` through the circuit of `endpoint`, retrying transient failures.
+
+        :param endpoint: circuit breaker key, like: the API host or the trigger url
+        :param send: callable sending one attempt, it raises TransientError (see `check_response`) to be retried
+        :param deadline: time.monotonic() based deadline, retries stop before it
+        :return: the result of the first successful attempt.
+        :raises CircuitOpenError: if the endpoint circuit is open.
+        """
+        self._count("calls")
+        breaker = self.breaker(endpoint)
+        deadline = self._deadline(deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before(breaker, endpoint)
+            if self.limiter:
+                self.limiter.acquire(sleep=self.sleep)
+            try:
+                result = send()
+            except Exception as e:
+                transient = self.retryable(e)
+                breaker.record(not transient)
+                wait = self._backoff(e, attempt, deadline)
+                if wait is None:
+                    if transient:
+                        self._count("failures")
+                    raise
+                self.sleep(wait)
+                continue
+            except BaseException:
+                breaker.record(True)
+                raise
+            breaker.record(True)
+            return result
+
+    async def acall(self, endpoint: str, send, deadline: float = None) -> any:
+        """Async twin of `call`, `send()` returns an awaitable."""
+        import asyncio
+
+        self._count("calls")
+        breaker = self.breaker(endpoint)
+        deadline = self._deadline(deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before(breaker, endpoint)
+            if self.limiter:
+                await self.limiter.aacquire()
+            try:
+                result = await send()
+            except Exception as e:
+                transient = self.retryable(e)
+                breaker.record(not transient)
+                wait = self._backoff(e, attempt, deadline)
+                if wait is None:
+                    if transient:
+                        self._count("failures")
+                    raise
+                await asyncio.sleep(wait)
+                continue
+            except BaseException:
+                breaker.record(True)
+                raise
+            breaker.record(True)
+            return result
+
+    def snapshot(self) -> dict:
+        """Get the call counters and the state of every circuit."""
+        with self._lock:
+            breakers = dict(self.breakers)
+            stats = dict(self.stats)
+        return {**stats, "circuits": {endpoint: breaker.state for endpoint, breaker in breakers.items()}}
+
+
+_control_planes = {}
+_control_planes_lock = threading.Lock()
+
+
+def control_plane(service: str) -> Resilience:
+    """Get the process-wide Resilience of a cloud control plane, so concurrent deployments share one quota.
+
+    :param service: control plane name, like: fc or devs
+    :return: Resilience rate limited to DIPPERAI_CONTROL_PLANE_RATE calls per second.
+    """
+    with _control_planes_lock:
+        resilience = _control_planes.get(service)
+        if resilience is None:
+            resilience = _control_planes[service] = Resilience(rate=CONTROL_PLANE_RATE, burst=CONTROL_PLANE_BURST)
+        return resilience
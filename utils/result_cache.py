@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class WaitTimeout(TimeoutError):
+    """The call of a concurrent caller of the same key did not finish within the timeout of a waiter."""
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = None, disk_dir: str = None):
+        """Cache of inference results for deterministic models.
+
+        Results are kept json encoded in an in-process LRU tier bounded by `max_bytes`, and optionally in a
+        directory shared by processes; identical calls that are in flight at the same time share one upstream call.
+
+        :param max_bytes: max total size of the encoded results kept in memory
+        :param ttl: seconds a result is served, None keeps results until they are evicted
+        :param disk_dir: directory of the on-disk tier, None disables it
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self.bytes = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(resource_name: str, revision: str, payload: any) -> str:
+        """Build the cache key of a call.
+
+        :param resource_name: deployed resource name
+        :param revision: model revision
+        :param payload: input data, hashed in canonical json form so dict key order does not matter
+        :return: hex digest.
+        """
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(f"{resource_name}\0{revision}\0{canonical}".encode()).hexdigest()
+
+    def get_or_compute(self, key: str, compute, timeout: float = None) -> any:
+        """Get the cached result of `key`, or compute it once for all concurrent callers.
+
+        :param key: cache key, see `key`
+        :param compute: callable returning the result, only called on a miss; raise to keep a result out of the cache
+        :param timeout: max seconds to wait for the call of a concurrent caller, None waits as long as it takes
+        :return: the result; each caller gets its own copy.
+        :raises WaitTimeout: if the shared call did not finish within `timeout`.
+        """
+        encoded, future, owner = self._claim(key)
+        if encoded is not None:
+            return json.loads(encoded)
+        if not owner:
+            try:
+                return json.loads(future.result(timeout=timeout))
+            except FutureTimeoutError:
+                # a timeout of the shared call itself is raised as it is
+                if future.done():
+                    raise
+                raise WaitTimeout(f"No result within {timeout} seconds.") from None
+        try:
+            encoded = self._get_disk_counted(key)
+            if encoded is None:
+                encoded = self._encode(key, compute())
+            self._publish(key, future, encoded)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return json.loads(encoded)
+
+    async def aget_or_compute(self, key: str, compute, timeout: float = None) -> any:
+        """Async twin of `get_or_compute`, `compute()` returns an awaitable.
+
+        Sync and async callers of the same key share one upstream call.
+
+        :raises WaitTimeout: if the shared call did not finish within `timeout`.
+        """
+        import asyncio
+        encoded, future, owner = self._claim(key)
+        if encoded is not None:
+            return json.loads(encoded)
+        if not owner:
+            try:
+                # shielded: a waiter giving up must not cancel the call the others wait for
+                return json.loads(await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout))
+            except TimeoutError:
+                if future.done():
+                    raise
+                raise WaitTimeout(f"No result within {timeout} seconds.") from None
+        try:
+            encoded = self._get_disk_counted(key)
+            if encoded is None:
+                encoded = self._encode(key, await compute())
+            self._publish(key, future, encoded)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return json.loads(encoded)
+
+    def _claim(self, key: str) -> tuple:
+        """Look `key` up in memory, or join / start its in-flight call.
+
+        :return: (encoded result, None, False) on a hit; (None, future of the call, True if the caller computes it).
+        """
+        with self._lock:
+            encoded = self._get_memory(key)
+            if encoded is not None:
+                self.stats["hits"] += 1
+                return encoded, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return None, future, False
+            future = self._inflight[key] = Future()
+            return None, future, True
+
+    def _get_disk_counted(self, key: str) -> bytes:
+        encoded = self._get_disk(key)
+        with self._lock:
+            self.stats["disk_hits" if encoded is not None else "misses"] += 1
+        return encoded
+
+    def _encode(self, key: str, result: any) -> bytes:
+        encoded = json.dumps(result).encode()
+        self._set_disk(key, encoded)
+        return encoded
+
+    def _publish(self, key: str, future: Future, encoded: bytes):
+        self._set_memory(key, encoded)
+        future.set_result(encoded)
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _fail(self, key: str, future: Future, error: BaseException):
+        future.set_exception(error)
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        """Drop the results kept in memory, the disk tier is kept."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def snapshot(self) -> dict:
+        """Get the counters and the memory tier size.
+
+        :return: dict.
+        """
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self._entries), "bytes": self.bytes,
+                    "hit_ratio": (self.stats["hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0}
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _get_memory(self, key: str) -> bytes:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        encoded, stored_at = entry
+        if self._expired(stored_at):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return encoded
+
+    def _set_memory(self, key: str, encoded: bytes):
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (encoded, time.time())
+            self.bytes += len(encoded)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        encoded, _ = self._entries.pop(key)
+        self.bytes -= len(encoded)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _get_disk(self, key: str) -> bytes:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _set_disk(self, key: str, encoded: bytes):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, path)
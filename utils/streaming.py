@@ -0,0 +1,166 @@
+import json
+import threading
+
+# OpenAI style end-of-stream marker sent by many LLM containers
+SSE_DONE = "[DONE]"
+STREAM_ACCEPT = "text/event-stream, application/x-ndjson, application/json;q=0.9, */*;q=0.8"
+
+
+def stream_kind(content_type: str) -> str:
+    """Classify a streamed response by its content type.
+
+    :param content_type: Content-Type header value
+    :return: sse, ndjson or raw.
+    """
+    content_type = (content_type or "").lower()
+    if "text/event-stream" in content_type:
+        return "sse"
+    if "ndjson" in content_type or "jsonl" in content_type or "json-seq" in content_type:
+        return "ndjson"
+    return "raw"
+
+
+def decode_data(data: str) -> any:
+    """Decode a json payload, falling back to the text itself.
+
+    :param data: payload text
+    :return: decoded payload.
+    """
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data
+
+
+class SSEDecoder:
+    def __init__(self):
+        """Incremental server-sent events parser, fed one line at a time; only the data field is kept."""
+        self._data = []
+        self.done = False
+
+    def feed(self, line: str) -> tuple:
+        """Feed one line without its line break.
+
+        :param line: the line
+        :return: (True, payload) when the line completed an event, else (False, None).
+        """
+        if line == "":
+            if not self._data:
+                return False, None
+            data, self._data = "\n".join(self._data), []
+            if data == SSE_DONE:
+                self.done = True
+                return False, None
+            return True, decode_data(data)
+        if line.startswith(":"):
+            return False, None
+        field, _, value = line.partition(":")
+        if field == "data":
+            self._data.append(value[1:] if value.startswith(" ") else value)
+        return False, None
+
+    def close(self) -> tuple:
+        """Flush an event that was not terminated by a blank line before the stream ended."""
+        return self.feed("")
+
+
+def iter_stream(response):
+    """Yield the incremental chunks of a streamed `requests` response without buffering the whole body.
+
+    :param response: response of a request sent with stream=True
+    :return: generator of decoded sse events, ndjson records, or raw bytes chunks.
+    """
+    kind = stream_kind(response.headers.get("Content-Type"))
+    if kind == "raw":
+        yield from response.iter_content(chunk_size=None)
+        return
+    decoder = SSEDecoder()
+    for raw_line in response.iter_lines(decode_unicode=False):
+        line = raw_line.decode("utf-8")
+        if kind == "ndjson":
+            if line.strip():
+                yield decode_data(line)
+            continue
+        ready, payload = decoder.feed(line)
+        if decoder.done:
+            return
+        if ready:
+            yield payload
+    ready, payload = decoder.close()
+    if ready:
+        yield payload
+
+
+async def aiter_stream(response):
+    """Async twin of `iter_stream` for an aiohttp response.
+
+    :param response: aiohttp response
+    :return: async generator of decoded sse events, ndjson records, or raw bytes chunks.
+    """
+    kind = stream_kind(response.headers.get("Content-Type"))
+    if kind == "raw":
+        async for chunk in response.content.iter_any():
+            yield chunk
+        return
+    decoder = SSEDecoder()
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if kind == "ndjson":
+            if line.strip():
+                yield decode_data(line)
+            continue
+        ready, payload = decoder.feed(line)
+        if decoder.done:
+            return
+        if ready:
+            yield payload
+    ready, payload = decoder.close()
+    if ready:
+        yield payload
+
+
+async def aiter_in_thread(iterable_factory, max_buffered: int = 8):
+    """Consume a blocking iterator in a worker thread and yield its items to asyncio code.
+
+    At most `max_buffered` items wait between the thread and the consumer, so a slow consumer slows the
+    producer down instead of growing memory.
+
+    :param iterable_factory: callable returning the blocking iterable, it is called in the worker thread
+    :param max_buffered: max number of items waiting to be consumed
+    :return: async generator of the items.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(max_buffered)
+    stopped = threading.Event()
+
+    def put(entry):
+        asyncio.run_coroutine_threadsafe(queue.put(entry), loop).result()
+
+    def produce():
+        try:
+            for item in iterable_factory():
+                if stopped.is_set():
+                    return
+                put(("item", item))
+        except BaseException as e:
+            put(("error", e))
+            return
+        put(("end", None))
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "end":
+                break
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stopped.set()
+        # unblock a producer waiting for room in the queue
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
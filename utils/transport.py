@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_POOL_SIZE = int(os.environ.get("DIPPERAI_POOL_SIZE", 10))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("DIPPERAI_CONNECT_TIMEOUT", 10))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("DIPPERAI_READ_TIMEOUT", 600))
+# bytes per socket write when a file body is uploaded, urllib3 defaults to 16KiB
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+
+class Transport:
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        """Keep-alive HTTP transport shared by MaaS instances.
+
+        :param pool_size: max number of pooled connections kept per host
+        :param connect_timeout: seconds to wait for the TCP/TLS connection
+        :param read_timeout: seconds to wait for the response between bytes
+        """
+        # requests is imported when the first transport is built, not when the package is imported
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        # new connections record the connect and tls phases, see utils.metrics
+        adapter.poolmanager.pool_classes_by_scheme = timed_pool_classes()
+        adapter.poolmanager.connection_pool_kw["blocksize"] = UPLOAD_BLOCK_SIZE
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """Send a request through the pooled session, applying the default timeouts.
+
+        :param method: http method
+        :param url: request url
+        :return: the response.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        """Send a GET request, see `request`."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        """Send a POST request, see `request`."""
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+
+_timed_pool_classes = None
+
+
+def timed_pool_classes() -> dict:
+    """Get urllib3 connection pool classes whose new connections time DNS + TCP connect and the TLS handshake.
+
+    :return: dict, scheme -> pool class.
+    """
+    global _timed_pool_classes
+    if _timed_pool_classes is None:
+        from urllib3.connection import HTTPConnection, HTTPSConnection
+        from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+        class TimedConnect:
+            connect_seconds = 0.0
+
+            def _new_conn(self):
+                if not metrics.enabled:
+                    return super()._new_conn()
+                start = time.perf_counter()
+                sock = super()._new_conn()
+                self.connect_seconds = time.perf_counter() - start
+                metrics.observe("connect", self.connect_seconds)
+                return sock
+
+        class TimedHTTPConnection(TimedConnect, HTTPConnection):
+            pass
+
+        class TimedHTTPSConnection(TimedConnect, HTTPSConnection):
+            def connect(self):
+                if not metrics.enabled:
+                    return super().connect()
+                start = time.perf_counter()
+                super().connect()
+                # connect() opens the socket through _new_conn, the rest is the handshake
+                metrics.observe("tls", time.perf_counter() - start - self.connect_seconds)
+
+        class TimedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = TimedHTTPConnection
+
+        class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = TimedHTTPSConnection
+
+        _timed_pool_classes = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+    return _timed_pool_classes
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def default_transport() -> Transport:
+    """Get the process-wide transport, created on first use.
+
+    :return: Transport.
+    """
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = Transport()
+    return _default_transport